@@ -0,0 +1,174 @@
+# batch.py —— 批量评估：目录 / glob / 清单(@list.txt) → 共享 client + 有界并发 → 逐个写出 <stem>_feedback.txt
+import argparse
+import glob
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import evaluate
+from evaluate import evaluate_file, save_feedback, describe_error, open_cache, prepare_text
+from scheduler import ScheduledClient
+import textstats
+
+# =============== 配置区（这里改） ===============
+CONCURRENCY  = 8              # 同时在途的模型请求数
+ESSAY_EXTS   = {".pdf", ".docx", ".txt"}
+# ==============================================
+
+def iter_inputs(spec: str):
+    """
+    解析输入：
+    - 目录：递归收集 .pdf/.docx/.txt（跳过已生成的 *_feedback.txt）；
+    - @清单文件：每行一个路径（空行与 # 注释忽略，相对路径按清单所在目录解析）；
+    - 其他：按 glob 展开（也兼容单个文件路径）。
+    """
+    if spec.startswith("@"):
+        manifest = Path(spec[1:]).expanduser()
+        base = manifest.resolve().parent
+        paths = []
+        for line in manifest.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                p = Path(line).expanduser()
+                paths.append(p if p.is_absolute() else base / p)
+    else:
+        root = Path(spec).expanduser()
+        if root.is_dir():
+            paths = sorted(p for p in root.rglob("*") if p.is_file())
+        else:
+            paths = [Path(p) for p in sorted(glob.glob(spec, recursive=True))]
+    seen = set()
+    for p in paths:
+        p = p.resolve()
+        if p in seen or p.suffix.lower() not in ESSAY_EXTS or p.stem.endswith("_feedback"):
+            continue
+        seen.add(p)
+        yield p
+
+def output_stems(paths) -> dict:
+    """
+    稿件路径 → 输出文件名前缀（<前缀>_feedback.txt / <前缀>_stats.json）。
+    stem 不重复时就是 stem；重名的（如递归目录里的 s1/essay.txt 与 s2/essay.txt）改用相对它们公共目录的路径，
+    以 "__" 连接（s1__essay、s2__essay）；同目录同名不同扩展名再带上扩展名（essay_pdf），避免互相覆盖。
+    """
+    paths = list(paths)
+    names = {p: p.stem for p in paths}
+    counts = Counter(names.values())
+    dup = [p for p in paths if counts[p.stem] > 1]
+    if dup:
+        base = Path(os.path.commonpath([str(p.parent) for p in dup]))
+        for p in dup:
+            names[p] = "__".join(p.relative_to(base).with_suffix("").parts)
+        counts = Counter(names.values())
+        for p in dup:
+            if counts[names[p]] > 1:
+                names[p] = f"{names[p]}_{p.suffix.lstrip('.').lower()}"
+    # 兜底：改名后仍与别的稿件撞名时追加序号
+    taken = Counter(names.values())
+    seen = set()
+    for p in paths:
+        name = names[p]
+        if taken[name] > 1 and name in seen:
+            n = 2
+            while f"{name}-{n}" in taken or f"{name}-{n}" in seen:
+                n += 1
+            names[p] = f"{name}-{n}"
+        seen.add(names[p])
+    return names
+
+def run_batch(paths, client, out_dir: Path = None, concurrency: int = CONCURRENCY, log=print, cache=None,
+              mode: str = None) -> dict:
+    """
+    用线程池并发跑 evaluate_file（共享同一个 client 及其连接池），结果到达即落盘（重名 stem 的命名见 output_stems）。
+    返回统计：{"ok": int, "failed": [(path, msg)], "elapsed": 秒, "per_minute": 篇/分钟}
+    """
+    paths = list(paths)
+    stems = output_stems(paths)
+    out_dir = Path(out_dir or Path.cwd())
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ok, failed = 0, []
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(evaluate_file, p, client, cache, mode): p for p in paths}
+        for fut in as_completed(futures):
+            p = futures[fut]
+            try:
+                out_path = save_feedback(fut.result(), stems[p], out_dir)
+                ok += 1
+                log(f"✅ {p.name} → {out_path}")
+            except Exception as e:
+                msg = describe_error(e)
+                failed.append((p, msg))
+                log(f"{p.name}: {msg}")
+    elapsed = time.perf_counter() - t0
+    per_minute = (ok / elapsed * 60) if elapsed > 0 else 0.0
+    return {"ok": ok, "failed": failed, "elapsed": elapsed, "per_minute": per_minute}
+
+def run_metrics_only(paths, out_dir: Path = None, log=print) -> dict:
+    """
+    只做本地文本统计（不调用模型）：逐篇读取清洗后整批一次计算（textstats.analyze_many），写出 <stem>_stats.json。
+    返回与 run_batch 相同结构的统计。
+    """
+    paths = list(paths)
+    stems = output_stems(paths)
+    out_dir = Path(out_dir or Path.cwd())
+    out_dir.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    prepared, failed = [], []
+    for p in paths:
+        try:
+            prepared.append((p, prepare_text(p)))
+        except Exception as e:
+            failed.append((p, describe_error(e)))
+            log(f"{p.name}: {failed[-1][1]}")
+    for (p, _), stats in zip(prepared, textstats.analyze_many([text for _, text in prepared])):
+        out_path = out_dir / f"{stems[p]}_stats.json"
+        out_path.write_text(json.dumps({"text_stats": stats}, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        log(f"✅ {p.name} → {out_path}")
+    elapsed = time.perf_counter() - t0
+    ok = len(prepared)
+    return {"ok": ok, "failed": failed, "elapsed": elapsed, "per_minute": (ok / elapsed * 60) if elapsed > 0 else 0.0}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="批量生成 <stem>_feedback.txt")
+    ap.add_argument("inputs", nargs="+", help="目录 / glob / @清单文件")
+    ap.add_argument("-o", "--out-dir", default=".", help="输出目录（默认当前目录）")
+    ap.add_argument("-j", "--concurrency", type=int, default=CONCURRENCY, help="并发在途请求数")
+    ap.add_argument("--fake", action="store_true", help="使用 fake_llm.FakeClient（离线演练）")
+    ap.add_argument("--no-cache", action="store_true", help="绕过反馈缓存，强制调用模型")
+    ap.add_argument("--mode", choices=["single", "fanout"], default=None, help="评估模式（默认 evaluate.EVAL_MODE）")
+    ap.add_argument("--metrics-only", action="store_true", help="只输出本地文本统计 <stem>_stats.json（不调用模型）")
+    args = ap.parse_args(argv)
+
+    paths = list(dict.fromkeys(p for spec in args.inputs for p in iter_inputs(spec)))
+    if not paths:
+        print("ERROR: 没有找到可评估的稿件（.pdf/.docx/.txt）。"); return
+    if args.metrics_only:
+        stats = run_metrics_only(paths, Path(args.out_dir))
+        print(f"\n完成 {stats['ok']}/{len(paths)} 篇，失败 {len(stats['failed'])} 篇，耗时 {stats['elapsed']:.2f}s")
+        return
+    if args.fake:
+        from fake_llm import FakeClient
+        client = FakeClient()
+    else:
+        if not evaluate.api_key_configured():
+            print("ERROR: 请先在 evaluate.py 顶部配置真实 API_KEY。"); return
+        client = ScheduledClient(evaluate.OpenAI(api_key=evaluate.API_KEY, max_retries=0))
+
+    cache = None if (args.no_cache or not evaluate.USE_CACHE) else open_cache()
+    stats = run_batch(paths, client, Path(args.out_dir), args.concurrency, cache=cache, mode=args.mode)
+    print(f"\n完成 {stats['ok']}/{len(paths)} 篇，失败 {len(stats['failed'])} 篇，"
+          f"耗时 {stats['elapsed']:.1f}s，吞吐 {stats['per_minute']:.1f} 篇/分钟")
+    if cache is not None:
+        st = cache.stats()
+        print(f"缓存：命中 {st['hits']} / 未命中 {st['misses']}（命中率 {st['hit_rate']:.0%}），共 {st['entries']} 条")
+    if isinstance(client, ScheduledClient):
+        st = client.stats()
+        print(f"调度：请求 {st['requests']}，重试 {st['retries']}（429 {st['rate_limited']} 次），"
+              f"平均等待 {st['avg_wait_seconds']:.2f}s，最长 {st['wait_seconds_max']:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# batch_api.py —— 夜间批量：整目录稿件 → OpenAI Batch API（/v1/responses，24h 窗口，异步价）→ 轮询 → 写出 <stem>_feedback.txt
+# 进度记录在状态文件里：进程中途退出后用同样的参数重跑，会接着轮询已提交的 batch，而不是重新提交。
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import evaluate
+from evaluate import (prepare_text, build_prompt, model_request, ensure_json, normalize_reasoning, needs_chunking,
+                      chunk_texts, merge_chunk_results, cache_variant, save_feedback, open_cache, describe_error,
+                      text_stats_many, with_text_stats)
+from batch import iter_inputs, output_stems
+
+# =============== 配置区（这里改） ===============
+POLL_INTERVAL_S   = 60              # 轮询 batch 状态的间隔
+STATE_FILE        = "batch_state.json"   # 相对输出目录
+COMPLETION_WINDOW = "24h"
+ENDPOINT          = "/v1/responses"
+# ==============================================
+
+TERMINAL = {"completed", "failed", "expired", "cancelled"}
+
+class BatchBackend:
+    """Batch 服务接口：上传请求 JSONL → 创建 batch → 查询状态 → 下载结果文件（实现见下方与 fake_llm.FakeBatchBackend）。"""
+    def upload(self, path: Path) -> str:
+        raise NotImplementedError
+
+    def create(self, input_file_id: str, metadata: dict = None) -> str:
+        raise NotImplementedError
+
+    def retrieve(self, batch_id: str) -> dict:
+        """返回 {"id", "status", "output_file_id", "error_file_id", "request_counts": {"total", "completed", "failed"}}。"""
+        raise NotImplementedError
+
+    def download(self, file_id: str) -> str:
+        raise NotImplementedError
+
+class OpenAIBatchBackend(BatchBackend):
+    def __init__(self, client):
+        self.client = client
+
+    def upload(self, path: Path) -> str:
+        with open(path, "rb") as f:
+            return self.client.files.create(file=f, purpose="batch").id
+
+    def create(self, input_file_id: str, metadata: dict = None) -> str:
+        return self.client.batches.create(input_file_id=input_file_id, endpoint=ENDPOINT,
+                                          completion_window=COMPLETION_WINDOW, metadata=metadata).id
+
+    def retrieve(self, batch_id: str) -> dict:
+        b = self.client.batches.retrieve(batch_id)
+        counts = b.request_counts
+        return {
+            "id": b.id,
+            "status": b.status,
+            "output_file_id": b.output_file_id,
+            "error_file_id": b.error_file_id,
+            "request_counts": {"total": counts.total, "completed": counts.completed, "failed": counts.failed}
+            if counts else {},
+        }
+
+    def download(self, file_id: str) -> str:
+        return self.client.files.content(file_id).text
+
+# =============== 状态文件 ===============
+def load_state(path: Path):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def save_state(path: Path, state: dict):
+    """先写临时文件再 os.replace，进程在任何时刻退出都不会留下半截状态。"""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# =============== 构建 / 提交 ===============
+def build_requests(paths, out_dir: Path, cache=None, log=print):
+    """
+    清洗每篇稿件 → 整批计算本地统计 → Batch JSONL 请求行（body 与 evaluate.model_request 相同；长稿件按块拆成多行）。
+    命中缓存的稿件直接写出反馈，不进 batch。重名稿件的输出前缀与 batch.py 相同（output_stems），存进 essays[...]["stem"]。
+    返回 (requests, essays)。
+    """
+    paths = list(paths)
+    stems = output_stems(paths)
+    prepared = []
+    for i, path in enumerate(paths):
+        try:
+            prepared.append((i, path, prepare_text(path)))
+        except Exception as e:
+            log(f"{path.name}: ❌ 读取失败：{e}")
+    requests, essays = [], {}
+    for (i, path, clean), stats in zip(prepared, text_stats_many([clean for _, _, clean in prepared])):
+        if cache is not None:
+            hit = cache.get(clean, cache_variant("single", clean))
+            if hit is not None:
+                log(f"✅ {path.name} → {save_feedback(with_text_stats(hit, stats), stems[path], out_dir)}（缓存）")
+                continue
+        texts = chunk_texts(clean) if needs_chunking(clean) else [clean]
+        key = f"essay-{i}"
+        essays[key] = {"path": str(path), "stem": stems[path], "parts": len(texts), "digest": _digest(clean),
+                       "text_stats": stats}
+        for j, text in enumerate(texts):
+            prompt = build_prompt(text, stats) if len(texts) == 1 else build_prompt(text)  # 分块时各块现算自己的统计
+            requests.append({"custom_id": f"{key}/{j}", "method": "POST", "url": ENDPOINT,
+                             "body": model_request(prompt)})
+    return requests, essays
+
+def submit(backend: BatchBackend, requests: list, essays: dict, out_dir: Path, state_path: Path, log=print) -> dict:
+    """写出请求 JSONL → 上传 → 创建 batch；每一步完成后立即落盘状态，重跑时从断点继续。"""
+    state = {"essays": essays, "out_dir": str(out_dir), "created_at": int(time.time())}
+    input_path = state_path.with_name(state_path.stem + "_requests.jsonl")
+    with open(input_path, "w", encoding="utf-8") as f:
+        for r in requests:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    state["input_path"] = str(input_path)
+    save_state(state_path, state)
+    return resume_submit(backend, state, state_path, log)
+
+def resume_submit(backend: BatchBackend, state: dict, state_path: Path, log=print) -> dict:
+    if not state.get("input_file_id"):
+        state["input_file_id"] = backend.upload(Path(state["input_path"]))
+        save_state(state_path, state)
+    if not state.get("batch_id"):
+        state["batch_id"] = backend.create(state["input_file_id"], metadata={"source": "batch_api.py"})
+        save_state(state_path, state)
+        log(f"已提交 batch {state['batch_id']}（{len(state['essays'])} 篇）")
+    return state
+
+def poll(backend: BatchBackend, batch_id: str, interval: float = POLL_INTERVAL_S, log=print) -> dict:
+    """轮询直到 batch 进入终态（completed / failed / expired / cancelled）。"""
+    last = None
+    while True:
+        info = backend.retrieve(batch_id)
+        counts = info.get("request_counts") or {}
+        progress = (info["status"], counts.get("completed"), counts.get("failed"))
+        if progress != last:
+            log(f"batch {batch_id}: {info['status']} 完成 {counts.get('completed', 0)}/{counts.get('total', 0)}，"
+                f"失败 {counts.get('failed', 0)}")
+            last = progress
+        if info["status"] in TERMINAL:
+            return info
+        time.sleep(interval)
+
+# =============== 结果 ===============
+def _output_text(body: dict) -> str:
+    """Responses API 回包 → output_text（拼接所有 message 的 output_text 片段）。"""
+    if body.get("output_text"):
+        return body["output_text"]
+    return "".join(c.get("text", "") for item in body.get("output") or [] if item.get("type") == "message"
+                   for c in item.get("content") or [] if c.get("type") == "output_text")
+
+def parse_results(text: str) -> tuple:
+    """结果 JSONL → ({custom_id: output_text}, {custom_id: 错误信息})。"""
+    ok, errors = {}, {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        cid, resp = row.get("custom_id"), row.get("response") or {}
+        if row.get("error") or resp.get("status_code") != 200:
+            err = row.get("error") or (resp.get("body") or {}).get("error") or {}
+            errors[cid] = err.get("message") or f"HTTP {resp.get('status_code')}"
+        else:
+            ok[cid] = _output_text(resp.get("body") or {})
+    return ok, errors
+
+def write_results(state: dict, outputs: dict, errors: dict, cache=None, log=print) -> dict:
+    """每篇稿件的各块结果 → ensure_json → normalize_reasoning（多块合并）→ <stem>_feedback.txt。"""
+    out_dir = Path(state["out_dir"])
+    ok, failed = 0, []
+    for key, essay in state["essays"].items():
+        ids = [f"{key}/{j}" for j in range(essay["parts"])]
+        missing = [cid for cid in ids if cid not in outputs]
+        if missing:
+            msg = "; ".join(sorted({errors.get(cid, "无结果") for cid in missing}))
+            failed.append((essay["path"], msg))
+            log(f"{Path(essay['path']).name}: ❌ {msg}")
+            continue
+        results = [normalize_reasoning(ensure_json(outputs[cid])) for cid in ids]
+        data = results[0] if len(results) == 1 else merge_chunk_results(results)
+        data = with_text_stats(data, essay.get("text_stats"))
+        out_path = save_feedback(data, essay["stem"], out_dir)
+        ok += 1
+        log(f"✅ {Path(essay['path']).name} → {out_path}")
+        if cache is not None and "raw" not in data:
+            try:
+                clean = prepare_text(Path(essay["path"]))
+            except Exception:
+                continue
+            if _digest(clean) == essay["digest"]:  # 提交后文件被改过则不入缓存
+                cache.put(clean, data, cache_variant("single", clean))
+    return {"ok": ok, "failed": failed}
+
+def run_bulk(paths, backend: BatchBackend, out_dir: Path, state_path: Path = None, cache=None,
+             poll_interval: float = POLL_INTERVAL_S, log=print) -> dict:
+    """
+    完整流程：构建 → 提交 → 轮询 → 写出。state_path 存在且未完成时跳过构建，直接续跑（paths 被忽略）。
+    返回 {"ok", "failed", "batch_id", "status"}。
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    state_path = state_path or out_dir / STATE_FILE
+    state = load_state(state_path)
+    if state and not state.get("finished"):
+        log(f"续跑：{state_path}（batch {state.get('batch_id') or '未提交'}）")
+        state = resume_submit(backend, state, state_path, log)
+    else:
+        requests, essays = build_requests(paths, out_dir, cache, log)
+        if not requests:
+            return {"ok": 0, "failed": [], "batch_id": None, "status": "empty"}
+        state = submit(backend, requests, essays, out_dir, state_path, log)
+
+    info = poll(backend, state["batch_id"], poll_interval, log)
+    outputs, errors = {}, {}
+    for file_id in (info.get("output_file_id"), info.get("error_file_id")):
+        if file_id:
+            o, e = parse_results(backend.download(file_id))
+            outputs.update(o)
+            errors.update(e)
+    if info["status"] != "completed" and not outputs:
+        errors.setdefault("*", f"batch {info['status']}")
+    stats = write_results(state, outputs, errors, cache, log)
+    state.update(finished=True, status=info["status"], ok=stats["ok"], failed=len(stats["failed"]))
+    save_state(state_path, state)
+    return {**stats, "batch_id": state["batch_id"], "status": info["status"]}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="通过 OpenAI Batch API 批量生成 <stem>_feedback.txt（可续跑）")
+    ap.add_argument("inputs", nargs="*", help="目录 / glob / @清单文件（续跑时可省略）")
+    ap.add_argument("-o", "--out-dir", default=".", help="输出目录（默认当前目录）")
+    ap.add_argument("--state", default=None, help=f"状态文件（默认 <out-dir>/{STATE_FILE}）")
+    ap.add_argument("--poll", type=float, default=POLL_INTERVAL_S, help="轮询间隔（秒）")
+    ap.add_argument("--fake-dir", default=None, help="使用 fake_llm.FakeBatchBackend，文件存于该目录（离线演练）")
+    ap.add_argument("--no-cache", action="store_true", help="绕过反馈缓存")
+    args = ap.parse_args(argv)
+
+    out_dir = Path(args.out_dir)
+    state_path = Path(args.state) if args.state else out_dir / STATE_FILE
+    paths = list(dict.fromkeys(p for spec in args.inputs for p in iter_inputs(spec)))
+    state = load_state(state_path)
+    if not paths and not (state and not state.get("finished")):
+        print("ERROR: 没有找到可评估的稿件（.pdf/.docx/.txt），也没有可续跑的 batch。"); return
+    if args.fake_dir:
+        from fake_llm import FakeBatchBackend
+        backend = FakeBatchBackend(args.fake_dir)
+    else:
+        if not evaluate.api_key_configured():
+            print("ERROR: 请先在 evaluate.py 顶部配置真实 API_KEY。"); return
+        backend = OpenAIBatchBackend(evaluate.OpenAI(api_key=evaluate.API_KEY))
+
+    cache = None if (args.no_cache or not evaluate.USE_CACHE) else open_cache()
+    try:
+        stats = run_bulk(paths, backend, out_dir, state_path, cache, args.poll)
+    except Exception as e:
+        print(describe_error(e)); return
+    print(f"\nbatch {stats['batch_id']}：{stats['status']}，成功 {stats['ok']} 篇，失败 {len(stats['failed'])} 篇")
+
+if __name__ == "__main__":
+    main()
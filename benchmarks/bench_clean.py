@@ -0,0 +1,86 @@
+# bench_clean.py —— 对比清洗函数：逐字符旧实现 vs 分块 translate 新实现（含 MAX_CHARS 提前停止）
+# 用法：python benchmarks/bench_clean.py [--sizes 20000,180000,2000000] [--repeat 5]
+import argparse
+import random
+import re
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from evaluate import MAX_CHARS, clean_text_keep_letters_numbers_punct_whitespace, clean_text_with_budget
+
+def clean_text_reference(text: str) -> str:
+    """优化前的实现（原样保留，作对照与一致性校验）。"""
+    if not isinstance(text, str):
+        return ""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    kept = []
+    for ch in text:
+        if ch in (" ", "\n", "\t"):
+            kept.append(ch); continue
+        cat = unicodedata.category(ch)  # L/N/P
+        if cat.startswith(("L", "N", "P")):
+            kept.append(ch)
+    filtered = "".join(kept)
+    paras = filtered.split("\n\n")
+    norm = []
+    for para in paras:
+        joined = " ".join(para.split("\n"))
+        joined = re.sub(r"[ \t]{2,}", " ", joined).strip()
+        if joined:
+            norm.append(joined)
+    return "\n\n".join(norm)
+
+# 多语种 + 扫描 PDF 常见噪声（控制符、全角空格、emoji、CRLF、多余换行）
+WORDS = [
+    "education", "technology", "society", "however", "therefore", "students",
+    "教育", "科技", "社会", "然而", "因此", "学生",
+    "éducation", "über", "Straße", "образование", "общество", "التعليم", "ΕΛΛΑΔΑ",
+    "1999", "٣٤", "42%",
+]
+NOISE = [",", ".", "!", "?", "，", "。", "“", "”", "—", "  ", "\t", "　", "\x0c", "\x00", "😀", "©", "+", "=", "\r\n", "\n"]
+
+def synthetic_text(n_chars: int, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    out, size = [], 0
+    while size < n_chars:
+        piece = rnd.choice(WORDS) + (rnd.choice(NOISE) if rnd.random() < 0.3 else " ")
+        if rnd.random() < 0.01:
+            piece += "\n\n"
+        out.append(piece)
+        size += len(piece)
+    return "".join(out)[:n_chars]
+
+def timeit(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="20000,180000,2000000")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    print(f"{'chars':>10} {'reference':>11} {'new':>9} {'budgeted':>9} {'speedup':>8}  identical")
+    for n in (int(x) for x in args.sizes.split(",")):
+        text = synthetic_text(n)
+        ref = clean_text_reference(text)
+        same = clean_text_keep_letters_numbers_punct_whitespace(text) == ref
+        budget, truncated = clean_text_with_budget(text, MAX_CHARS)
+        same = same and budget == ref[:MAX_CHARS] and truncated == (len(ref) > MAX_CHARS)
+        t_ref = timeit(lambda: clean_text_reference(text), args.repeat)
+        t_new = timeit(lambda: clean_text_keep_letters_numbers_punct_whitespace(text), args.repeat)
+        t_bud = timeit(lambda: clean_text_with_budget(text, MAX_CHARS), args.repeat)
+        print(f"{n:>10} {t_ref * 1000:>9.1f}ms {t_new * 1000:>7.1f}ms {t_bud * 1000:>7.1f}ms "
+              f"{t_ref / t_new:>7.1f}x  {same}")
+        if not same:
+            sys.exit("输出与旧实现不一致！")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+# bench_e2e.py —— 端到端基准：合成 .txt/.docx/.pdf 稿件（以 data/sample_essay.docx 开头）→ 完整流水线 → 本地假 Responses 服务
+# 模型调用走真实 openai SDK + scheduler.ScheduledClient，对端是 fake_llm.FakeResponsesServer（可配延迟 / 429 比例），回包为 data/feedback.txt。
+# 输出一份 JSON（逐阶段耗时分位数、逐阶段峰值内存、吞吐、Flask 路由延迟），--out 落盘、--baseline 与上次结果对比。
+# 用法：python benchmarks/bench_e2e.py [--sizes 2000,20000,200000] [--formats txt,docx,pdf] [--essays 3]
+#       [--latency 0.2] [--error-rate 0.05] [-j 8] [--no-routes] [--out bench.json] [--baseline old.json]
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+import evaluate
+import metrics
+from evaluate import (read_file_text, clean_text_keep_letters_numbers_punct_whitespace, text_stats, with_text_stats,
+                      build_prompt, call_model, ensure_json, normalize_reasoning, chunk_texts, merge_chunk_results,
+                      needs_chunking)
+from fake_llm import FakeResponsesServer
+from scheduler import ScheduledClient
+from synth import essay_text, essay_docx, paragraphs_pdf
+
+SAMPLE_DOCX = ROOT / "data" / "sample_essay.docx"
+STAGES = ("read", "clean", "textstats", "build_prompt", "model", "ensure_json", "normalize", "merge")
+
+# =============== 合成稿件 ===============
+def make_essays(out_dir: Path, sizes, formats, per_case: int) -> list:
+    """每个 (格式, 目标字符数) 生成 per_case 篇；返回 [{"path", "format", "chars"}]。"""
+    base = [p for p in read_file_text(SAMPLE_DOCX).splitlines() if p.strip()]
+    essays = []
+    for n in sizes:
+        for k in range(per_case):
+            paras = essay_text(n, base, seed=n * 1000 + k)
+            extra = paras[len(base):]  # .docx 直接在示例文档后追加，保留原有样式与段落
+            for fmt in formats:
+                path = out_dir / f"essay_{n}_{k}.{fmt}"
+                if fmt == "txt":
+                    path.write_text("\n\n".join(paras), encoding="utf-8")
+                elif fmt == "docx":
+                    path.write_bytes(essay_docx(extra, template=SAMPLE_DOCX))
+                elif fmt == "pdf":
+                    path.write_bytes(paragraphs_pdf(paras))
+                else:
+                    raise SystemExit(f"不支持的格式：{fmt}")
+                essays.append({"path": path, "format": fmt, "chars": n})
+    return essays
+
+# =============== 逐阶段计时 / 内存 ===============
+class StageRecorder:
+    """run(阶段, fn, *args)：记录每次耗时；memory=True 时用 tracemalloc 记录该阶段内的峰值新增分配。"""
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.times = {}          # 阶段 → [秒]
+        self.peaks = {}          # 阶段 → 最大峰值字节
+        self._lock = threading.Lock()
+
+    def run(self, name: str, fn, *args):
+        if self.memory:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self.times.setdefault(name, []).append(elapsed)
+            if self.memory:
+                peak = tracemalloc.get_traced_memory()[1] - base
+                self.peaks[name] = max(self.peaks.get(name, 0), peak)
+        return result
+
+def pipeline(path: Path, client, rec: StageRecorder) -> dict:
+    """与 evaluate.evaluate_file 相同的各步骤，逐步计时（长稿件按块顺序评估后合并）。"""
+    text = rec.run("read", read_file_text, path)
+    clean = rec.run("clean", clean_text_keep_letters_numbers_punct_whitespace, text)
+    stats = rec.run("textstats", text_stats, clean)
+    chunks = chunk_texts(clean) if needs_chunking(clean) else [clean]
+    results = []
+    for chunk in chunks:
+        prompt = rec.run("build_prompt", build_prompt, chunk, stats if len(chunks) == 1 else None)
+        raw = rec.run("model", call_model, client, prompt)
+        obj = rec.run("ensure_json", ensure_json, raw)
+        results.append(rec.run("normalize", normalize_reasoning, obj))
+    data = rec.run("merge", merge_chunk_results, results) if len(results) > 1 else results[0]
+    return with_text_stats(data, stats)
+
+def summarize(samples: list) -> dict:
+    s = sorted(samples)
+    pick = lambda q: s[min(len(s) - 1, int(q * len(s)))]
+    return {
+        "count": len(s),
+        "total_s": round(sum(s), 6),
+        "mean_ms": round(1000 * sum(s) / len(s), 3),
+        "p50_ms": round(1000 * pick(0.5), 3),
+        "p95_ms": round(1000 * pick(0.95), 3),
+        "max_ms": round(1000 * s[-1], 3),
+    }
+
+def peak_rss_kb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+# =============== 各项测量 ===============
+def bench_stages(essays: list, client) -> dict:
+    """串行逐篇跑流水线：按 (格式, 字符数) 与全体汇总各阶段耗时。"""
+    cases = {}
+    for e in essays:
+        rec = cases.setdefault(f"{e['format']}/{e['chars']}", StageRecorder())
+        data = pipeline(e["path"], client, rec)
+        assert "raw" not in data, f"{e['path'].name}: 模型输出解析失败"
+    overall = {}
+    for rec in cases.values():
+        for name, samples in rec.times.items():
+            overall.setdefault(name, []).extend(samples)
+    return {
+        "overall": {k: summarize(overall[k]) for k in STAGES if k in overall},
+        "by_case": {case: {k: summarize(v) for k, v in rec.times.items()} for case, rec in cases.items()},
+    }
+
+def bench_memory(essays: list, client) -> dict:
+    """每个 (格式, 字符数) 取一篇在 tracemalloc 下重跑，记录各阶段峰值新增内存（KB）；与计时分开以免拖慢计时。"""
+    seen, out = set(), {}
+    tracemalloc.start()
+    try:
+        for e in essays:
+            case = f"{e['format']}/{e['chars']}"
+            if case in seen:
+                continue
+            seen.add(case)
+            rec = StageRecorder(memory=True)
+            pipeline(e["path"], client, rec)
+            out[case] = {k: round(v / 1024, 1) for k, v in rec.peaks.items()}
+    finally:
+        tracemalloc.stop()
+    return out
+
+def bench_throughput(essays: list, client, workers: int) -> dict:
+    """evaluate.evaluate_file 并发跑全部稿件（真实的分块并发路径），统计篇/分钟与字符/秒。"""
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        results = list(ex.map(lambda e: evaluate.evaluate_file(e["path"], client), essays))
+    elapsed = time.perf_counter() - t0
+    failed = sum("raw" in r for r in results)
+    chars = sum(e["chars"] for e in essays)
+    return {
+        "essays": len(essays),
+        "workers": workers,
+        "failed": failed,
+        "wall_s": round(elapsed, 3),
+        "essays_per_min": round(60 * len(essays) / elapsed, 1),
+        "chars_per_s": round(chars / elapsed),
+    }
+
+def bench_routes(essays: list, client, work_dir: Path, poll_s: float = 0.02) -> dict:
+    """Flask 测试客户端：POST /upload → 轮询 /job 至完成；另测 /status 与 /api/uploads/status 的响应时间。"""
+    import process
+    from ingest import BlobStore
+    from storage import SQLiteUploadStore
+
+    process.SAVE_ROOT = work_dir / "uploads"
+    process.BLOBS = BlobStore(process.SAVE_ROOT / "_blobs")
+    process.STORE = SQLiteUploadStore(work_dir / "uploads.sqlite3")
+    process.FEEDBACK_CACHE = None
+    process.EVAL_CLIENT = client
+    process.STREAM_FEEDBACK = False  # FakeResponsesServer 不支持 stream=True
+    http = process.app.test_client()
+    times = {"upload": [], "job_done": [], "status": [], "bulk_status": []}
+
+    pending = {}
+    for e in essays:
+        while True:
+            t0 = time.perf_counter()
+            with open(e["path"], "rb") as fh:
+                r = http.post("/upload", data={"paper": (fh, e["path"].name)}, content_type="multipart/form-data")
+            if r.status_code != 429:
+                break
+            time.sleep(poll_s * 10)  # 队列满：等已有任务消化
+        times["upload"].append(time.perf_counter() - t0)
+        assert r.status_code == 200, f"/upload {r.status_code}"
+        upload_id = re.search(r"<code>([0-9a-f-]{36})</code>", r.get_data(as_text=True)).group(1)
+        pending[upload_id] = t0
+
+    failed = 0
+    while pending:
+        for upload_id, t0 in list(pending.items()):
+            status = http.get(f"/feedback/{upload_id}/job").get_json()["status"]
+            if status in ("done", "failed"):
+                times["job_done"].append(time.perf_counter() - t0)
+                failed += status == "failed"
+                del pending[upload_id]
+        time.sleep(poll_s)
+
+    ids = [it["upload_id"] for it in process.STORE.list_page(0, len(essays))[0]]
+    for upload_id in ids:
+        t0 = time.perf_counter()
+        http.get(f"/feedback/{upload_id}/status")
+        times["status"].append(time.perf_counter() - t0)
+    for _ in range(5):
+        t0 = time.perf_counter()
+        http.post("/api/uploads/status", json={"ids": ids})
+        times["bulk_status"].append(time.perf_counter() - t0)
+    return {"failed": failed, **{k: summarize(v) for k, v in times.items() if v}}
+
+def token_report() -> dict:
+    """按 prompt 模板汇总 usage tokens 与前缀缓存命中比例（cached_input / input）。"""
+    out = {}
+    for (kind, template), n in metrics.MODEL_TOKENS.snapshot().items():
+        out.setdefault(template or "-", {})[kind] = n
+    for t in out.values():
+        t["cached_ratio"] = round(t.get("cached_input", 0) / t["input"], 3) if t.get("input") else 0.0
+    return out
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(report: dict, baseline: dict) -> dict:
+    """相对基线的比值：stage_mean_ratio = 本次 / 基线 mean_ms（>1 变慢）；throughput_ratio = 本次 / 基线篇每分钟（>1 变快）。"""
+    old = baseline.get("stages", {}).get("overall", {})
+    slower = {
+        k: round(v["mean_ms"] / old[k]["mean_ms"], 3)
+        for k, v in report["stages"]["overall"].items() if k in old and old[k]["mean_ms"] > 0
+    }
+    out = {"baseline_commit": baseline.get("meta", {}).get("commit"), "stage_mean_ratio": slower}
+    if baseline.get("throughput") and report.get("throughput"):
+        out["throughput_ratio"] = round(
+            report["throughput"]["essays_per_min"] / baseline["throughput"]["essays_per_min"], 3)
+    return out
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="2000,20000,200000", help="合成稿件的目标字符数，逗号分隔")
+    ap.add_argument("--formats", default="txt,docx,pdf")
+    ap.add_argument("--essays", type=int, default=3, help="每个 (格式, 大小) 的篇数")
+    ap.add_argument("--latency", type=float, default=0.2, help="假服务每次请求的延迟（秒）")
+    ap.add_argument("--error-rate", type=float, default=0.05, help="假服务返回 429 的概率")
+    ap.add_argument("--retry-after", type=float, default=0.05, help="429 附带的 retry-after（秒）")
+    ap.add_argument("--cached-speedup", type=float, default=0.0, help="假服务前缀缓存全部命中时延迟缩短的比例（0–1）")
+    ap.add_argument("-j", "--workers", type=int, default=8, help="吞吐测试的并发篇数")
+    ap.add_argument("--no-routes", action="store_true", help="跳过 Flask 路由测量")
+    ap.add_argument("--no-memory", action="store_true", help="跳过 tracemalloc 内存测量")
+    ap.add_argument("--out", help="结果 JSON 写入该文件")
+    ap.add_argument("--baseline", help="上一次的结果 JSON，输出中附带对比")
+    args = ap.parse_args(argv)
+
+    from openai import OpenAI
+    sizes = [int(x) for x in args.sizes.split(",")]
+    formats = [x.strip().lower() for x in args.formats.split(",")]
+    evaluate.PDF_WORKERS = 1  # 计时只看单进程路径
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeResponsesServer(latency=args.latency, error_rate=args.error_rate, retry_after=args.retry_after,
+                                cached_speedup=args.cached_speedup) as server:
+        tmp = Path(tmp)
+        (tmp / "essays").mkdir()
+        essays = make_essays(tmp / "essays", sizes, formats, args.essays)
+        client = ScheduledClient(OpenAI(api_key="sk-bench", base_url=server.url, max_retries=0), backoff_base=0.05,
+                                 backoff_cap=1.0)
+
+        t0 = time.perf_counter()
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+                "essays": len(essays),
+                "bytes": {fmt: sum(e["path"].stat().st_size for e in essays if e["format"] == fmt) for fmt in formats},
+            },
+            "stages": bench_stages(essays, client),
+        }
+        if not args.no_memory:
+            report["memory_peak_kb"] = bench_memory(essays, client)
+        report["throughput"] = bench_throughput(essays, client, args.workers)
+        if not args.no_routes:
+            report["routes"] = bench_routes(essays, client, tmp)
+        report["server"] = {"requests": server.requests, "rate_limited": server.rate_limited,
+                            "max_in_flight": server.max_in_flight, "cached_tokens": server.cached_tokens}
+        report["tokens"] = token_report()
+        report["scheduler"] = client.stats()
+        report["extraction"] = evaluate.extraction_stats()
+        report["peak_rss_kb"] = peak_rss_kb()
+        report["wall_s"] = round(time.perf_counter() - t0, 3)
+
+    if args.baseline:
+        report["compare"] = compare(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+
+if __name__ == "__main__":
+    main()
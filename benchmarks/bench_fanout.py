@@ -0,0 +1,69 @@
+# bench_fanout.py —— 端到端延迟：单次四维调用（single）vs 四维度并发小请求（fanout）
+# 模拟模型耗时 = 首 token 延迟 + 输出 tokens / 生成速度；输出取自 data/feedback.txt。
+# 用法：python benchmarks/bench_fanout.py [--ttft 0.8] [--tps 60] [--essays 5] [--fail-rate 0.1]
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import evaluate
+from fake_llm import FakeClient, sample_output
+from synth import essay_paragraphs
+
+def scripted_client(ttft: float, tps: float, fail_rate: float, seed: int = 0) -> FakeClient:
+    """整篇 prompt 回完整 JSON；单维度 prompt（按 system 前缀的模板区分）只回该维度对象；按 fail_rate 随机返回非 JSON 以触发重试。"""
+    full = json.loads(sample_output())
+    rnd = random.Random(seed)
+    lock = threading.Lock()
+
+    def reply_for(kwargs) -> str:
+        for dim, template in evaluate.DIMENSIONS.items():
+            if kwargs["input"][0]["content"] == template.instructions:
+                return json.dumps(full["feedback"][dim], ensure_ascii=False)
+        return json.dumps(full, ensure_ascii=False)
+
+    def output(kwargs):
+        with lock:
+            broken = rnd.random() < fail_rate
+        return "Sorry, I cannot comply." if broken else reply_for(kwargs)
+
+    def latency(kwargs):
+        # 估算输出 tokens（约 4 字符/token），上限为本次请求的 max_output_tokens
+        tokens = min(len(reply_for(kwargs)) / 4, kwargs["max_output_tokens"])
+        return ttft + tokens / tps
+
+    return FakeClient(output=output, latency=latency)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ttft", type=float, default=0.8, help="首 token 延迟（秒）")
+    ap.add_argument("--tps", type=float, default=60.0, help="输出 tokens/秒")
+    ap.add_argument("--essays", type=int, default=5)
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="单次调用返回非 JSON 的概率")
+    args = ap.parse_args(argv)
+
+    evaluate.FANOUT_RETRIES = 3
+    texts = ["\n\n".join(essay_paragraphs(6, seed=i)) for i in range(args.essays)]
+    report = {}
+    for mode in ("single", "fanout"):
+        client = scripted_client(args.ttft, args.tps, args.fail_rate if mode == "fanout" else 0.0)
+        latencies = []
+        for text in texts:
+            t0 = time.perf_counter()
+            data = evaluate.evaluate_text(text, client, mode=mode)
+            latencies.append(time.perf_counter() - t0)
+            assert set(data["feedback"]) >= {"Grammar", "Vocabulary", "Organization", "Reasoning"}
+        report[mode] = {
+            "mean_s": round(sum(latencies) / len(latencies), 3),
+            "max_s": round(max(latencies), 3),
+            "calls": len(client.calls),
+        }
+    report["speedup"] = round(report["single"]["mean_s"] / report["fanout"]["mean_s"], 2)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# bench_parse.py —— 反馈 JSON 提取：旧的贪婪正则 \{[\s\S]*\} vs feedback_parse 线性括号扫描（含病态输入）
+# 旧实现在子进程里跑，超过 --timeout 秒记为超时（未闭合的 "{" 会让它退化为平方级回溯）。
+# 用法：python benchmarks/bench_parse.py [--sizes 10000,100000,1000000,10000000] [--timeout 10]
+import argparse
+import json
+import multiprocessing as mp
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from fake_llm import sample_output
+from feedback_parse import extract_json_object, is_feedback_object, validate_feedback
+
+def ensure_json_reference(text: str):
+    """优化前 evaluate.ensure_json / process.parse_feedback_text_to_json 的逻辑（原样保留作对照）。"""
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except Exception:
+        pass
+    m = re.search(r"\{[\s\S]*\}", text)
+    if m:
+        try:
+            return json.loads(m.group(0))
+        except Exception:
+            pass
+    return {"raw": text}
+
+PROSE = "The essay argues that technology changes education; however, the evidence is thin. "
+
+def _fill(unit: str, n: int) -> str:
+    return (unit * (n // len(unit) + 1))[:n]
+
+def cases(n: int) -> dict:
+    sample = sample_output()
+    return {
+        # 模型输出：说明文字 + ```json 包裹 + 结尾寒暄（正常情况）
+        "wrapped": _fill(PROSE, n // 2) + "\n```json\n" + sample + "\n```\n" + _fill(PROSE, n // 2),
+        # 被 max_output_tokens 截断、反复出现的半截 JSON（只有 "{"、很少 "}"）
+        "truncated": _fill(sample[: len(sample) // 3], n),
+        # 全是未闭合的 "{"
+        "open_braces": "{" * n,
+        # 正文里夹杂大量 "{"，最后才出现合法对象（接近 10MB 上传的最坏情况）
+        "brace_noise": _fill("{ lorem ipsum ", n) + sample,
+        # 深层嵌套的数组：json.loads 会抛 RecursionError，必须当作解析失败而不是异常上抛
+        "nested": '{"feedback": ' + "[" * (n // 2) + "]" * (n // 2) + "}",
+        "nested_prose": "x " + '{"feedback": ' + "[" * (n // 2) + "]" * (n // 2) + "}",
+    }
+
+def _run_reference(text: str, out):
+    t0 = time.perf_counter()
+    obj = ensure_json_reference(text)
+    out.put((time.perf_counter() - t0, is_feedback_object(obj)))
+
+def time_reference(text: str, timeout: float):
+    """子进程里跑旧实现；超时返回 (None, None)。"""
+    out = mp.Queue()
+    p = mp.Process(target=_run_reference, args=(text, out))
+    p.start()
+    p.join(timeout)
+    if p.is_alive():
+        p.terminate()
+        p.join()
+        return None, None
+    return out.get()
+
+def time_new(text: str):
+    t0 = time.perf_counter()
+    obj = extract_json_object(text, is_feedback_object)
+    fb = validate_feedback(obj) if obj is not None else None
+    return time.perf_counter() - t0, fb is not None
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10000,100000,1000000,10000000", help="输入字符数，逗号分隔")
+    ap.add_argument("--timeout", type=float, default=10.0, help="旧实现单次运行的超时（秒）")
+    args = ap.parse_args(argv)
+
+    report = []
+    for n in (int(x) for x in args.sizes.split(",")):
+        for name, text in cases(n).items():
+            old_s, old_found = time_reference(text, args.timeout)
+            new_s, new_found = time_new(text)
+            if name.startswith("nested"):
+                assert not new_found, f"{name}: 嵌套过深的输入不应被当成反馈对象"
+            report.append({
+                "case": name,
+                "chars": len(text),
+                "old_s": round(old_s, 4) if old_s is not None else f">{args.timeout:g} (timeout)",
+                "new_s": round(new_s, 4),
+                "old_found": old_found,
+                "new_found": new_found,
+                "speedup": round(old_s / new_s, 1) if old_s is not None and new_s > 0 else None,
+            })
+            print(json.dumps(report[-1], ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# bench_pdf.py —— 长 PDF 页面提取：串行 vs 多进程分段（结果须逐字一致）
+# 用法：python benchmarks/bench_pdf.py [--pages 400] [--workers 4] [--repeat 3]
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import evaluate
+from synth import essay_pdf
+
+def best_of(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=400)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "long_essay.pdf"
+        path.write_bytes(essay_pdf(args.pages))
+
+        evaluate.PDF_WORKERS = 1
+        t_serial, serial = best_of(lambda: evaluate.read_file_text(path), args.repeat)
+
+        evaluate.PDF_WORKERS = max(2, args.workers)
+        evaluate.read_file_text(path)  # 预热进程池，不计入
+        t_par, parallel = best_of(lambda: evaluate.read_file_text(path), args.repeat)
+
+    print(f"pages={args.pages} workers={evaluate.PDF_WORKERS} (cpu={os.cpu_count()})")
+    print(f"serial   {t_serial:.3f}s")
+    print(f"parallel {t_par:.3f}s  speedup {t_serial / t_par:.2f}x  identical={serial == parallel}")
+    if serial != parallel:
+        sys.exit("并行提取结果与串行不一致！")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# bench_startup.py —— 启动与单篇延迟：每篇起一个进程的 CLI 方式 vs 常驻 worker.py（同一个本地假 Responses 服务）
+# CLI 方式与 evaluate.main 相同：新解释器 → 导入 → 新建 OpenAI client（冷连接）→ 评估 → 写文件；worker 只在启动时付这些开销。
+# 另测 `import evaluate` 的耗时：当前（解析库/openai 按需导入）vs 启动即全部导入（优化前的行为）。
+# 用法：python benchmarks/bench_startup.py [--essays 10] [--latency 0.05] [--repeat 3]
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from fake_llm import FakeResponsesServer
+from synth import essay_paragraphs, essay_docx, paragraphs_pdf
+
+# 子进程里跑的一次性 CLI（与 evaluate.main 的流程一致，只是 base_url 指向假服务、关闭缓存）
+CLI_DRIVER = """
+import sys
+from pathlib import Path
+import evaluate
+from openai import OpenAI
+from scheduler import ScheduledClient
+path, url, out_dir = Path(sys.argv[1]), sys.argv[2], Path(sys.argv[3])
+client = ScheduledClient(OpenAI(api_key="sk-bench", base_url=url, max_retries=0))
+data = evaluate.evaluate_file(path, client)
+evaluate.save_feedback(data, path.stem, out_dir)
+"""
+
+def stats_ms(samples: list) -> dict:
+    s = sorted(samples)
+    return {
+        "count": len(s),
+        "mean_ms": round(1000 * sum(s) / len(s), 1),
+        "p50_ms": round(1000 * s[len(s) // 2], 1),
+        "max_ms": round(1000 * s[-1], 1),
+    }
+
+def make_essays(out_dir: Path, n: int) -> list:
+    """短稿件（约 6 段），.txt / .docx / .pdf 轮流。"""
+    paths = []
+    for i in range(n):
+        paras = essay_paragraphs(6, seed=i)
+        fmt = ("txt", "docx", "pdf")[i % 3]
+        path = out_dir / f"essay_{i}.{fmt}"
+        if fmt == "txt":
+            path.write_text("\n\n".join(paras), encoding="utf-8")
+        elif fmt == "docx":
+            path.write_bytes(essay_docx(paras))
+        else:
+            path.write_bytes(paragraphs_pdf(paras))
+        paths.append(path)
+    return paths
+
+def time_import(code: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def bench_cli(paths: list, url: str, out_dir: Path) -> list:
+    samples = []
+    for path in paths:
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", CLI_DRIVER, str(path), url, str(out_dir)], cwd=ROOT, check=True)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+def bench_worker(paths: list, url: str, out_dir: Path) -> dict:
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, str(ROOT / "worker.py"), "--base-url", url, "--no-cache", "-o", str(out_dir)],
+                            cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding="utf-8")
+    try:
+        ready = json.loads(proc.stdout.readline())
+        startup = time.perf_counter() - t0
+        samples, failed = [], 0
+        for path in paths:
+            t1 = time.perf_counter()
+            proc.stdin.write(json.dumps({"path": str(path)}) + "\n")
+            proc.stdin.flush()
+            res = json.loads(proc.stdout.readline())
+            samples.append(time.perf_counter() - t1)
+            failed += not res["ok"]
+    finally:
+        proc.stdin.close()
+        proc.wait(timeout=30)
+    return {"startup_s": startup, "ready": ready, "samples": samples, "failed": failed}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--essays", type=int, default=10)
+    ap.add_argument("--latency", type=float, default=0.05, help="假服务每次请求的延迟（秒）")
+    ap.add_argument("--repeat", type=int, default=3, help="import 计时取最好的一次")
+    args = ap.parse_args(argv)
+
+    report = {
+        "import_s": {
+            "lazy": round(time_import("import evaluate", args.repeat), 3),
+            "eager": round(time_import("import evaluate, openai, docx, PyPDF2", args.repeat), 3),
+        }
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        (tmp / "essays").mkdir()
+        paths = make_essays(tmp / "essays", args.essays)
+        with FakeResponsesServer(latency=args.latency) as server:
+            cli = bench_cli(paths, server.url, tmp)
+            cli_connections = server.connections
+            worker = bench_worker(paths, server.url, tmp)
+            worker_connections = server.connections - cli_connections
+    report["cli"] = {**stats_ms(cli), "total_s": round(sum(cli), 2), "connections": cli_connections}
+    report["worker"] = {
+        "startup_ms": round(1000 * worker["startup_s"], 1),
+        "startup_ms_in_process": worker["ready"]["startup_ms"],
+        "first_essay_ms": round(1000 * worker["samples"][0], 1),
+        **stats_ms(worker["samples"]),
+        "total_s_incl_startup": round(worker["startup_s"] + sum(worker["samples"]), 2),
+        "failed": worker["failed"],
+        "connections": worker_connections,
+    }
+    report["speedup_per_essay"] = round(report["cli"]["mean_ms"] / report["worker"]["mean_ms"], 1)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# synth.py —— 基准用的合成稿件生成（PDF 为最小可解析的 Helvetica 文本页，纯标准库；.docx 经 python-docx，用到时才导入）
+import io
+import random
+import textwrap
+
+SENTENCES = [
+    "Many people believe that university education should be free for everyone.",
+    "However, the cost of higher education is a major reason why students avoid it.",
+    "Governments must weigh the benefits of an educated workforce against tax burdens.",
+    "In my opinion, a balanced approach that combines scholarships and loans is best.",
+    "For example, several European countries provide tuition-free programs to residents.",
+    "Critics argue that free tuition reduces the perceived value of a degree.",
+    "Therefore, policy makers should consider both economic and social outcomes.",
+    "Students who graduate without debt are more likely to start their own businesses.",
+]
+
+def essay_paragraphs(n_paragraphs: int, seed: int = 0, sentences_per_paragraph: int = 5):
+    rnd = random.Random(seed)
+    return [
+        " ".join(rnd.choice(SENTENCES) for _ in range(sentences_per_paragraph))
+        for _ in range(n_paragraphs)
+    ]
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages) -> bytes:
+    """pages: 每页若干行文本（仅 Latin-1）。返回完整 PDF 字节。"""
+    n = len(pages)
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(n))
+    objs = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {n} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, lines in enumerate(pages):
+        objs.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        body = "BT /F1 11 Tf 14 TL 50 750 Td " + " ".join(f"({_pdf_escape(l)}) Tj T*" for l in lines) + " ET"
+        data = body.encode("latin-1", errors="replace")
+        objs.append(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objs):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % (i + 1) + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, xref)
+    return bytes(out)
+
+def essay_pdf(n_pages: int, lines_per_page: int = 45, seed: int = 0) -> bytes:
+    rnd = random.Random(seed)
+    pages = [
+        [f"{rnd.choice(SENTENCES)[:90]}" for _ in range(lines_per_page)]
+        for _ in range(n_pages)
+    ]
+    return make_pdf(pages)
+
+def essay_text(n_chars: int, base_paragraphs=(), seed: int = 0) -> list:
+    """以 base_paragraphs（如示例稿件的段落）开头，随机段落补足到约 n_chars 字符；返回段落列表。"""
+    paras = [p for p in base_paragraphs if p.strip()]
+    size = sum(len(p) + 2 for p in paras)
+    rnd = random.Random(seed)
+    while size < n_chars:
+        para = essay_paragraphs(1, seed=rnd.randrange(1 << 30))[0]
+        paras.append(para)
+        size += len(para) + 2
+    return paras
+
+def essay_docx(paragraphs, template=None) -> bytes:
+    """在 template（.docx 路径，缺省为空白文档）末尾追加段落；返回 .docx 字节。"""
+    from docx import Document
+    doc = Document(str(template)) if template else Document()
+    for para in paragraphs:
+        doc.add_paragraph(para)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+def paragraphs_pdf(paragraphs, lines_per_page: int = 45, width: int = 90) -> bytes:
+    """段落按 width 折行后排成若干页（段落之间空一行）。"""
+    lines = []
+    for para in paragraphs:
+        lines.extend(textwrap.wrap(para, width) + [""])
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    return make_pdf(pages)
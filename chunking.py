@@ -0,0 +1,104 @@
+# chunking.py —— 长稿件分块：本地 token 估算 → 按段落边界打包 → 多块反馈合并去重
+import re
+from difflib import SequenceMatcher
+
+# =============== 配置区（这里改） ===============
+MERGED_MAX_ITEMS   = 8      # 合并后每个维度 issues / revision_tips 的上限
+MERGED_SUMMARY_MAX = 4      # 合并后 summary 保留的句子数
+NEAR_DUP_RATIO     = 0.85   # 两条意见相似度 ≥ 该值视为重复
+# ==============================================
+
+# CJK/假名/韩文大致 1 字 ≈ 1 token，其余文字约 4 字符 ≈ 1 token
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s*")
+_WORDS = re.compile(r"\w+")
+
+def estimate_tokens(text: str) -> int:
+    """无需 tokenizer 的本地估算，偏保守。"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def _split_long_paragraph(para: str, max_tokens: int) -> list:
+    """超长段落按句子打包；单句仍超长则按字符硬切。"""
+    pieces, cur, cur_tokens = [], [], 0
+    for sent in (s for s in _SENTENCE_END.split(para) if s):
+        t = estimate_tokens(sent)
+        if t > max_tokens:
+            step = max(1, int(len(sent) * max_tokens / t))
+            subs = [sent[i:i + step] for i in range(0, len(sent), step)]
+        else:
+            subs = [sent]
+        for sub in subs:
+            st = estimate_tokens(sub)
+            if cur and cur_tokens + st > max_tokens:
+                pieces.append(" ".join(cur))
+                cur, cur_tokens = [], 0
+            cur.append(sub)
+            cur_tokens += st
+    if cur:
+        pieces.append(" ".join(cur))
+    return pieces
+
+def split_into_chunks(clean_text: str, max_tokens: int) -> list:
+    """按清洗后保留的段落边界（"\\n\\n"）贪心打包，每块估算不超过 max_tokens。"""
+    chunks, cur, cur_tokens = [], [], 0
+    for para in clean_text.split("\n\n"):
+        t = estimate_tokens(para)
+        for piece in (_split_long_paragraph(para, max_tokens) if t > max_tokens else [para]):
+            pt = estimate_tokens(piece)
+            if cur and cur_tokens + pt > max_tokens:
+                chunks.append("\n\n".join(cur))
+                cur, cur_tokens = [], 0
+            cur.append(piece)
+            cur_tokens += pt
+    if cur:
+        chunks.append("\n\n".join(cur))
+    return chunks
+
+def _norm(text: str) -> str:
+    return " ".join(_WORDS.findall(text.lower()))
+
+def dedupe_near(items, limit: int = None) -> list:
+    """保序去重：规范化后完全相同或相似度 ≥ NEAR_DUP_RATIO 的只保留第一条。"""
+    kept, norms = [], []
+    for item in items:
+        if not isinstance(item, str) or not item.strip():
+            continue
+        n = _norm(item)
+        dup = False
+        for other in norms:
+            if n == other:
+                dup = True
+                break
+            sm = SequenceMatcher(None, n, other)
+            if sm.real_quick_ratio() >= NEAR_DUP_RATIO and sm.quick_ratio() >= NEAR_DUP_RATIO \
+                    and sm.ratio() >= NEAR_DUP_RATIO:
+                dup = True
+                break
+        if not dup:
+            kept.append(item.strip())
+            norms.append(n)
+            if limit and len(kept) >= limit:
+                break
+    return kept
+
+def _merge_summaries(summaries) -> str:
+    sentences = [s for text in summaries for s in _SENTENCE_END.split((text or "").strip()) if s]
+    return " ".join(dedupe_near(sentences, MERGED_SUMMARY_MAX))
+
+def merge_feedback(results: list, dimensions) -> dict:
+    """把各块（已 normalize_reasoning）的反馈合并成一份四维结果；意见按块顺序合并并去重。"""
+    return {
+        "summary": _merge_summaries(r.get("summary") for r in results),
+        "feedback": {
+            dim: {
+                "summary": _merge_summaries(r["feedback"][dim]["summary"] for r in results),
+                "issues": dedupe_near((x for r in results for x in r["feedback"][dim]["issues"]), MERGED_MAX_ITEMS),
+                "revision_tips": dedupe_near(
+                    (x for r in results for x in r["feedback"][dim]["revision_tips"]), MERGED_MAX_ITEMS),
+            }
+            for dim in dimensions
+        },
+    }
@@ -1,189 +1,595 @@
 # evaluate.py —— 固定四维(Grammar/Vocabulary/Organization/Reasoning) & 保存为本地 .txt
-import json, re, unicodedata
-from io import BytesIO
+import hashlib, json, logging, re, sys, threading, time, unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import closing
+from itertools import islice
 from pathlib import Path
 
-from openai import OpenAI, AuthenticationError, RateLimitError, APIError
-from docx import Document
-from PyPDF2 import PdfReader
+from feedback_cache import FeedbackCache
+from feedback_parse import FeedbackStreamParser, extract_json_object, is_feedback_object, validate_feedback
+from chunking import estimate_tokens, split_into_chunks, merge_feedback
+from scheduler import ScheduledClient, error_code, is_transient
+from prompts import PromptTemplate, FEEDBACK, DIMENSIONS, DIMENSION_FOCUS, essay_block
+import metrics
+import textstats
 
 # =============== 配置区（这里改） ===============
 API_KEY      = "sk-REPLACE_WITH_YOUR_PROJECT_KEY"  # 本地测试可直写；生产建议用环境变量
 FILE_PATH    = r"REPLACE_WITH_YOUR_FILE_PATH"
 MODEL        = "gpt-5"        # 或 "gpt-5-mini"
-MAX_CHARS    = 180_000
+MAX_CHARS    = 180_000        # 不分块时单个 prompt 的清洗文本上限（超出截断）
+CHUNK_LONG_ESSAYS = True      # 长稿件按段落分块并发评估再合并，而不是在 MAX_CHARS 处截断
+CHUNK_TOKENS = 6000           # 每块的估算 token 上限（超过即分块）
+CHUNK_CONCURRENCY = 4         # 同一篇稿件同时在途的分块请求数
+MAX_ESSAY_CHARS = 2_000_000   # 分块模式下的绝对上限（防止异常大文件）
 MAX_OUTPUT   = 2048           # 返回的最大 tokens（根据需要调整）
+PROMPT_CACHE_KEY = True       # 请求带 prompt_cache_key=模板 id（prompts.py），提高服务端前缀缓存命中率
+TEXT_STATS   = True           # 本地文本统计（textstats.py）：放进 prompt 后缀，并随反馈保存为 "text_stats"
+METRICS_ONLY = False          # True：main 只输出本地统计（不调用模型，也不需要 API_KEY）
+USE_CACHE    = True           # 相同清洗文本直接复用已有反馈（False = 绕过缓存）
+CACHE_PATH   = r"./.feedback_cache/feedback.sqlite3"
+EVAL_MODE    = "single"       # "single"：一次调用出四维；"fanout"：四个维度各发一个小请求并发执行
+DIMENSION_MAX_OUTPUT = 640    # fanout 模式下每个维度的最大输出 tokens
+FANOUT_RETRIES = 2            # fanout 模式下单个维度输出非 JSON 时的重试次数，只重试该维度（API 错误的退避归 ScheduledClient）
+PDF_WORKERS  = 1              # >1 时长 PDF 按页段分给多进程并行提取
+PDF_PARALLEL_MIN_PAGES = 48   # 少于该页数的 PDF 仍走串行（进程开销不划算）
+PDF_PAGES_PER_TASK     = 32   # 每个子任务负责的连续页数（每个任务需重新打开并解析 PDF，过小反而慢）
 # ==============================================
 
-def read_file_text(path: Path) -> str:
+EXTRACT_CHUNK = 1 << 16               # .txt 每次读取的字符数
+EXTRACT_STATS = {}                    # { ".pdf": {"files": int, "units": int, "seconds": float} }
+_STATS_LOCK = threading.Lock()
+
+def _iter_txt(path: Path):
+    with path.open("r", encoding="utf-8", errors="ignore") as f:
+        while True:
+            block = f.read(EXTRACT_CHUNK)
+            if not block:
+                return
+            yield block
+
+def _iter_docx(path: Path):
+    from docx import Document  # 解析库按需导入：只处理 .txt 的运行不付这份启动开销
+    doc = Document(str(path))  # 直接按路径打开，不再整份复制进 BytesIO
+    for i, p in enumerate(doc.paragraphs):
+        yield p.text if i == 0 else "\n" + p.text
+
+_PDF_POOL = None
+_PDF_POOL_LOCK = threading.Lock()
+
+def _pdf_pool() -> ProcessPoolExecutor:
+    """进程池懒创建并在进程内复用（批量/Flask 多线程共享）。"""
+    global _PDF_POOL
+    with _PDF_POOL_LOCK:
+        if _PDF_POOL is None:
+            _PDF_POOL = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+        return _PDF_POOL
+
+def _extract_pdf_range(path: str, start: int, stop: int) -> list:
+    """子进程内执行：独立打开 PDF，提取 [start, stop) 页文本。"""
+    from PyPDF2 import PdfReader
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        return [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+def _iter_pdf_pages_parallel(path: Path, n_pages: int):
+    """页段分发给进程池、按顺序回收；在途任务数有上限，调用方提前停止时取消未开始的任务。"""
+    pool = _pdf_pool()
+    ranges = ((s, min(s + PDF_PAGES_PER_TASK, n_pages)) for s in range(0, n_pages, PDF_PAGES_PER_TASK))
+    pending = deque(pool.submit(_extract_pdf_range, str(path), a, b) for a, b in islice(ranges, PDF_WORKERS * 2))
+    try:
+        while pending:
+            texts = pending.popleft().result()
+            nxt = next(ranges, None)
+            if nxt:
+                pending.append(pool.submit(_extract_pdf_range, str(path), *nxt))
+            yield from texts
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+def _iter_pdf(path: Path):
+    from PyPDF2 import PdfReader
+    with path.open("rb") as f:
+        reader = PdfReader(f)  # 按需读取对象，页面文本逐页提取
+        n_pages = len(reader.pages)
+        if PDF_WORKERS > 1 and n_pages >= PDF_PARALLEL_MIN_PAGES:
+            pages = _iter_pdf_pages_parallel(path, n_pages)
+        else:
+            pages = ((page.extract_text() or "") for page in reader.pages)
+        with closing(pages):
+            for i, text in enumerate(pages):
+                yield text if i == 0 else "\n" + text
+
+_EXTRACTORS = {".txt": _iter_txt, ".docx": _iter_docx, ".pdf": _iter_pdf}
+
+def preload_extractors():
+    """提前导入 .docx / .pdf 解析库（常驻进程启动时调用，避免第一篇稿件付导入开销）。"""
+    import docx, PyPDF2  # noqa: F401
+
+def _timed(suf: str, it, timing: dict = None):
+    """只累计提取本身的耗时（不含调用方处理时间）；提前关闭也会记账。timing 给定时写入本次的 "extract" 秒数。"""
+    spent, units = 0.0, 0
+    try:
+        while True:
+            t0 = time.perf_counter()
+            piece = next(it, None)
+            spent += time.perf_counter() - t0
+            if piece is None:
+                return
+            units += 1
+            yield piece
+    finally:
+        it.close()
+        with _STATS_LOCK:
+            st = EXTRACT_STATS.setdefault(suf, {"files": 0, "units": 0, "seconds": 0.0})
+            st["files"] += 1
+            st["units"] += units
+            st["seconds"] += spent
+        metrics.observe_stage("extract", spent)
+        if timing is not None:
+            timing["extract"] = spent
+
+def iter_file_text(path: Path, timing: dict = None):
+    """
+    逐页/逐段/逐块产出原文（拼接结果与 read_file_text 相同）；调用方停止迭代即停止解析。
+    各格式耗时累计在 EXTRACT_STATS（见 extraction_stats()）。
+    """
     suf = path.suffix.lower()
-    if suf == ".txt":
-        return path.read_text(encoding="utf-8", errors="ignore")
-    elif suf == ".docx":
-        with path.open("rb") as f:
-            bio = BytesIO(f.read())
-        doc = Document(bio)
-        return "\n".join(p.text for p in doc.paragraphs)
-    elif suf == ".pdf":
-        with path.open("rb") as f:
-            bio = BytesIO(f.read())
-        reader = PdfReader(bio)
-        return "\n".join((page.extract_text() or "") for page in reader.pages)
-    else:
+    if suf not in _EXTRACTORS:
         raise ValueError(f"Unsupported file type: {suf}. Use .txt/.docx/.pdf")
+    return _timed(suf, _EXTRACTORS[suf](path), timing)
+
+def read_file_text(path: Path) -> str:
+    with closing(iter_file_text(path)) as pieces:
+        return "".join(pieces)
+
+def extraction_stats() -> dict:
+    """各格式的提取统计快照：文件数、单元数（页/段/块）、总耗时与平均每文件耗时。"""
+    with _STATS_LOCK:
+        return {
+            suf: {**st, "avg_seconds": st["seconds"] / st["files"] if st["files"] else 0.0}
+            for suf, st in EXTRACT_STATS.items()
+        }
+
+_CLEAN_CHUNK = 1 << 16                # 清洗时每块处理的原文字符数
+_WS_RUN = re.compile(r"[ \t]{2,}")
+
+class _KeepTable(dict):
+    """str.translate 用的惰性码位表：L/N/P 与空格/换行/制表保留，其余删除；首次遇到才查 unicodedata。"""
+    def __missing__(self, cp):
+        ch = chr(cp)
+        keep = ch in " \n\t" or unicodedata.category(ch)[0] in "LNP"
+        self[cp] = cp if keep else None
+        return self[cp]
+
+_KEEP_TABLE = _KeepTable()
+
+def _norm_para(para: str) -> str:
+    return _WS_RUN.sub(" ", para.replace("\n", " ")).strip()
 
+def _newline_chunks(pieces):
+    """原文片段 → 统一换行后的块（长片段按 _CLEAN_CHUNK 切开；块尾 "\r" 顺延，避免拆开 "\r\n"）。"""
+    carry = ""
+    for piece in pieces:
+        for pos in range(0, len(piece), _CLEAN_CHUNK):
+            block = carry + piece[pos:pos + _CLEAN_CHUNK]
+            carry = ""
+            if block.endswith("\r"):
+                block, carry = block[:-1], "\r"
+            if block:
+                yield block.replace("\r\n", "\n").replace("\r", "\n")
+    if carry:
+        yield "\n"
+
+def clean_stream(pieces, max_chars: int = None):
+    """
+    对原文片段流做单遍清洗，输出与逐字符实现逐字节一致：
+    - 字符过滤走 str.translate；段落按 "\n\n" 流式切分（跨块边界同样处理）；
+    - 给定 max_chars 时，一旦结果确定超出预算即停止，不再消费剩余片段。
+    返回 (清洗文本[:max_chars], 是否被截断)。
+    """
+    out, size = [], 0              # 已完成的段落及其 "\n\n".join 后的长度
+    tail, tail_len = [], 0         # 当前未结束段落的分块（避免反复拼接长段）
+    truncated = False
+    for chunk in _newline_chunks(pieces):
+        chunk = chunk.translate(_KEEP_TABLE)
+        if not chunk:
+            continue
+        if tail and tail[-1].endswith("\n") and chunk.startswith("\n"):
+            tail[-1] = tail[-1][:-1]           # "\n\n" 恰好跨在块边界上
+            parts = ["", *chunk[1:].split("\n\n")]
+        else:
+            parts = chunk.split("\n\n")
+        for i, part in enumerate(parts):
+            if i:
+                para = _norm_para("".join(tail))
+                tail, tail_len = [], 0
+                if para:
+                    size += len(para) + (2 if out else 0)
+                    out.append(para)
+            if part:
+                tail.append(part)
+                tail_len += len(part)
+        if max_chars is not None:
+            if size > max_chars:
+                truncated = True
+                break
+            if tail and size + 2 + tail_len > max_chars:
+                # 未结束段落规范化后的结果必为最终段落的前缀，够长即可提前结束
+                head = _norm_para("".join(tail))
+                if head and size + (2 if out else 0) + len(head) > max_chars:
+                    out.append(head)
+                    truncated = True
+                    break
+    if not truncated:
+        para = _norm_para("".join(tail))
+        if para:
+            out.append(para)
+    result = "\n\n".join(out)
+    if max_chars is not None and len(result) > max_chars:
+        return result[:max_chars], True
+    return result, False
+
+def clean_text_with_budget(text: str, max_chars: int = None):
+    """清洗整段字符串；返回 (清洗文本[:max_chars], 是否被截断)。"""
+    if not isinstance(text, str):
+        return "", False
+    return clean_stream((text,), max_chars)
+
+@metrics.timed("clean")
 def clean_text_keep_letters_numbers_punct_whitespace(text: str) -> str:
     """仅保留字母/数字/标点/空白并规范段内空白；保留段落。"""
-    if not isinstance(text, str):
-        return ""
-    text = text.replace("\r\n", "\n").replace("\r", "\n")
-    kept = []
-    for ch in text:
-        if ch in (" ", "\n", "\t"):
-            kept.append(ch); continue
-        cat = unicodedata.category(ch)  # L/N/P
-        if cat.startswith(("L", "N", "P")):
-            kept.append(ch)
-    filtered = "".join(kept)
-    paras = filtered.split("\n\n")
-    norm = []
-    for para in paras:
-        joined = " ".join(para.split("\n"))
-        joined = re.sub(r"[ \t]{2,}", " ", joined).strip()
-        if joined:
-            norm.append(joined)
-    return "\n\n".join(norm)
-
-def build_prompt(clean_text: str) -> str:
-    # 固定四维并强制 Reasoning；不允许输出 JSON 之外的任何文本
-    schema_hint = (
-        "Return ONLY a valid JSON object with this exact shape:\n"
-        "{\n"
-        '  "summary": string,\n'
-        '  "feedback": {\n'
-        '    "Grammar": {"summary": string, "issues": [string], "revision_tips": [string]},\n'
-        '    "Vocabulary": {"summary": string, "issues": [string], "revision_tips": [string]},\n'
-        '    "Organization": {"summary": string, "issues": [string], "revision_tips": [string]},\n'
-        '    "Reasoning": {"summary": string, "issues": [string], "revision_tips": [string]}\n'
-        "  }\n"
-        "}\n"
-        "No prose or explanation outside JSON."
-    )
-    return (
-        "You are a senior professor of English composition.\n"
-        "Provide constructive, actionable feedback in English for the student's IELTS-style essay across exactly four aspects:\n"
-        "1) Grammar, 2) Vocabulary, 3) Organization, 4) Reasoning.\n"
-        "- For each aspect, write:\n"
-        "  • Summary (2–4 sentences)\n"
-        "  • 3–6 Specific issues (quote short snippets if helpful)\n"
-        "  • Revision tips (bullet list, concrete)\n"
-        "- Be precise, avoid generic advice. Focus on patterns, not isolated typos.\n"
-        "- Keep a professional, encouraging tone. Do NOT rewrite the whole essay.\n\n"
-        f"{schema_hint}\n\n"
-        "Student essay (cleaned text follows between <essay> tags):\n"
-        "<essay>\n"
-        f"{clean_text}\n"
-        "</essay>"
-    )
+    return clean_text_with_budget(text)[0]
+
+@metrics.timed("textstats")
+def text_stats(clean_text: str):
+    """清洗文本 → 本地统计字典（TEXT_STATS 关闭时返回 None）。"""
+    return textstats.analyze(clean_text) if TEXT_STATS else None
+
+def text_stats_many(clean_texts: list) -> list:
+    """批量版 text_stats：整批一次向量化计算（batch.py / batch_api.py 用）。"""
+    if not TEXT_STATS:
+        return [None] * len(clean_texts)
+    with metrics.span("textstats"):
+        return textstats.analyze_many(clean_texts)
+
+def with_text_stats(data: dict, stats) -> dict:
+    """把本地统计挂到反馈 JSON 上（normalize_reasoning 只保留四维，统计须在其后附加）。"""
+    return {**data, "text_stats": stats} if stats is not None else data
 
+@metrics.timed("build_prompt")
+def build_prompt(clean_text: str, stats: dict = None) -> str:
+    """
+    user 消息 = 可变后缀（本地统计一行 + 稿件）；要求与 schema 在 prompts.FEEDBACK 的固定前缀里（见 model_request）。
+    stats 缺省时现算（分块时即为该块的统计）。
+    """
+    if not TEXT_STATS:
+        return essay_block(clean_text)
+    return essay_block(clean_text, textstats.prompt_line(stats or textstats.analyze(clean_text)))
+
+@metrics.timed("parse")
 def ensure_json(text: str):
-    """尽量从模型输出中提取 JSON（防止偶尔有前后缀）。"""
-    text = text.strip()
-    try:
-        return json.loads(text)
-    except Exception:
-        pass
-    m = re.search(r"\{[\s\S]*\}", text)
-    if m:
-        try:
-            return json.loads(m.group(0))
-        except Exception:
-            pass
-    return {"raw": text}
+    """尽量从模型输出中提取反馈 JSON 对象（防止偶尔有前后缀）；线性扫描，找不到时返回 {"raw": 原文}。"""
+    obj = extract_json_object(text, is_feedback_object)
+    return obj if obj is not None else {"raw": (text or "").strip()}
 
+@metrics.timed("normalize")
 def normalize_reasoning(obj: dict) -> dict:
     """
-    输出端统一为 Reasoning：
+    输出端统一为 Reasoning：经 feedback_parse.validate_feedback 按四维 schema 规整——
     - 若 feedback.Coherence 存在且 Reasoning 缺失，则映射过去；
-    - 保证四个键都至少存在（空结构），便于前端稳定渲染。
-    """
-    if not isinstance(obj, dict):
-        return {"summary": "", "feedback": {}}
-    fb = obj.setdefault("feedback", {})
-    if "Reasoning" not in fb and "Coherence" in fb:
-        fb["Reasoning"] = fb.get("Coherence") or {}
-
-    def ensure_section(name):
-        sec = fb.get(name) or {}
-        fb[name] = {
-            "summary": (sec.get("summary") or "").strip(),
-            "issues": list(sec.get("issues") or []),
-            "revision_tips": list(sec.get("revision_tips") or []),
-        }
+    - 保证四个键都至少存在（空结构），便于前端稳定渲染；"raw"（解析失败标记）保留。
+    """
+    return validate_feedback(obj).to_dict()
+
+def prepare_text(path: Path) -> str:
+    """读取 & 清洗 & 超长截断，返回可直接放进 prompt 的文本（分块模式下上限为 MAX_ESSAY_CHARS）。"""
+    limit = MAX_ESSAY_CHARS if CHUNK_LONG_ESSAYS else MAX_CHARS
+    timing = {}
+    t0 = time.perf_counter()
+    with closing(iter_file_text(path, timing)) as pieces:  # 预算用尽即停止解析剩余页面
+        clean_text, truncated = clean_stream(pieces, limit)
+    # 提取与清洗交错进行：清洗耗时 = 总耗时 - 提取耗时（提取部分已由 _timed 记为 "extract"）
+    metrics.observe_stage("clean", max(0.0, time.perf_counter() - t0 - timing.get("extract", 0.0)))
+    if truncated:
+        clean_text += "\n\n[Truncated for length]"
+    return clean_text
+
+def model_request(user_msg: str, max_output: int = None, template: PromptTemplate = None) -> dict:
+    """
+    responses.create 的参数（同步/流式/Batch 共用）：system = 模板的固定前缀，user = 可变后缀。
+    PROMPT_CACHE_KEY 时附带 prompt_cache_key=模板 id，同一前缀的请求落到同一缓存分片。
+    """
+    template = template or FEEDBACK
+    kwargs = dict(
+        model=MODEL,
+        input=template.messages(user_msg),
+        max_output_tokens=max_output or MAX_OUTPUT,
+    )
+    if PROMPT_CACHE_KEY:
+        kwargs["prompt_cache_key"] = template.id
+    return kwargs
 
-    for k in ("Grammar", "Vocabulary", "Organization", "Reasoning"):
-        ensure_section(k)
-    obj["feedback"] = fb
-    obj["summary"] = (obj.get("summary") or "").strip()
+def call_model(client, user_msg: str, max_output: int = None, template: PromptTemplate = None) -> str:
+    """单次模型调用；client 只需提供 responses.create（可替换为 fake_llm.FakeClient）。"""
+    kwargs = model_request(user_msg, max_output, template)
+    t0 = time.perf_counter()
+    try:
+        resp = client.responses.create(**kwargs)
+    except Exception:
+        metrics.MODEL_REQUESTS.inc(status="error")
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        metrics.observe_stage("model", elapsed)
+    metrics.MODEL_REQUESTS.inc(status="ok")
+    cached = metrics.record_usage(resp, (template or FEEDBACK).id)
+    metrics.MODEL_SECONDS.observe(elapsed, template=(template or FEEDBACK).id,
+                                  prefix_cache="none" if cached is None else ("hit" if cached else "miss"))
+    return resp.output_text
+
+def stream_model(client, user_msg: str, template: PromptTemplate = None):
+    """流式调用（Responses API stream=True）：逐段产出 output_text 增量；记录首个增量的到达时间（TTFT）。"""
+    template = template or FEEDBACK
+    t0, status, ttft, cached = time.perf_counter(), "error", None, None
+    try:
+        for event in client.responses.create(**model_request(user_msg, template=template), stream=True):
+            kind = getattr(event, "type", "")
+            if kind == "response.output_text.delta":
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+                yield event.delta
+            elif kind == "response.completed":
+                cached = metrics.record_usage(getattr(event, "response", None), template.id)
+        status = "ok"
+        if ttft is not None:  # 命中与否要等 usage（流结束）才知道
+            metrics.MODEL_TTFT.observe(ttft, template=template.id,
+                                       prefix_cache="none" if cached is None else ("hit" if cached else "miss"))
+    finally:
+        # 覆盖整个流：调用方处理增量（解析 / SSE 推送）与等待模型交错进行，无法再拆分
+        metrics.MODEL_REQUESTS.inc(status=status)
+        metrics.observe_stage("model", time.perf_counter() - t0)
+
+# =============== 分维度并发（fanout）模式 ===============
+@metrics.timed("build_prompt")
+def build_dimension_prompt(clean_text: str) -> str:
+    """
+    分维度模式的 user 消息：只有稿件，各维度完全相同（前缀缓存可跨维度复用）。
+    维度由 call_model 的模板参数 prompts.DIMENSIONS[dimension] 决定，不在这里选择。
+    """
+    return essay_block(clean_text)
+
+def _parse_dimension(raw: str, dimension: str):
+    """解析单维度输出；容忍模型多包一层 {"<维度>": {...}}。无法解析返回 None。"""
+    obj = extract_json_object(raw)
+    if isinstance(obj, dict) and isinstance(obj.get(dimension), dict):
+        obj = obj[dimension]
+    if not isinstance(obj, dict) or not ({"summary", "issues", "revision_tips"} & obj.keys()):
+        return None
     return obj
 
+def _evaluate_dimension(clean_text: str, client, dimension: str, retries: int) -> dict:
+    """
+    单个维度：输出非 JSON 时只重试本维度（立即重发）。
+    API 异常不在这里叠加重试：永久性错误（鉴权、insufficient_quota、400 等）直接抛出；
+    暂时性错误的退避由 ScheduledClient 负责，只有未经调度器的裸 client 才在这里按退避重试。
+    """
+    prompt = build_dimension_prompt(clean_text)
+    last_error = None
+    for attempt in range(retries + 1):
+        try:
+            sec = _parse_dimension(call_model(client, prompt, DIMENSION_MAX_OUTPUT, DIMENSIONS[dimension]), dimension)
+        except Exception as e:
+            if isinstance(client, ScheduledClient) or not is_transient(e):
+                raise
+            last_error = e
+            time.sleep(min(2 ** attempt * 0.5, 8))
+            continue
+        if sec is not None:
+            return sec
+        last_error = ValueError(f"{dimension}: model output is not valid JSON")
+    raise last_error
+
+def _first_sentence(text: str) -> str:
+    text = (text or "").strip()
+    m = re.search(r"(?<=[.!?])\s", text)
+    return text[:m.start()] if m else text
+
+def evaluate_text_fanout(clean_text: str, client, on_event=None, retries: int = None) -> dict:
+    """
+    四个维度各发一个请求并发执行（每个 DIMENSION_MAX_OUTPUT tokens），合并成与 normalize_reasoning 相同的结构。
+    每个维度完成即回调 on_event(("section", name, dict))；顶层 summary 由各维度 summary 的首句拼成。
+    """
+    retries = FANOUT_RETRIES if retries is None else retries
+    dims = list(DIMENSION_FOCUS)
+    feedback = {}
+    with ThreadPoolExecutor(max_workers=len(dims)) as pool:
+        futures = {pool.submit(metrics.bind(_evaluate_dimension), clean_text, client, d, retries): d for d in dims}
+        for fut in as_completed(futures):
+            name = futures[fut]
+            feedback[name] = fut.result()
+            if on_event is not None:
+                on_event(("section", name, feedback[name]))
+    summary = " ".join(s for s in (_first_sentence(feedback[d].get("summary")) for d in dims) if s)
+    return normalize_reasoning({"summary": summary, "feedback": {d: feedback[d] for d in dims}})
+
+def prompt_version(mode: str = "single") -> str:
+    """所用模板（id + 固定前缀 + 后缀格式）的指纹；改 prompt 即自动换缓存命名空间。"""
+    if mode == "fanout":
+        template = "\0".join(DIMENSIONS[d].fingerprint for d in DIMENSION_FOCUS) + f"\0{DIMENSION_MAX_OUTPUT}"
+    else:
+        template = FEEDBACK.fingerprint + (f"\0{textstats.VERSION}" if TEXT_STATS else "")
+    template += "\0" + essay_block("")
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+def needs_chunking(clean_text: str) -> bool:
+    return CHUNK_LONG_ESSAYS and estimate_tokens(clean_text) > CHUNK_TOKENS
+
+def cache_variant(mode: str, clean_text: str = "") -> str:
+    """不同评估模式（及分块评估）的结果分开缓存（single 且不分块沿用原键）。"""
+    variant = "" if mode == "single" else f"{mode}:{prompt_version(mode)}"
+    if needs_chunking(clean_text):
+        variant = f"chunked{CHUNK_TOKENS}|{variant}"
+    return variant
+
+def _evaluate_whole(clean_text: str, client, mode: str, on_event=None, stats: dict = None) -> dict:
+    if mode == "fanout":
+        return evaluate_text_fanout(clean_text, client, on_event)
+    if mode == "single":
+        raw = call_model(client, build_prompt(clean_text, stats))
+        return normalize_reasoning(ensure_json(raw))  # 统一到 Reasoning，再做最小填充
+    raise ValueError(f"Unknown evaluation mode: {mode}")
+
+def chunk_texts(clean_text: str) -> list:
+    """长稿件切块，每块带 [Part i of n] 标记（只有一块时原样返回）。"""
+    chunks = split_into_chunks(clean_text, CHUNK_TOKENS)
+    n = len(chunks)
+    return [f"[Part {i + 1} of {n}]\n\n{c}" for i, c in enumerate(chunks)] if n > 1 else chunks
+
+@metrics.timed("merge")
+def merge_chunk_results(results: list) -> dict:
+    """合并各块结果（跳过解析失败的块）；全部失败时返回第一块的原始结果。"""
+    ok = [r for r in results if "raw" not in r]
+    if not ok:
+        return results[0]
+    return normalize_reasoning(merge_feedback(ok, list(DIMENSION_FOCUS)))
+
+def evaluate_text_chunked(clean_text: str, client, mode: str = None) -> dict:
+    """
+    长稿件：按段落边界切成 ≤ CHUNK_TOKENS 的块，CHUNK_CONCURRENCY 路并发评估，
+    再合并为一份四维结果（意见去重）。耗时取决于并发度而不是稿件长度。
+    """
+    mode = mode or EVAL_MODE
+    texts = chunk_texts(clean_text)
+    n = len(texts)
+    with ThreadPoolExecutor(max_workers=max(1, min(CHUNK_CONCURRENCY, n))) as pool:
+        results = list(pool.map(metrics.bind(lambda t: _evaluate_whole(t, client, mode)), texts))
+    return merge_chunk_results(results)
+
+def open_cache(path=None) -> FeedbackCache:
+    """按当前 MODEL / MAX_OUTPUT / prompt 版本打开反馈缓存（CLI 与 Flask 共用）。"""
+    return FeedbackCache(path or CACHE_PATH, namespace=f"{MODEL}|{MAX_OUTPUT}|{prompt_version()}")
+
+def evaluate_text(clean_text: str, client, cache: FeedbackCache = None, mode: str = None, on_event=None) -> dict:
+    """
+    已清洗文本 → 模型 → ensure_json → normalize_reasoning；命中缓存则不走网络。
+    mode：None 取 EVAL_MODE；"single" 走 build_prompt 单次调用，"fanout" 走 evaluate_text_fanout；
+    估算 token 超过 CHUNK_TOKENS 的长稿件走 evaluate_text_chunked。结果带 "text_stats"（TEXT_STATS 开启时）。
+    """
+    mode = mode or EVAL_MODE
+    stats = text_stats(clean_text)
+    variant = cache_variant(mode, clean_text)
+    if cache is not None:
+        hit = cache.get(clean_text, variant)
+        if hit is not None:
+            return with_text_stats(hit, stats)
+    if needs_chunking(clean_text):
+        data = evaluate_text_chunked(clean_text, client, mode)
+    else:
+        data = _evaluate_whole(clean_text, client, mode, on_event, stats)
+    data = with_text_stats(data, stats)
+    if cache is not None and "raw" not in data:  # 解析失败的结果不入缓存
+        cache.put(clean_text, data, variant)
+    return data
+
+def evaluate_text_streaming(clean_text: str, client, on_event=None) -> dict:
+    """
+    流式版 evaluate_text：每完成一个维度（或顶层 summary）即回调 on_event(event)，
+    event 形如 ("section", name, dict) / ("summary", str)；最终结果仍经 ensure_json + normalize_reasoning。
+    """
+    stats = text_stats(clean_text)
+    if needs_chunking(clean_text):  # 长稿件分块并发，不走单一流
+        return with_text_stats(evaluate_text_chunked(clean_text, client, "single"), stats)
+    parser = FeedbackStreamParser()
+    parts = []
+    for delta in stream_model(client, build_prompt(clean_text, stats)):
+        parts.append(delta)
+        for event in parser.feed(delta):
+            if on_event is not None:
+                on_event(event)
+    return with_text_stats(normalize_reasoning(ensure_json("".join(parts))), stats)
+
+def evaluate_file(path: Path, client, cache: FeedbackCache = None, mode: str = None) -> dict:
+    """完整流水线：读取 → 清洗 → evaluate_text。"""
+    return evaluate_text(prepare_text(path), client, cache, mode)
+
+def analyze_file(path: Path) -> dict:
+    """只做本地统计的快速路径：读取 → 清洗 → textstats，不调用模型（毫秒级，可在模型结果出来之前先返回）。"""
+    clean_text = prepare_text(path)
+    with metrics.span("textstats"):
+        return {"text_stats": textstats.analyze(clean_text)}
+
+def save_feedback(data: dict, stem: str, out_dir: Path = None) -> Path:
+    """保存为 <stem>_feedback.txt（UTF-8 JSON），返回输出路径。"""
+    json_text = json.dumps(data, ensure_ascii=False, indent=2)
+    out_path = (out_dir or Path.cwd()) / f"{stem}_feedback.txt"
+    out_path.write_text(json_text + "\n", encoding="utf-8")
+    return out_path
+
+class MissingAPIKey(RuntimeError):
+    """API_KEY 为空或仍是占位符：在发出任何请求之前报错。"""
+
+def api_key_configured() -> bool:
+    """API_KEY 是否已配置（非空且不是 sk-REPLACE… 占位符）；CLI、批量、worker 与 Flask 共用。"""
+    return bool(API_KEY) and not API_KEY.startswith(("sk-REPLACE", "sk-proj-REPLACE"))
+
+def describe_error(e: Exception) -> str:
+    """把 OpenAI 异常翻译成一行可读信息（CLI 与批量模式共用）。"""
+    if isinstance(e, MissingAPIKey):
+        return f"❌ {e}"
+    openai = sys.modules.get("openai")  # 未导入则异常不可能来自 openai
+    if openai is not None and isinstance(e, openai.AuthenticationError):
+        return f"❌ AuthenticationError（密钥无效/权限问题）：{e}"
+    if openai is not None and isinstance(e, openai.RateLimitError):
+        if error_code(e) == "insufficient_quota":
+            return "❌ 429 insufficient_quota：该项目/账号配额为 0（预算打满、未付费或 credits 用尽）。"
+        return f"⏳ 429 限流：{e}"
+    if openai is not None and isinstance(e, openai.APIError):
+        return f"❌ APIError：{e}"
+    return f"❌ 未知异常：{e}"
+
+_OPENAI_NAMES = {"OpenAI", "AuthenticationError", "RateLimitError", "APIError"}
+
+def __getattr__(name):
+    """evaluate.OpenAI 等按需导入 openai（导入约 0.5s，只在真正创建 client 时才付）。"""
+    if name in _OPENAI_NAMES:
+        import openai
+        return getattr(openai, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 def main():
-    if not API_KEY or API_KEY.startswith(("sk-REPLACE","sk-proj-REPLACE")):
-        print("ERROR: 请先在脚本顶部配置真实 API_KEY。"); return
     file_path = Path(FILE_PATH).expanduser().resolve()
+    if METRICS_ONLY:  # 快速路径：不需要 API_KEY，也不写反馈文件
+        if not file_path.exists():
+            print(f"ERROR: 文件不存在：{file_path}"); return
+        print(json.dumps(analyze_file(file_path), ensure_ascii=False, indent=2)); return
+    if not api_key_configured():
+        print("ERROR: 请先在脚本顶部配置真实 API_KEY。"); return
     if not file_path.exists():
         print(f"ERROR: 文件不存在：{file_path}"); return
 
-    # 读取 & 清洗
-    clean_text = clean_text_keep_letters_numbers_punct_whitespace(read_file_text(file_path))
-    if len(clean_text) > MAX_CHARS:
-        clean_text = clean_text[:MAX_CHARS] + "\n\n[Truncated for length]"
-
-    system_msg = (
-        "You are a meticulous, fair English composition professor. "
-        "Respond in English using only JSON according to the user's instructions."
-    )
-    user_msg = build_prompt(clean_text)
-
-    client = OpenAI(api_key=API_KEY)
+    from openai import OpenAI
+    client = ScheduledClient(OpenAI(api_key=API_KEY, max_retries=0))
+    cache = open_cache() if USE_CACHE else None
+    logging.basicConfig(format="%(message)s")  # 各阶段耗时 / tokens 以一行 JSON 输出到 stderr（metrics.trace）
 
     try:
-        resp = client.responses.create(
-            model=MODEL,
-            input=[
-                {"role": "system", "content": system_msg},
-                {"role": "user", "content": user_msg},
-            ],
-            max_output_tokens=MAX_OUTPUT,
-        )
-        raw = resp.output_text
-        data = ensure_json(raw)
-        data = normalize_reasoning(data)  # 统一到 Reasoning，再做最小填充
-
-        # 输出 & 保存
-        json_text = json.dumps(data, ensure_ascii=False, indent=2)
-        print(json_text)
-        out_path = Path.cwd() / f"{file_path.stem}_feedback.txt"
-        out_path.write_text(json_text + "\n", encoding="utf-8")
+        with metrics.trace("evaluate", file=file_path.name, format=file_path.suffix.lower()):
+            data = evaluate_file(file_path, client, cache)
+
+            # 输出 & 保存
+            print(json.dumps(data, ensure_ascii=False, indent=2))
+            with metrics.span("save"):
+                out_path = save_feedback(data, file_path.stem)
         print(f"\nSaved to: {out_path}")
+        if cache is not None:
+            st = cache.stats()
+            print(f"Cache: hits={st['hits']} misses={st['misses']} entries={st['entries']}")
 
-    except AuthenticationError as e:
-        print("❌ AuthenticationError（密钥无效/权限问题）：", e)
-    except RateLimitError as e:
-        code = None
-        try:
-            code = (getattr(e, "body", {}) or {}).get("error", {}).get("code")
-        except Exception:
-            pass
-        if code == "insufficient_quota":
-            print("❌ 429 insufficient_quota：该项目/账号配额为 0（预算打满、未付费或 credits 用尽）。")
-        else:
-            print("⏳ 429 限流：", e)
-    except APIError as e:
-        print("❌ APIError：", e)
     except Exception as e:
-        print("❌ 未知异常：", e)
+        print(describe_error(e))
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,311 @@
+# fake_llm.py —— 离线替身：模拟 OpenAI client.responses.create（进程内 FakeClient / 本地 HTTP 假服务 / 文件版 Batch 服务），用于批量/并发/限流测试
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+# 默认回包：仓库自带的示例反馈（固定四维 JSON）
+SAMPLE_FEEDBACK = Path(__file__).resolve().parent / "data" / "feedback.txt"
+
+def sample_output() -> str:
+    try:
+        return SAMPLE_FEEDBACK.read_text(encoding="utf-8")
+    except OSError:
+        return json.dumps({"summary": "", "feedback": {}})
+
+class _FakeResponses:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, **kwargs):
+        return self._owner._respond(kwargs)
+
+class FakeClient:
+    """
+    与 OpenAI() 同形的最小替身：
+    - responses.create(**kwargs) → 对象带 output_text；
+    - latency 秒模拟网络耗时（也可为 callable(kwargs) -> 秒）；output 可为字符串或 callable(kwargs) -> str；
+    - stream=True 时按 stream_chunk 个字符切成 response.output_text.delta 事件，事件间隔 stream_delay 秒；
+    - calls 记录每次调用参数，max_in_flight 记录观测到的最大并发数。
+    """
+    def __init__(self, output=None, latency: float = 0.0, stream_chunk: int = 24, stream_delay: float = 0.0):
+        self.output = output if output is not None else sample_output()
+        self.latency = latency
+        self.stream_chunk = stream_chunk
+        self.stream_delay = stream_delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.responses = _FakeResponses(self)
+
+    def _respond(self, kwargs):
+        with self._lock:
+            self.calls.append(kwargs)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = self.latency(kwargs) if callable(self.latency) else self.latency
+            if delay:
+                time.sleep(delay)
+            text = self.output(kwargs) if callable(self.output) else self.output
+            if kwargs.get("stream"):
+                return self._stream(text)
+            return SimpleNamespace(output_text=text)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _stream(self, text: str):
+        for i in range(0, len(text), self.stream_chunk):
+            if self.stream_delay:
+                time.sleep(self.stream_delay)
+            yield SimpleNamespace(type="response.output_text.delta", delta=text[i:i + self.stream_chunk])
+        yield SimpleNamespace(type="response.completed", response=SimpleNamespace(output_text=text))
+
+def _response_body(text: str, kwargs: dict, cached_tokens: int = 0) -> dict:
+    """Responses API 的最小合法回包（openai SDK 能解析出 output_text / usage）。"""
+    prompt = json.dumps(kwargs.get("input", ""), ensure_ascii=False)
+    return {
+        "id": f"resp_fake_{random.getrandbits(48):012x}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": kwargs.get("model", "fake"),
+        "status": "completed",
+        "output": [{
+            "type": "message", "id": "msg_fake", "role": "assistant", "status": "completed",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+        "usage": {
+            "input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4,
+            "total_tokens": (len(prompt) + len(text)) // 4,
+            "input_tokens_details": {"cached_tokens": cached_tokens},
+            "output_tokens_details": {"reasoning_tokens": 0},
+        },
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+    }
+
+_CACHE_MIN_TOKENS = 1024     # 服务端前缀缓存的最短 prompt
+_CACHE_BLOCK_TOKENS = 128    # 命中长度的粒度
+
+class FakeResponsesServer:
+    """
+    本地 HTTP 假服务（POST /v1/responses），给真实 openai SDK 用：OpenAI(api_key="x", base_url=server.url)。
+    - output / latency 同 FakeClient；
+    - error_rate：按概率返回 429 rate_limit_exceeded（带 retry-after 秒）；
+    - quota_exhausted=True：所有请求返回 429 insufficient_quota（永久错误）；
+    - prefix_cache=True：按服务端 prompt caching 的规则报告 usage 里的 cached_tokens
+      （prompt ≥ 1024 tokens 时，与之前请求相同的最长前缀，按 128 tokens 取整）；cached_speedup 为全部命中时延迟缩短的比例；
+    - HTTP/1.1 keep-alive（与真实服务一样复用连接）；
+    - 计数：requests / rate_limited / max_in_flight / cached_tokens / connections（建立过的 TCP 连接数）。
+    不支持 stream=True（流式请测 FakeClient）。
+    """
+    def __init__(self, output=None, latency: float = 0.0, error_rate: float = 0.0, retry_after: float = 0.0,
+                 quota_exhausted: bool = False, prefix_cache: bool = True, cached_speedup: float = 0.0, seed: int = 0,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.output = output if output is not None else sample_output()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.quota_exhausted = quota_exhausted
+        self.prefix_cache = prefix_cache
+        self.cached_speedup = cached_speedup
+        self.cached_tokens = 0
+        self.connections = 0
+        self._prefixes = set()
+        self.requests = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                with server._lock:
+                    server.connections += 1
+                super().handle()
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                status, headers, payload = server._handle(self.path, json.loads(body or b"{}"))
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def _rate_limit(self, code: str, message: str):
+        with self._lock:
+            self.rate_limited += 1
+        headers = {"retry-after": f"{self.retry_after:g}"} if self.retry_after and code != "insufficient_quota" else {}
+        error = {"message": message, "type": code if code == "insufficient_quota" else "requests", "code": code}
+        return 429, headers, {"error": error}
+
+    def _cached(self, kwargs: dict) -> tuple:
+        """(命中前缀缓存的 tokens, prompt tokens)；token 按 4 字符估算，与回包 usage 一致。"""
+        prompt = json.dumps(kwargs.get("input", ""), ensure_ascii=False)
+        total = len(prompt) // 4
+        if not self.prefix_cache or total < _CACHE_MIN_TOKENS:
+            return 0, total
+        h, digests = hashlib.sha1(), []
+        step = _CACHE_BLOCK_TOKENS * 4
+        for end in range(step, len(prompt) + 1, step):   # 链式哈希：第 k 块命中即前 k 块全部相同
+            h.update(prompt[end - step:end].encode("utf-8"))
+            digests.append(h.digest())
+        with self._lock:
+            hit = max((k for k, d in enumerate(digests, 1) if d in self._prefixes), default=0)
+            self._prefixes.update(digests)
+            self.cached_tokens += hit * _CACHE_BLOCK_TOKENS
+        return hit * _CACHE_BLOCK_TOKENS, total
+
+    def _handle(self, path: str, kwargs: dict):
+        if not path.rstrip("/").endswith("/responses"):
+            return 404, {}, {"error": {"message": f"unknown path {path}", "type": "invalid_request_error", "code": None}}
+        with self._lock:
+            self.requests += 1
+            broken = self._rnd.random() < self.error_rate
+        if self.quota_exhausted:
+            return self._rate_limit("insufficient_quota", "You exceeded your current quota.")
+        if broken:
+            return self._rate_limit("rate_limit_exceeded", "Rate limit reached (fake).")
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            cached, total = self._cached(kwargs)
+            delay = self.latency(kwargs) if callable(self.latency) else self.latency
+            if delay and cached:
+                delay *= 1 - self.cached_speedup * cached / total
+            if delay:
+                time.sleep(delay)
+            text = self.output(kwargs) if callable(self.output) else self.output
+            return 200, {}, _response_body(text, kwargs, cached)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class FakeBatchBackend:
+    """
+    文件版 Batch 服务（与 batch_api.BatchBackend 同接口），状态全部落在 root 目录下，跨进程可续：
+    - 上传的文件存为 root/files/<file_id>.jsonl，batch 记录存为 root/batches/<batch_id>.json；
+    - 第 complete_after 次 retrieve 时"执行"整批请求（output 同 FakeClient），写出结果文件并置为 completed；
+    - error_rate：按概率让单条请求返回 500（写入 error 文件）。
+    """
+    def __init__(self, root, output=None, complete_after: int = 2, error_rate: float = 0.0, seed: int = 0):
+        self.root = Path(root)
+        self.output = output if output is not None else sample_output()
+        self.complete_after = complete_after
+        self.error_rate = error_rate
+        self._rnd = random.Random(seed)
+        for sub in ("files", "batches"):
+            (self.root / sub).mkdir(parents=True, exist_ok=True)
+
+    def _file(self, file_id: str) -> Path:
+        return self.root / "files" / f"{file_id}.jsonl"
+
+    def _batch(self, batch_id: str) -> Path:
+        return self.root / "batches" / f"{batch_id}.json"
+
+    def _write_file(self, lines) -> str:
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        self._file(file_id).write_text("".join(json.dumps(l, ensure_ascii=False) + "\n" for l in lines),
+                                       encoding="utf-8")
+        return file_id
+
+    def upload(self, path) -> str:
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        self._file(file_id).write_bytes(Path(path).read_bytes())
+        return file_id
+
+    def create(self, input_file_id: str, metadata: dict = None) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        n = sum(1 for line in self.download(input_file_id).splitlines() if line.strip())
+        record = {"id": batch_id, "status": "validating", "input_file_id": input_file_id, "polls": 0,
+                  "output_file_id": None, "error_file_id": None, "metadata": metadata or {},
+                  "request_counts": {"total": n, "completed": 0, "failed": 0}}
+        self._batch(batch_id).write_text(json.dumps(record), encoding="utf-8")
+        return batch_id
+
+    def retrieve(self, batch_id: str) -> dict:
+        path = self._batch(batch_id)
+        record = json.loads(path.read_text(encoding="utf-8"))
+        if record["status"] not in ("completed", "failed", "expired", "cancelled"):
+            record["polls"] += 1
+            if record["polls"] >= self.complete_after:
+                self._run(record)
+            else:
+                record["status"] = "in_progress"
+            path.write_text(json.dumps(record), encoding="utf-8")
+        return {k: record[k] for k in ("id", "status", "output_file_id", "error_file_id", "request_counts")}
+
+    def _run(self, record: dict):
+        ok, failed = [], []
+        for line in self.download(record["input_file_id"]).splitlines():
+            if not line.strip():
+                continue
+            req = json.loads(line)
+            row = {"id": f"batch_req_{uuid.uuid4().hex[:24]}", "custom_id": req["custom_id"]}
+            if self._rnd.random() < self.error_rate:
+                row["response"] = {"status_code": 500, "request_id": uuid.uuid4().hex,
+                                   "body": {"error": {"message": "The server had an error (fake).",
+                                                      "type": "server_error", "code": None}}}
+                row["error"] = None
+                failed.append(row)
+            else:
+                body = req["body"]
+                text = self.output(body) if callable(self.output) else self.output
+                row["response"] = {"status_code": 200, "request_id": uuid.uuid4().hex,
+                                   "body": _response_body(text, body)}
+                row["error"] = None
+                ok.append(row)
+        record["output_file_id"] = self._write_file(ok) if ok else None
+        record["error_file_id"] = self._write_file(failed) if failed else None
+        record["request_counts"].update(completed=len(ok), failed=len(failed))
+        record["status"] = "completed"
+
+    def download(self, file_id: str) -> str:
+        return self._file(file_id).read_text(encoding="utf-8")
@@ -0,0 +1,127 @@
+# feedback_cache.py —— 内容寻址的反馈缓存（SQLite）：相同清洗文本 + 模型 + 输出上限 + prompt 版本 → 直接复用 JSON
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import metrics
+
+# =============== 配置区（这里改） ===============
+MAX_AGE_DAYS  = 30                 # 超过该天数的条目淘汰
+MAX_BYTES     = 200 * 1024 * 1024  # 缓存 JSON 总量上限，超出按最久未访问淘汰
+EVICT_EVERY   = 64                 # 每写入 N 次做一次淘汰检查
+# ==============================================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback_cache (
+    key      TEXT PRIMARY KEY,
+    data     TEXT NOT NULL,
+    size     INTEGER NOT NULL,
+    created  REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_feedback_cache_accessed ON feedback_cache(accessed);
+"""
+
+def cache_key(namespace: str, clean_text: str, variant: str = "") -> str:
+    """namespace（模型/输出上限/prompt 版本）、variant（评估模式等）与清洗后文本共同决定键。"""
+    h = hashlib.sha256()
+    h.update(namespace.encode("utf-8"))
+    h.update(b"\0")
+    if variant:
+        h.update(variant.encode("utf-8"))
+        h.update(b"\0")
+    h.update(clean_text.encode("utf-8"))
+    return h.hexdigest()
+
+class FeedbackCache:
+    """
+    线程安全；多进程共享同一文件时由 SQLite 自身加锁。
+    - get/put 以 (namespace, clean_text, variant) 为键；
+    - hits / misses 为本实例计数；stats() 额外给出条目数与占用字节；
+    - 淘汰：按年龄（MAX_AGE_DAYS）与总大小（MAX_BYTES，最久未访问优先）。
+    """
+    def __init__(self, path, namespace: str, max_age_days: float = MAX_AGE_DAYS, max_bytes: int = MAX_BYTES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.namespace = namespace
+        self.max_age = max_age_days * 86400
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    @metrics.timed("cache_lookup")
+    def get(self, clean_text: str, variant: str = ""):
+        key = cache_key(self.namespace, clean_text, variant)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, created FROM feedback_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age:
+                self.misses += 1
+                metrics.CACHE_LOOKUPS.inc(result="miss")
+                metrics.note(cache="miss")
+                return None
+            self._conn.execute("UPDATE feedback_cache SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        metrics.CACHE_LOOKUPS.inc(result="hit")
+        metrics.note(cache="hit")
+        return json.loads(row[0])
+
+    def put(self, clean_text: str, data: dict, variant: str = ""):
+        payload = json.dumps(data, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO feedback_cache(key, data, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (cache_key(self.namespace, clean_text, variant), payload, len(payload.encode("utf-8")), now, now),
+            )
+            self._conn.commit()
+            self._puts += 1
+            due = self._puts % EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """删除过期条目，再按最久未访问删到 max_bytes 以内；返回删除条数。"""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM feedback_cache WHERE created < ?", (time.time() - self.max_age,))
+            removed = cur.rowcount
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM feedback_cache").fetchone()[0]
+            if total > self.max_bytes:
+                for key, size in self._conn.execute(
+                    "SELECT key, size FROM feedback_cache ORDER BY accessed ASC"
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM feedback_cache WHERE key = ?", (key,))
+                    total -= size
+                    removed += 1
+            self._conn.commit()
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM feedback_cache"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,236 @@
+# feedback_parse.py —— 反馈 JSON 解析：线性括号扫描取第一个完整对象 + 四维 schema 校验（typed）+ 流式输出的增量扫描
+import json
+import re
+from dataclasses import dataclass, field
+
+DIMENSIONS = ("Grammar", "Vocabulary", "Organization", "Reasoning")
+_ALIASES = {"Coherence": "Reasoning"}       # 旧提示词的维度名 → 现名（现名已存在时忽略别名）
+
+# =============== 从任意文本中取 JSON 对象 ===============
+_SIGNIFICANT = re.compile(r'[{}"\\]')
+_RUN = {"{": re.compile(r"\{+"), "}": re.compile(r"\}+")}   # 连续的括号一次取出（"{{{{…" 这类输入不必逐字符循环）
+
+def _object_spans(text: str) -> list:
+    """
+    线性扫描：返回所有"最外层"平衡 {...} 片段的 (start, end)，按出现顺序。
+    只在括号内跟踪字符串/转义（括号外的引号是正文）；未闭合的 "{" 不影响其内部已闭合的片段。
+    用正则跳过普通字符，每个字符只看一次。
+    """
+    spans, stack = [], []
+    in_str, esc_end = False, -1
+    pos, n = 0, len(text)
+    while pos < n:
+        if not stack:
+            pos = text.find("{", pos)
+            if pos < 0:
+                break
+            esc_end = -1
+        m = _SIGNIFICANT.search(text, pos)
+        if m is None:
+            break
+        i, c = m.start(), m.group()
+        pos = i + 1
+        if i < esc_end:                       # 被反斜杠转义的字符（只可能出现在字符串内）
+            continue
+        if in_str:
+            if c == "\\":
+                esc_end = i + 2
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c == "{":
+            pos = _RUN[c].match(text, i).end()
+            stack.extend(range(i, pos))
+        elif c == "}":
+            k = min(_RUN[c].match(text, i).end() - i, len(stack))   # 多出来的 "}" 是正文
+            start = stack[-k]
+            del stack[-k:]
+            while spans and spans[-1][0] > start:   # 被本片段包住的内层片段不再是最外层
+                spans.pop()
+            spans.append((start, i + k))
+            pos = i + k
+    return spans
+
+def extract_json_object(text: str, accept=None):
+    """
+    取文本中第一个能解析的 JSON 对象（dict）：整段是 JSON 时直接返回，
+    否则依次尝试 _object_spans 的各个最外层片段（片段互不重叠，总解析量仍是线性）。
+    accept(obj) -> bool 可进一步筛选（如 is_feedback_object，避免把截断输出里的某个内层对象当成结果）。找不到返回 None。
+    """
+    if not isinstance(text, str):
+        return None
+    text = text.strip()
+    if text.startswith("{"):
+        try:
+            obj = json.loads(text)
+            if isinstance(obj, dict) and (accept is None or accept(obj)):
+                return obj
+        except (ValueError, RecursionError):   # 嵌套过深的病态输入同样视为解析失败
+            pass
+    for start, end in _object_spans(text):
+        try:
+            obj = json.loads(text[start:end])
+        except (ValueError, RecursionError):
+            continue
+        if isinstance(obj, dict) and (accept is None or accept(obj)):
+            return obj
+    return None
+
+def is_feedback_object(obj) -> bool:
+    """顶层反馈对象：带 "feedback" 字典（维度是否齐全由 validate_feedback 规整）。"""
+    return isinstance(obj, dict) and isinstance(obj.get("feedback"), dict)
+
+# =============== 四维 schema ===============
+def _text(value) -> str:
+    if value is None:
+        return ""
+    return (value if isinstance(value, str) else str(value)).strip()
+
+def _items(value) -> list:
+    """字符串列表；单个字符串视为一条，dict 条目拼接其字符串值，空条目丢弃。"""
+    if value is None:
+        return []
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+    out = []
+    for x in value:
+        if isinstance(x, dict):
+            x = " — ".join(_text(v) for v in x.values() if _text(v))
+        x = _text(x)
+        if x:
+            out.append(x)
+    return out
+
+@dataclass(slots=True)
+class Section:
+    summary: str = ""
+    issues: list = field(default_factory=list)
+    revision_tips: list = field(default_factory=list)
+
+    @classmethod
+    def from_obj(cls, obj) -> "Section":
+        if not isinstance(obj, dict):
+            return cls()
+        return cls(_text(obj.get("summary")), _items(obj.get("issues")), _items(obj.get("revision_tips")))
+
+    def to_dict(self) -> dict:
+        return {"summary": self.summary, "issues": list(self.issues), "revision_tips": list(self.revision_tips)}
+
+@dataclass(slots=True)
+class Feedback:
+    """固定四维（DIMENSIONS 顺序）的反馈；raw 为模型原始输出（解析失败时才有）。"""
+    summary: str
+    sections: dict
+    raw: str = None
+
+    def section(self, name: str) -> Section:
+        return self.sections[name]
+
+    def to_dict(self) -> dict:
+        out = {"summary": self.summary, "feedback": {name: sec.to_dict() for name, sec in self.sections.items()}}
+        if self.raw is not None:
+            out["raw"] = self.raw
+        return out
+
+def validate_feedback(obj) -> Feedback:
+    """
+    按四维 schema 一次遍历校验/规整：Coherence → Reasoning；缺失维度补空；字段类型统一为 str / [str]；
+    其他键丢弃（"raw" 保留）。非 dict 输入得到空反馈。
+    """
+    if not isinstance(obj, dict):
+        return Feedback("", {name: Section() for name in DIMENSIONS})
+    fb = obj.get("feedback")
+    fb = fb if isinstance(fb, dict) else {}
+    sections = {}
+    for name in DIMENSIONS:
+        sec = fb.get(name)
+        if sec is None:
+            sec = next((fb[a] for a, target in _ALIASES.items() if target == name and a in fb), None)
+        sections[name] = Section.from_obj(sec)
+    raw = obj.get("raw")
+    return Feedback(_text(obj.get("summary")), sections, raw if isinstance(raw, str) else None)
+
+# =============== 流式增量扫描 ===============
+
+class _Frame:
+    __slots__ = ("kind", "start", "key", "expect_key")
+
+    def __init__(self, kind: str, start: int):
+        self.kind = kind            # "{" 或 "["
+        self.start = start          # 在累计文本中的起始下标
+        self.key = None             # 对象内当前键（其值正在解析）
+        self.expect_key = kind == "{"
+
+class FeedbackStreamParser:
+    """
+    增量解析模型流式输出：feed(delta) 返回本次新完成的事件列表：
+    - ("summary", str)：顶层 summary 字符串完整时；
+    - ("section", name, dict)：feedback.<name> 对象闭合时（Grammar/Vocabulary/Organization/Reasoning/…）。
+    只做结构扫描（括号栈 + 字符串/转义状态），每个字符只看一次；第一个 "{" 之前、顶层对象闭合之后的内容忽略。
+    """
+    def __init__(self):
+        self.text = ""
+        self.done = False
+        self._pos = 0
+        self._stack = []
+        self._in_str = False
+        self._esc = False
+        self._str_start = -1
+
+    def feed(self, delta: str) -> list:
+        events = []
+        if self.done or not delta:
+            return events
+        self.text += delta
+        text, stack = self.text, self._stack
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    self._end_string(i, events)
+            elif not stack:
+                if c == "{":
+                    stack.append(_Frame(c, i))
+            elif c == '"':
+                self._in_str = True
+                self._str_start = i
+            elif c in "{[":
+                stack.append(_Frame(c, i))
+            elif c in "}]":
+                frame = stack.pop()
+                self._end_container(frame, i, events)
+                if not stack:
+                    self.done = True
+                    break
+            elif c == ":":
+                stack[-1].expect_key = False
+            elif c == "," and stack[-1].kind == "{":
+                stack[-1].expect_key = True
+                stack[-1].key = None
+        self._pos = len(text)
+        return events
+
+    def _end_string(self, i: int, events: list):
+        top = self._stack[-1]
+        try:
+            value = json.loads(self.text[self._str_start:i + 1])
+        except ValueError:
+            return
+        if top.kind == "{" and top.expect_key:
+            top.key = value
+        elif len(self._stack) == 1 and top.key == "summary":
+            events.append(("summary", value))
+
+    def _end_container(self, frame: _Frame, i: int, events: list):
+        stack = self._stack
+        if frame.kind == "{" and len(stack) == 2 and stack[0].key == "feedback" and stack[1].key:
+            try:
+                events.append(("section", stack[1].key, json.loads(self.text[frame.start:i + 1])))
+            except ValueError:
+                pass
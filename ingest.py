@@ -0,0 +1,183 @@
+# ingest.py —— 上传入库：分块流式写临时文件同时算 sha256 → 内容寻址存储（同一内容只存一份）→ 硬链接到 uploads/<upload_id>/
+# 写完即在后台提取+清洗文本，结果按内容哈希落盘复用；重复提交既不占额外磁盘，也不再重复解析。
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import evaluate
+from evaluate import prepare_text
+
+# =============== 配置区（这里改） ===============
+INGEST_CHUNK     = 1 << 20      # 每次从上传流读取的字节数
+PREFETCH_WORKERS = 2            # 后台文本提取线程数
+GC_GRACE_S       = 3600         # 刚入库/刚被重复提交的 blob 在这段时间内不被 gc（覆盖 ingest → link → 建记录之间的窗口）
+# ==============================================
+
+class BlobTooLarge(ValueError):
+    """上传流超过 ingest(max_bytes=...) 的上限（临时文件已删除）。"""
+
+@dataclass(slots=True)
+class Blob:
+    sha256: str
+    path: Path
+    size: int
+    new: bool                   # False = 内容已存在（重复提交），本次未占用新空间
+
+class BlobStore:
+    """
+    root/<sha[:2]>/<sha><后缀> 存放唯一内容；上传目录里的文件是它的硬链接。
+    硬链接计数回到 1 且不再被任何上传引用的 blob 由 gc() 清理。
+    ingest 在锁内发布/续期 blob（mtime 记为当前时间），gc 在同一把锁内检查并删除，且跳过 GC_GRACE_S 内的 blob：
+    入库后到 link、建上传记录之前，blob 尚无硬链接也无引用，不能被并发的 gc 当成垃圾。
+    """
+    def __init__(self, root):
+        self.root = Path(root)
+        self.tmp = self.root / "tmp"
+        self.tmp.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stats = {"uploads": 0, "duplicates": 0, "bytes_received": 0, "bytes_deduplicated": 0}
+
+    def blob_path(self, sha256: str, suffix: str) -> Path:
+        return self.root / sha256[:2] / f"{sha256}{suffix.lower()}"
+
+    def ingest(self, stream, suffix: str, chunk: int = INGEST_CHUNK, max_bytes: int = None) -> Blob:
+        """
+        按 chunk 读流 → 临时文件 + 增量哈希；内容已存在则丢弃临时文件。
+        给定 max_bytes 时读到超限即停止并抛 BlobTooLarge（不信任客户端声明的大小）。
+        """
+        h = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.tmp, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    data = stream.read(chunk)
+                    if not data:
+                        break
+                    size += len(data)
+                    if max_bytes is not None and size > max_bytes:
+                        raise BlobTooLarge(f"超过 {max_bytes} 字节")
+                    h.update(data)
+                    out.write(data)
+            path = self.blob_path(h.hexdigest(), suffix)
+            with self._lock:
+                new = not path.exists()
+                if new:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(tmp_name, path)
+                else:
+                    os.unlink(tmp_name)
+                os.utime(path)                  # 新旧 blob 都续期，gc 在宽限期内不会动它
+                self._stats["uploads"] += 1
+                self._stats["bytes_received"] += size
+                if not new:
+                    self._stats["duplicates"] += 1
+                    self._stats["bytes_deduplicated"] += size
+            return Blob(h.hexdigest(), path, size, new)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+    def link(self, blob: Blob, dest: Path) -> Path:
+        """
+        在 dest 建立指向 blob 的硬链接；文件系统不支持时直接返回 blob 路径（由 gc 的引用检查兜底）。
+        blob 本身不存在（FileNotFoundError）是错误，原样抛出，不能把一个不存在的路径当作保存结果。
+        """
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if dest.exists():
+                dest.unlink()
+            os.link(blob.path, dest)
+            return dest
+        except FileNotFoundError:
+            raise
+        except OSError:
+            if not blob.path.exists():
+                raise FileNotFoundError(f"blob 不存在：{blob.path}")
+            return blob.path
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def gc(self, in_use, grace: float = GC_GRACE_S) -> list:
+        """
+        删除没有硬链接（st_nlink == 1）、in_use(path) 为 False 且超过 grace 秒未被入库/续期的 blob 及其文本缓存；
+        返回被删除的 sha。检查与删除在 ingest 用的同一把锁内进行。
+        """
+        removed = []
+        for path in self.root.glob("??/*"):
+            if ".clean" in path.name:          # 文本缓存随 blob 一起删
+                continue
+            try:
+                with self._lock:
+                    st = path.stat()
+                    if st.st_nlink > 1 or time.time() - st.st_mtime < grace or in_use(str(path.resolve())):
+                        continue
+                    sha = path.name.split(".")[0]
+                    for sidecar in path.parent.glob(f"{path.name}.clean*.txt"):
+                        sidecar.unlink(missing_ok=True)
+                    path.unlink()
+                removed.append(sha)
+            except FileNotFoundError:
+                continue
+        return removed
+
+# =============== 清洗文本：按内容哈希缓存 + 后台预取 ===============
+_PREFETCH = None
+_PENDING = {}                  # sidecar 路径 → Future
+_LOCK = threading.Lock()
+
+def _sidecar(blob_path: Path) -> Path:
+    """清洗结果随 blob 存放；文件名带上当前截断上限，改配置后自动失效。"""
+    limit = evaluate.MAX_ESSAY_CHARS if evaluate.CHUNK_LONG_ESSAYS else evaluate.MAX_CHARS
+    return blob_path.with_name(f"{blob_path.name}.clean{limit}.txt")
+
+def _extract(blob_path: Path, sidecar: Path) -> str:
+    text = prepare_text(blob_path)
+    tmp = sidecar.with_name(sidecar.name + f".{threading.get_ident()}.part")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, sidecar)
+    return text
+
+def prefetch_text(blob_path: Path):
+    """写入完成后立即在后台提取+清洗（已有缓存或已在进行中则跳过）。"""
+    global _PREFETCH
+    sidecar = _sidecar(blob_path)
+    if sidecar.exists():
+        return
+    with _LOCK:
+        if sidecar in _PENDING:
+            return
+        if _PREFETCH is None:
+            _PREFETCH = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        fut = _PREFETCH.submit(_extract, blob_path, sidecar)
+        _PENDING[sidecar] = fut
+    fut.add_done_callback(lambda _: _forget(sidecar))
+
+def _forget(sidecar: Path):
+    with _LOCK:
+        _PENDING.pop(sidecar, None)
+
+def clean_text(path: Path, blob_path: Path = None) -> str:
+    """
+    等价于 evaluate.prepare_text(path)，但优先用按内容缓存的结果（后台预取中则等待它完成）。
+    blob_path 为 None（入库前的历史上传）时直接现算。
+    """
+    if blob_path is None or not blob_path.exists():
+        return prepare_text(Path(path))
+    sidecar = _sidecar(blob_path)
+    with _LOCK:
+        fut = _PENDING.get(sidecar)
+    if fut is not None:
+        return fut.result()
+    try:
+        return sidecar.read_text(encoding="utf-8")
+    except OSError:
+        return _extract(blob_path, sidecar)
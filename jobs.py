@@ -0,0 +1,79 @@
+# jobs.py —— 有界后台任务队列：固定数量的工作线程消费，队列满即拒绝（调用方返回 429）
+import queue
+import threading
+import time
+import uuid
+
+import metrics
+
+# =============== 配置区（这里改） ===============
+JOB_WORKERS    = 4      # 并发执行的任务数（即同时在途的模型请求数）
+JOB_QUEUE_SIZE = 32     # 排队上限；超过则 submit 抛 QueueFull
+# ==============================================
+
+class QueueFull(Exception):
+    """队列已满（背压）。"""
+
+class JobQueue:
+    """
+    handler(*args) 在工作线程里执行；submit 立即返回 job_id，不阻塞请求线程。
+    任务状态由 handler 自己记录（process.py 写进 STORE 的 job_status / job_error），这里只统计排队与在途数。
+    """
+    def __init__(self, handler, workers: int = JOB_WORKERS, maxsize: int = JOB_QUEUE_SIZE):
+        self.handler = handler
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._running = 0
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f"eval-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, *args) -> str:
+        self._ensure_workers()
+        job_id = str(uuid.uuid4())
+        try:
+            self._queue.put_nowait((job_id, time.time(), args))
+        except queue.Full:
+            raise QueueFull(f"evaluation queue is full ({self._queue.maxsize})")
+        return job_id
+
+    def _work(self):
+        while True:
+            job_id, enqueued_at, args = self._queue.get()
+            started = time.time()
+            with self._lock:
+                self._running += 1
+            waited = started - enqueued_at
+            metrics.QUEUE_WAIT.observe(waited)
+            # 每个任务一条 trace：handler 内各阶段耗时 / tokens / 缓存命中汇成一行日志
+            tr = metrics.start_trace("job", job_id=job_id, queue_wait_ms=round(waited * 1000, 2))
+            status = "failed"
+            try:
+                self.handler(*args)
+                status = "done"
+            except Exception:
+                pass  # handler 已自行记录失败原因
+            finally:
+                with self._lock:
+                    self._running -= 1
+                metrics.JOB_SECONDS.observe(time.time() - started, status=status)
+                metrics.end_trace(tr, status=status)
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        with self._lock:
+            running = self._running
+        return {
+            "queued": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "running": running,
+            "workers": self.workers,
+        }
@@ -0,0 +1,264 @@
+# metrics.py —— 轻量埋点：各阶段耗时直方图 + 计数器 → Prometheus 文本格式（/metrics）；每次请求/任务/CLI 运行结束时一行 JSON 日志
+# 纯标准库；单次记录 = 一次加锁 + 一次二分查找（微秒级），可常开。
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# =============== 配置区（这里改） ===============
+ENABLED   = True                     # False：span/timed/trace 全部直接透传，不计时
+LOG_TRACES = True                    # 每个 trace 结束时输出一行结构化日志（logger "essay.metrics"，INFO）
+PREFIX    = "essay_"                 # 指标名前缀
+BUCKETS   = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# ==============================================
+
+log = logging.getLogger("essay.metrics")
+log.setLevel(logging.INFO)
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name, self.help, self.labelnames = PREFIX + name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(k, "") for k in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> dict:
+        """{标签值元组: 当前值}。"""
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"] + [
+            f"{self.name}{_labels(self.labelnames, k)} {v:g}" for k, v in items
+        ]
+
+class Histogram:
+    """固定桶；每个标签组合存 [各桶计数(非累积)..., +Inf 计数], sum。"""
+    def __init__(self, name: str, help: str, labelnames=(), buckets=BUCKETS):
+        self.name, self.help, self.labelnames = PREFIX + name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(k, "") for k in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            v[0][i] += 1
+            v[1] += value
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in items:
+            acc = 0
+            for le, n in zip(self.buckets + ("+Inf",), counts):
+                acc += n
+                bound = 'le="%s"' % le
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [bound])} {acc}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {acc}")
+        return lines
+
+class Gauge:
+    """取值时才调用 fn()；fn 返回数值，或 {标签值元组: 数值}。"""
+    def __init__(self, name: str, help: str, fn, labelnames=()):
+        self.name, self.help, self.labelnames, self.fn = PREFIX + name, help, tuple(labelnames), fn
+
+    def render(self) -> list:
+        try:
+            value = self.fn()
+        except Exception:   # 采集失败不影响其他指标
+            return []
+        if value is None:
+            return []
+        items = sorted(value.items()) if isinstance(value, dict) else [((), value)]
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"] + [
+            f"{self.name}{_labels(self.labelnames, k)} {float(v):g}" for k, v in items
+        ]
+
+_REGISTRY = {}
+_REG_LOCK = threading.Lock()
+
+def _register(metric):
+    with _REG_LOCK:
+        return _REGISTRY.setdefault(metric.name, metric)
+
+def counter(name: str, help: str, labelnames=()) -> Counter:
+    return _register(Counter(name, help, labelnames))
+
+def histogram(name: str, help: str, labelnames=(), buckets=BUCKETS) -> Histogram:
+    return _register(Histogram(name, help, labelnames, buckets))
+
+def gauge(name: str, help: str, fn, labelnames=()) -> Gauge:
+    """同名 gauge 重复注册时以最后一次为准（例如测试里替换了 client）。"""
+    g = Gauge(name, help, fn, labelnames)
+    with _REG_LOCK:
+        _REGISTRY[g.name] = g
+    return g
+
+def render() -> str:
+    """Prometheus 文本格式（text/plain; version=0.0.4）。"""
+    with _REG_LOCK:
+        metrics = list(_REGISTRY.values())
+    lines = []
+    for m in metrics:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+# =============== 预定义指标 ===============
+STAGE_SECONDS  = histogram("stage_seconds", "Time spent per pipeline stage.", ("stage",))
+MODEL_REQUESTS = counter("model_requests_total", "Model calls by outcome.", ("status",))
+MODEL_TOKENS   = counter("model_tokens_total", "Tokens reported in response usage.", ("kind", "template"))
+MODEL_SECONDS  = histogram("model_seconds", "Model call latency by prompt template and prefix-cache outcome.",
+                           ("template", "prefix_cache"))
+MODEL_TTFT     = histogram("model_ttft_seconds", "Streaming time to first output token by prompt template and "
+                           "prefix-cache outcome.", ("template", "prefix_cache"))
+CACHE_LOOKUPS  = counter("cache_lookups_total", "Feedback cache lookups.", ("result",))
+QUEUE_WAIT     = histogram("job_queue_wait_seconds", "Time an evaluation job waited in the queue.")
+JOB_SECONDS    = histogram("job_seconds", "Evaluation job run time.", ("status",))
+HTTP_SECONDS   = histogram("http_request_seconds", "Flask request latency.", ("route", "method", "status"))
+
+# =============== trace：把一次操作的各阶段汇成一行日志 ===============
+_local = threading.local()
+_TRACE_LOCK = threading.Lock()
+
+def current():
+    return getattr(_local, "trace", None)
+
+def _add(tr: dict, key: str, value: float, bucket: str = None):
+    with _TRACE_LOCK:
+        d = tr[bucket] if bucket else tr
+        d[key] = d.get(key, 0) + value
+
+def observe_stage(stage: str, seconds: float):
+    if not ENABLED:
+        return
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    tr = current()
+    if tr is not None:
+        _add(tr, stage, seconds, "stages")
+
+def note(**fields):
+    """给当前 trace 附加字段（数值累加，其余覆盖）；没有 trace 时忽略。"""
+    tr = current()
+    if tr is None:
+        return
+    for k, v in fields.items():
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            _add(tr, k, v)
+        else:
+            with _TRACE_LOCK:
+                tr[k] = v
+
+@contextmanager
+def span(stage: str):
+    if not ENABLED:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - t0)
+
+def timed(stage: str):
+    """装饰器版 span。"""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe_stage(stage, time.perf_counter() - t0)
+        return wrapper
+    return deco
+
+def start_trace(kind: str, **fields) -> dict:
+    """开始一个 trace（可嵌套，结束时恢复外层）；返回 trace 字典，交给 end_trace。"""
+    tr = {"event": kind, **fields, "stages": {}, "_t0": time.perf_counter(), "_outer": current()}
+    _local.trace = tr
+    return tr
+
+def end_trace(tr: dict, **fields):
+    """结束 trace：恢复外层 trace，输出一行 JSON 日志（阶段耗时单位 ms）。"""
+    _local.trace = tr.pop("_outer", None)
+    total = time.perf_counter() - tr.pop("_t0")
+    if not (ENABLED and LOG_TRACES) or not log.isEnabledFor(logging.INFO):
+        return
+    with _TRACE_LOCK:
+        record = {k: v for k, v in tr.items() if k != "stages"}
+        record.update(fields)
+        record["ms"] = round(total * 1000, 2)
+        record["stages_ms"] = {k: round(v * 1000, 2) for k, v in tr["stages"].items()}
+    log.info(json.dumps(record, ensure_ascii=False, default=str))
+
+@contextmanager
+def trace(kind: str, **fields):
+    tr = start_trace(kind, **fields)
+    error = None
+    try:
+        yield tr
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        end_trace(tr, **({"error": error} if error else {}))
+
+def bind(fn):
+    """让线程池里的任务记到提交者的 trace 上（分块 / fanout 并发时使用）。"""
+    tr = current()
+    if tr is None:
+        return fn
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        outer = current()
+        _local.trace = tr
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.trace = outer
+    return wrapper
+
+def record_usage(resp, template: str = ""):
+    """
+    从 Responses 回包的 usage 记 tokens（按 prompt 模板分开）；返回命中服务端前缀缓存的输入 tokens 数，
+    usage 缺失（例如 FakeClient）时返回 None。
+    """
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return None
+    tokens = {
+        "input": getattr(usage, "input_tokens", None) or 0,
+        "output": getattr(usage, "output_tokens", None) or 0,
+        "cached_input": getattr(getattr(usage, "input_tokens_details", None), "cached_tokens", None) or 0,
+    }
+    for kind, n in tokens.items():
+        if n:
+            MODEL_TOKENS.inc(n, kind=kind, template=template)
+    note(**{f"{k}_tokens": n for k, n in tokens.items()})
+    return tokens["cached_input"]
@@ -1,10 +1,29 @@
 # app.py —— 固定四维度：Grammar / Vocabulary / Organization / Reasoning
-from flask import Flask, request, render_template_string, abort, jsonify, session, url_for
+from flask import (Flask, Response, request, render_template_string, abort, jsonify, session, url_for, stream_with_context,
+                   g)
 from werkzeug.utils import secure_filename
 from pathlib import Path
-import uuid
 import json
-import re
+import logging
+import shutil
+import time
+import uuid
+import zipfile
+import zlib
+
+import evaluate
+from evaluate import (normalize_reasoning, open_cache, evaluate_text, evaluate_text_streaming,
+                      describe_error, cache_variant, text_stats, with_text_stats)
+from jobs import JobQueue, QueueFull, JOB_WORKERS, JOB_QUEUE_SIZE
+from storage import SQLiteUploadStore
+from streaming import StreamHub, sse
+from scheduler import ScheduledClient
+from revision import evaluate_revision
+from feedback_parse import extract_json_object, is_feedback_object, validate_feedback
+import ingest
+from ingest import BlobStore, BlobTooLarge
+import metrics
+import textstats
 
 app = Flask(__name__)
 app.secret_key = "change-this-secret-in-prod"  # 生产请替换随机字符串
@@ -16,9 +35,29 @@ SAVE_ROOT.mkdir(parents=True, exist_ok=True)
 
 ALLOWED_EXTS = {".pdf", ".docx", ".txt"}     # 稿件类型
 ALLOWED_FEEDBACK_EXTS = {".txt"}             # 仅接收 evaluate 输出的 .txt（内部是 JSON）
+USE_CACHE = True                             # 上传稿件时先查反馈缓存（表单勾选 nocache 可绕过）
+AUTO_EVALUATE = True                         # 上传后自动排队调用模型（False = 仅保存，手动上传反馈）
+EVAL_CLIENT = None                           # 模型 client；None 时按 evaluate.API_KEY 懒创建（经 scheduler 限流/重试；测试可换 fake_llm.FakeClient）
+STREAM_FEEDBACK = True                       # 后台任务用流式 Responses API，逐维度经 SSE 推到页面
+EVAL_MODE = "single"                         # "fanout"：四个维度并发各发一个小请求（每完成一个维度即推送）
+DIMENSIONS = [("Grammar", "语法"), ("Vocabulary", "词汇"), ("Organization", "组织"), ("Reasoning", "推理")]
 
-# { upload_id: { "filename": str, "saved_path": str, "feedback_count": int, "latest_rows": list|None } }
-STORE = {}
+STORE_DB = Path(r"./.store/uploads.sqlite3")  # 上传记录与每一轮反馈（多 worker 共享）
+UPLOAD_TTL_DAYS = 30                          # 超过该天数未更新的上传连同 uploads/<upload_id>/ 一并清理
+CLEANUP_INTERVAL_S = 3600                     # 清理检查的最小间隔
+BLOB_ROOT = SAVE_ROOT / "_blobs"              # 内容寻址存储：相同文件只存一份，uploads/<upload_id>/ 下是硬链接
+
+BULK_MAX_BYTES = 200 * 1024 * 1024            # /api/uploads 单次请求（多文件 / zip）的总大小上限；单篇仍 ≤ MAX_CONTENT_LENGTH
+BULK_MAX_FILES = 500                          # 单次批量上传的最大篇数
+BULK_PAGE_SIZE = 50                           # 批量查询默认每页条数
+BULK_MAX_PAGE_SIZE = 500
+
+# 记录结构见 storage.UploadStore.get()
+STORE = SQLiteUploadStore(STORE_DB)
+STREAMS = StreamHub()
+BLOBS = BlobStore(BLOB_ROOT)
+_last_cleanup = 0.0
+FEEDBACK_CACHE = open_cache() if USE_CACHE else None
 
 # =================== HTML 模板 ===================
 PAGE = """
@@ -70,10 +109,11 @@ PAGE = """
           <form action="{{ url_for('upload') }}" method="post" enctype="multipart/form-data">
             <label for="paper">选择文件（pdf / docx / txt，≤10MB）</label>
             <input id="paper" name="paper" type="file" required />
+            <label class="small" style="font-weight:400;"><input type="checkbox" name="nocache" value="1" /> 跳过反馈缓存</label>
             <button type="submit">上传</button>
             <div class="muted" style="margin-top:8px;">
-              提交后系统将对稿件进行解析与结构化反馈（展示用文案）。<br>
-              实际后端此脚本仅做“保存文件到本地”，解析由你的另一个脚本完成。
+              提交后系统将对稿件进行解析，并在后台排队调用模型生成结构化反馈。<br>
+              也可以手动运行 evaluate.py，再在下方上传其输出的 .txt。
             </div>
           </form>
 
@@ -92,6 +132,18 @@ PAGE = """
                 <a class="btn-ghost" href="{{ url_for('api_feedback_status', upload_id=upload_id) }}" target="_blank" style="text-decoration:none;padding:10px 16px;border-radius:10px;">查看JSON状态</a>
               </div>
 
+              <!-- 修改稿：只重评改动段落，与上一轮反馈合并 -->
+              <div class="divider"></div>
+              <h2>上传修改稿（增量评估）</h2>
+              <form action="{{ url_for('revise_upload', upload_id=upload_id) }}" method="post" enctype="multipart/form-data">
+                <label for="rev">选择修改后的稿件（pdf / docx / txt）</label>
+                <input id="rev" name="paper" type="file" required />
+                <button type="submit">上传修改稿</button>
+                <div class="small" style="margin-top:6px;">
+                  与上一轮按段落比对，只把改动的段落发给模型，结果与上一轮反馈合并；未改动的段落不会重复评估。
+                </div>
+              </form>
+
               <!-- 反馈上传区（.txt） -->
               <div class="divider"></div>
               <h2>上传本轮反馈结果（.txt，evaluate.py 输出）</h2>
@@ -118,6 +170,27 @@ PAGE = """
           {% else %}
             <div class="muted" style="margin-top:6px;">上传后将显示该稿件的反馈次数。</div>
           {% endif %}
+          {% if text_stats %}
+            <div class="divider"></div>
+            <h2>文本统计（本地）</h2>
+            <div class="kv small">
+              <div>词数 / 词型</div>
+              <div>{{ text_stats["words"] }} / {{ text_stats["types"] }}（TTR {{ "%.2f"|format(text_stats["ttr"]) }}，MATTR {{ "%.2f"|format(text_stats["mattr"]) }}）</div>
+              <div>句子</div>
+              <div>{{ text_stats["sentences"] }} 句，平均 {{ text_stats["sentence_len"]["mean"] }} 词，最长 {{ text_stats["sentence_len"]["max"] }} 词；长句 {{ text_stats["long_sentences"] }}，短句 {{ text_stats["short_sentences"] }}</div>
+              <div>段落</div>
+              <div>{{ text_stats["paragraphs"] }} 段，每段 {{ text_stats["paragraph_words"]["min"] }}–{{ text_stats["paragraph_words"]["max"] }} 词</div>
+              {% if text_stats["repeated_ngrams"] %}
+                <div>重复短语</div>
+                <div>{% for g in text_stats["repeated_ngrams"] %}“{{ g["ngram"] }}”×{{ g["count"] }}{% if not loop.last %}，{% endif %}{% endfor %}</div>
+              {% endif %}
+              {% if text_stats["top_words"] %}
+                <div>高频实词</div>
+                <div>{% for w in text_stats["top_words"] %}{{ w["word"] }}×{{ w["count"] }}{% if not loop.last %}，{% endif %}{% endfor %}</div>
+              {% endif %}
+            </div>
+            <div class="muted" style="margin-top:6px;">上传后立即由清洗文本计算，不等模型评估。</div>
+          {% endif %}
           <div class="divider"></div>
           <div class="muted">
             说明：本页面仅保存文件并展示“第 N 轮反馈”的进度；解析与模型调用请在你自己的“解析脚本”中完成。
@@ -130,7 +203,8 @@ PAGE = """
       <div class="card wide">
         <div class="inner">
           {% if latest_rows %}
-            <h2>反馈表格（第 {{ feedback_count }} 轮 / 最新）</h2>
+            <h2>反馈表格（第 {{ feedback_count }} 轮 / 最新）{% if from_cache %} <span class="pill">缓存命中</span>{% endif %}
+              {% if latest_stats and latest_stats.get("mode") %} <span class="pill">修改稿：改动 {{ latest_stats["changed"] }}/{{ latest_stats["paragraphs"] }} 段，节省约 {{ latest_stats["tokens_saved"] }} tokens</span>{% endif %}</h2>
             <div class="small">维度：语法 Grammar、词汇 Vocabulary、组织 Organization、推理 Reasoning</div>
             <table>
               <thead>
@@ -168,6 +242,56 @@ PAGE = """
                 {% endfor %}
               </tbody>
             </table>
+          {% elif job and job["status"] in ("queued", "running") %}
+            <h2>反馈表格（生成中）</h2>
+            <div class="muted" id="stream-status">模型评估中（{{ "排队" if job["status"] == "queued" else "生成" }}中），各维度完成后会逐个显示……</div>
+            <table>
+              <thead>
+                <tr>
+                  <th style="width:160px;">维度</th>
+                  <th>Summary</th>
+                  <th>Issues</th>
+                  <th>Revision Tips</th>
+                </tr>
+              </thead>
+              <tbody>
+                {% for name_en, name_cn in dimensions %}
+                  <tr id="sec-{{ name_en }}">
+                    <td>{{ name_cn }}<br><span class="small">{{ name_en }}</span></td>
+                    <td class="small">…</td><td></td><td></td>
+                  </tr>
+                {% endfor %}
+              </tbody>
+            </table>
+            <script>
+              (function(){
+                var done = "{{ url_for('view_feedback', upload_id=upload_id) }}";
+                function list(items){
+                  var ul = document.createElement("ul"); ul.style.margin = "0 0 0 16px";
+                  (items || []).forEach(function(t){ var li = document.createElement("li"); li.textContent = t; ul.appendChild(li); });
+                  return ul;
+                }
+                function poll(){
+                  fetch("{{ url_for('api_job_status', upload_id=upload_id) }}").then(r => r.json()).then(j => {
+                    if (j.status === "done" || j.status === "failed") { location.href = done; }
+                    else { setTimeout(poll, 2000); }
+                  }).catch(() => setTimeout(poll, 5000));
+                }
+                if (!window.EventSource) { poll(); return; }
+                var es = new EventSource("{{ url_for('api_feedback_stream', upload_id=upload_id) }}");
+                es.addEventListener("section", function(e){
+                  var sec = JSON.parse(e.data), tr = document.getElementById("sec-" + sec.name);
+                  if (!tr) return;
+                  tr.cells[1].textContent = sec.summary || ""; tr.cells[1].className = "";
+                  tr.cells[2].replaceChildren(list(sec.issues));
+                  tr.cells[3].replaceChildren(list(sec.revision_tips));
+                });
+                es.addEventListener("done", function(){ es.close(); location.href = done; });
+                es.addEventListener("error", function(e){ es.close(); if (e.data) { location.href = done; } else { poll(); } });
+              })();
+            </script>
+          {% elif job and job["status"] == "failed" %}
+            <div class="muted">自动评估失败：{{ job["error"] }}。可手动运行 evaluate.py 后在上方上传反馈。</div>
           {% else %}
             <div class="muted">尚未上传任何反馈结果。请先在上方“上传本轮反馈结果”。</div>
           {% endif %}
@@ -187,36 +311,24 @@ def allowed_feedback_file(filename: str) -> bool:
     return Path(filename).suffix.lower() in ALLOWED_FEEDBACK_EXTS
 
 def parse_feedback_text_to_json(text: str):
-    """尽量把文本解析成 JSON；若纯 JSON 失败，退回提取第一个 {...}。"""
-    try:
-        return json.loads(text)
-    except Exception:
-        m = re.search(r"\{[\s\S]*\}", text)
-        if m:
-            try:
-                return json.loads(m.group(0))
-            except Exception:
-                pass
-    return None
+    """尽量把文本解析成 JSON 对象；纯 JSON 失败时线性扫描取第一个完整的 {...}（与 evaluate.ensure_json 共用）。"""
+    return extract_json_object(text, is_feedback_object)
 
 def json_to_rows_fixed(data: dict):
     """
     把 evaluate 的 JSON 转为固定四维：Grammar / Vocabulary / Organization / Reasoning。
     若只给了 Coherence，则自动映射为 Reasoning。
     """
-    fb = data.get("feedback", {}) or {}
-    # 统一到 Reasoning
-    if "Reasoning" not in fb and "Coherence" in fb:
-        fb["Reasoning"] = fb.get("Coherence") or {}
+    fb = validate_feedback(data)  # 统一到 Reasoning
 
     def sec(name_en, name_cn):
-        sec_obj = fb.get(name_en, {}) or {}
+        sec_obj = fb.section(name_en)
         return {
             "label_en": name_en,
             "label_cn": name_cn,
-            "summary": (sec_obj.get("summary") or "").strip(),
-            "issues": sec_obj.get("issues") or [],
-            "tips": sec_obj.get("revision_tips") or [],
+            "summary": sec_obj.summary,
+            "issues": sec_obj.issues,
+            "tips": sec_obj.revision_tips,
         }
 
     rows = [
@@ -227,6 +339,246 @@ def json_to_rows_fixed(data: dict):
     ]
     return rows
 
+def cache_enabled() -> bool:
+    return FEEDBACK_CACHE is not None and request.values.get("nocache") != "1"
+
+def ingest_file(stream, upload_id: str, name: str, max_bytes: int = None):
+    """
+    上传流分块写入内容寻址存储（边写边算 sha256），再硬链接为 uploads/<upload_id>/<name>；
+    写完立即在后台提取+清洗文本。返回 (保存路径, ingest.Blob)。超过 max_bytes 时抛 ingest.BlobTooLarge。
+    """
+    with metrics.span("ingest"):
+        blob = BLOBS.ingest(stream, Path(name).suffix, max_bytes=max_bytes)
+        saved = BLOBS.link(blob, SAVE_ROOT / upload_id / name)
+    ingest.prefetch_text(blob.path)
+    if not blob.new:
+        app.logger.info("duplicate upload %s: content %s already stored (%d bytes)", upload_id, blob.sha256[:12], blob.size)
+    return saved, blob
+
+def essay_text_for(item: dict) -> str:
+    """上传记录 → 清洗文本（按内容哈希复用已提取的结果；没有哈希的历史上传现算）。"""
+    saved = Path(item["saved_path"])
+    blob = BLOBS.blob_path(item["content_hash"], saved.suffix) if item.get("content_hash") else None
+    return ingest.clean_text(saved, blob)
+
+def _stored_text_stats(item: dict):
+    """最新一轮反馈里保存的本地统计；评估排队/进行中（可能是修改稿）时视为过期，返回 None。"""
+    if item.get("job_status") in ("queued", "running"):
+        return None
+    return (item.get("latest") or {}).get("text_stats")
+
+def upload_text_stats(item: dict):
+    """
+    稿件的本地文本统计（快速路径）：已保存的直接用，否则由清洗文本现算——不等模型，上传后即可返回。
+    稿件无法解析时返回 None。
+    """
+    stats = _stored_text_stats(item)
+    if stats is not None:
+        return stats
+    try:
+        return textstats.analyze(essay_text_for(item))
+    except Exception:
+        return None
+
+def attach_text_stats(items: list, records: list):
+    """批量接口 ?stats=1：已保存统计的直接用，其余稿件一次性批量现算（textstats.analyze_many）。"""
+    todo = []
+    for it, rec in zip(items, records):
+        if "error" in it:
+            continue
+        rec["text_stats"] = _stored_text_stats(it)
+        if rec["text_stats"] is None:
+            try:
+                todo.append((rec, essay_text_for(it)))
+            except Exception:
+                pass
+    for (rec, _), stats in zip(todo, textstats.analyze_many([text for _, text in todo])):
+        rec["text_stats"] = stats
+
+def lookup_cached(item: dict):
+    """稿件清洗后按当前评估模式的缓存槽查缓存（与 run_evaluation 相同）；命中返回反馈 JSON，否则 None（解析失败也视为未命中）。"""
+    try:
+        clean_text = essay_text_for(item)
+        return FEEDBACK_CACHE.get(clean_text, cache_variant(EVAL_MODE, clean_text))
+    except Exception:
+        return None
+
+def eval_client():
+    """共享的模型 client（首次需要调用模型时创建）；API_KEY 未配置时直接抛 MissingAPIKey，不发出任何请求。"""
+    global EVAL_CLIENT
+    if EVAL_CLIENT is None:
+        if not evaluate.api_key_configured():
+            raise evaluate.MissingAPIKey("未配置 API_KEY：请先在 evaluate.py 顶部填写真实密钥（缓存命中的稿件不受影响）")
+        EVAL_CLIENT = ScheduledClient(evaluate.OpenAI(api_key=evaluate.API_KEY, max_retries=0))
+    return EVAL_CLIENT
+
+def section_event(name: str, sec: dict) -> dict:
+    sec = sec if isinstance(sec, dict) else {}
+    return {
+        "name": "Reasoning" if name == "Coherence" else name,
+        "summary": (sec.get("summary") or "").strip(),
+        "issues": list(sec.get("issues") or []),
+        "revision_tips": list(sec.get("revision_tips") or []),
+    }
+
+def publish_stream_event(upload_id: str, event):
+    if event[0] == "section":
+        STREAMS.publish(upload_id, "section", section_event(event[1], event[2]))
+    elif event[0] == "summary":
+        STREAMS.publish(upload_id, "summary", {"summary": event[1]})
+
+def run_evaluation(upload_id: str, use_cache: bool, revise: bool = False):
+    """
+    后台线程执行：读取 → 清洗 → build_prompt → 模型 → ensure_json → normalize_reasoning，结果记为新一轮。
+    revise=True（修改稿）且上一轮记录了清洗文本时，走 revision.evaluate_revision 只重评改动段落。
+    """
+    metrics.note(upload_id=upload_id, mode=EVAL_MODE, revise=revise)
+    item = STORE.get(upload_id)
+    if item is None:
+        STREAMS.close(upload_id)
+        return  # 已被清理
+    STORE.update(upload_id, job_status="running")
+    try:
+        clean_text = essay_text_for(item)
+        prev = STORE.latest_round(upload_id) if revise else None
+        cache = FEEDBACK_CACHE if use_cache else None
+        variant = cache_variant(EVAL_MODE, clean_text)
+        data = cache.get(clean_text, variant) if cache is not None else None
+        from_cache = data is not None
+        stats = None
+        if data is None and prev and prev.get("essay_text"):
+            data, stats = evaluate_revision(prev["essay_text"], clean_text, prev["data"], eval_client())
+            app.logger.info("revision %s: %s, changed %d/%d paragraphs, ~%d prompt tokens saved", upload_id,
+                            stats["mode"], stats["changed"], stats["paragraphs"], stats["tokens_saved"])
+        elif data is None:
+            on_event = lambda ev: publish_stream_event(upload_id, ev)
+            if STREAM_FEEDBACK and EVAL_MODE == "single":
+                data = evaluate_text_streaming(clean_text, eval_client(), on_event)
+            else:
+                data = evaluate_text(clean_text, eval_client(), mode=EVAL_MODE, on_event=on_event)
+            if cache is not None and "raw" not in data:
+                cache.put(clean_text, data, variant)
+        if "text_stats" not in data:  # 修改稿合并结果 / 旧版本缓存里的反馈不带统计
+            data = with_text_stats(data, text_stats(clean_text))
+        source = "cache" if from_cache else ("revision" if stats else "job")
+        metrics.note(source=source)
+        round_no = STORE.add_round(upload_id, data, source, essay_text=clean_text, stats=stats)
+        STORE.update(upload_id, from_cache=from_cache, job_status="done")
+        # 最终结果（已 normalize_reasoning）整体再推一次，覆盖流式阶段可能缺失/不规范的维度
+        for name, _ in DIMENSIONS:
+            STREAMS.publish(upload_id, "section", section_event(name, data["feedback"].get(name)))
+        STREAMS.publish(upload_id, "done", {"round": round_no, "from_cache": from_cache, "revision": stats})
+    except Exception as e:
+        msg = describe_error(e)
+        STORE.update(upload_id, job_status="failed", job_error=msg)
+        STREAMS.publish(upload_id, "error", {"error": msg})
+        raise RuntimeError(msg) from e
+    finally:
+        STREAMS.close(upload_id)
+
+JOBS = JobQueue(run_evaluation, workers=JOB_WORKERS, maxsize=JOB_QUEUE_SIZE)
+
+def register_upload(stream, filename: str, use_cache: bool, max_bytes: int = None) -> str:
+    """
+    新稿件：入库（内容寻址）→ 建记录 → 排队评估（AUTO_EVALUATE=False 时只查缓存）；返回 upload_id。
+    队列已满时回滚记录与上传目录并抛出 QueueFull；入库失败（超过 max_bytes、读流出错）时尚未建记录，异常原样抛出。
+    """
+    upload_id = str(uuid.uuid4())
+    final_path, blob = ingest_file(stream, upload_id, filename, max_bytes)
+    STORE.create(upload_id, filename, str(final_path.resolve()), content_hash=blob.sha256,
+                 job_status="queued" if AUTO_EVALUATE else None)
+    if AUTO_EVALUATE:
+        # 缓存查询也放到后台任务里做，请求线程只负责落盘与入队
+        STREAMS.open(upload_id)
+        try:
+            job_id = JOBS.submit(upload_id, use_cache)
+        except QueueFull:
+            STREAMS.close(upload_id)
+            STORE.delete(upload_id)
+            shutil.rmtree(SAVE_ROOT / upload_id, ignore_errors=True)
+            raise
+        STORE.update(upload_id, job_id=job_id)
+    elif use_cache:
+        cached = lookup_cached(STORE.get(upload_id))
+        if cached is not None:
+            STORE.add_round(upload_id, cached, "cache")
+            STORE.update(upload_id, from_cache=True)
+    return upload_id
+
+def maybe_cleanup():
+    """按 TTL 清理过期上传（节流：每 CLEANUP_INTERVAL_S 最多一次）。"""
+    global _last_cleanup
+    now = time.time()
+    if now - _last_cleanup < CLEANUP_INTERVAL_S:
+        return
+    _last_cleanup = now
+    for upload_id in STORE.cleanup(UPLOAD_TTL_DAYS * 86400):
+        shutil.rmtree(SAVE_ROOT / upload_id, ignore_errors=True)
+    BLOBS.gc(STORE.path_in_use)  # 不再有硬链接/引用的内容一并删除
+
+def get_item_or_404(upload_id: str) -> dict:
+    item = STORE.get(upload_id)
+    if not item:
+        abort(404, "upload_id 不存在或已清理")
+    return item
+
+def render_item(upload_id: str, item: dict):
+    job = {"status": item["job_status"], "error": item["job_error"]} if item.get("job_id") else None
+    with metrics.span("render"):
+        return _render_page(upload_id, item, job)
+
+def _render_page(upload_id: str, item: dict, job):
+    return render_template_string(
+        PAGE,
+        upload_id=upload_id,
+        filename=item["filename"],
+        saved_path=item["saved_path"],
+        feedback_count=item["feedback_count"],
+        session_upload_count=session.get("upload_count", 0),
+        latest_rows=json_to_rows_fixed(item["latest"]) if item.get("latest") else None,
+        latest_stats=item.get("latest_stats"),
+        text_stats=upload_text_stats(item),
+        from_cache=item.get("from_cache", False),
+        job=job,
+        dimensions=DIMENSIONS
+    )
+
+# =================== 埋点：每个请求一条 trace + /metrics ===================
+_UNTRACED = {"/metrics"}                      # 抓取请求只计直方图，不写日志
+
+@app.before_request
+def _start_request_trace():
+    g.t0 = time.perf_counter()
+    if request.path not in _UNTRACED:
+        g.trace = metrics.start_trace("http", method=request.method, path=request.path)
+
+@app.after_request
+def _end_request_trace(response):
+    route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    metrics.HTTP_SECONDS.observe(time.perf_counter() - g.pop("t0", time.perf_counter()),
+                                 route=route, method=request.method, status=response.status_code)
+    tr = g.pop("trace", None)
+    if tr is not None:
+        metrics.end_trace(tr, route=route, status=response.status_code)
+    return response
+
+metrics.gauge("job_queue_depth", "Jobs waiting in the evaluation queue.", lambda: JOBS.stats()["queued"])
+metrics.gauge("jobs_running", "Evaluation jobs currently running.", lambda: JOBS.stats()["running"])
+metrics.gauge("scheduler", "Model request scheduler counters (requests, retries, rate_limited, failed, wait seconds).",
+              lambda: {(k,): v for k, v in EVAL_CLIENT.stats().items()} if isinstance(EVAL_CLIENT, ScheduledClient) else None,
+              ("field",))
+metrics.gauge("extract_seconds_total", "Cumulative text extraction time by file type.",
+              lambda: {(suf,): st["seconds"] for suf, st in evaluate.extraction_stats().items()}, ("format",))
+metrics.gauge("extract_files_total", "Files extracted by file type.",
+              lambda: {(suf,): st["files"] for suf, st in evaluate.extraction_stats().items()}, ("format",))
+metrics.gauge("ingest", "Upload ingestion totals (uploads, duplicates, bytes).",
+              lambda: {(k,): v for k, v in BLOBS.stats().items()}, ("field",))
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus 文本格式。"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 # =================== 路由 ===================
 @app.route("/", methods=["GET"])
 def index():
@@ -250,54 +602,59 @@ def upload():
     if not allowed_file(f.filename):
         abort(400, f"不支持的文件类型：{Path(f.filename).suffix}. 允许：{', '.join(sorted(ALLOWED_EXTS))}")
 
-    filename = secure_filename(f.filename)
-    upload_id = str(uuid.uuid4())
-    doc_dir = SAVE_ROOT / upload_id
-    doc_dir.mkdir(parents=True, exist_ok=True)
-    final_path = doc_dir / filename
-    f.save(str(final_path))
-
+    maybe_cleanup()
+    try:
+        upload_id = register_upload(f.stream, secure_filename(f.filename), cache_enabled())
+    except QueueFull:
+        abort(429, "评估队列已满，请稍后再试")
     session["upload_count"] = session.get("upload_count", 0) + 1
-    STORE[upload_id] = {
-        "filename": filename,
-        "saved_path": str(final_path.resolve()),
-        "feedback_count": 0,
-        "latest_rows": None,
-    }
 
-    return render_template_string(
-        PAGE,
-        upload_id=upload_id,
-        filename=filename,
-        saved_path=str(final_path.resolve()),
-        feedback_count=STORE[upload_id]["feedback_count"],
-        session_upload_count=session["upload_count"],
-        latest_rows=None
-    )
+    return render_item(upload_id, STORE.get(upload_id))
+
+@app.route("/feedback/<upload_id>", methods=["GET"])
+def view_feedback(upload_id):
+    return render_item(upload_id, get_item_or_404(upload_id))
 
 @app.route("/feedback/<upload_id>/next", methods=["POST"])
 def feedback_next(upload_id):
-    item = STORE.get(upload_id)
-    if not item:
-        abort(404, "upload_id 不存在或已清理")
-    item["feedback_count"] += 1
+    get_item_or_404(upload_id)
+    STORE.increment_feedback_count(upload_id)
+    return render_item(upload_id, STORE.get(upload_id))
 
-    return render_template_string(
-        PAGE,
-        upload_id=upload_id,
-        filename=item["filename"],
-        saved_path=item["saved_path"],
-        feedback_count=item["feedback_count"],
-        session_upload_count=session.get("upload_count", 0),
-        latest_rows=item.get("latest_rows")
-    )
+@app.route("/feedback/<upload_id>/revise", methods=["POST"])
+def revise_upload(upload_id):
+    """上传修改稿：另存一份（不覆盖上一稿），排队增量评估，结果记为新一轮。"""
+    item = get_item_or_404(upload_id)
+    if not AUTO_EVALUATE:
+        abort(400, "未开启自动评估（AUTO_EVALUATE = False），请手动运行 evaluate.py 后上传反馈")
+    f = request.files.get("paper")
+    if not f or f.filename == "":
+        abort(400, "未选择文件")
+    if not allowed_file(f.filename):
+        abort(400, f"不支持的文件类型：{Path(f.filename).suffix}. 允许：{', '.join(sorted(ALLOWED_EXTS))}")
+
+    filename = secure_filename(f.filename)
+    final_path, blob = ingest_file(f.stream, upload_id, f"r{item['feedback_count'] + 1}_{filename}")
+
+    STORE.update(upload_id, filename=filename, saved_path=str(final_path.resolve()), content_hash=blob.sha256,
+                 job_status="queued", job_error=None)
+    STREAMS.open(upload_id)
+    try:
+        job_id = JOBS.submit(upload_id, cache_enabled(), True)
+    except QueueFull:
+        STREAMS.close(upload_id)
+        STORE.update(upload_id, filename=item["filename"], saved_path=item["saved_path"],
+                     content_hash=item["content_hash"], job_status=item["job_status"], job_error=item["job_error"])
+        if final_path.parent == SAVE_ROOT / upload_id:  # 只删硬链接，不动 blob 本身
+            final_path.unlink(missing_ok=True)
+        abort(429, "评估队列已满，请稍后再试")
+    STORE.update(upload_id, job_id=job_id)
+    return render_item(upload_id, STORE.get(upload_id))
 
 @app.route("/feedback/<upload_id>/upload_txt", methods=["POST"])
 def upload_feedback_txt(upload_id):
     """上传 .txt 反馈文件（evaluate 输出），解析并在下方表格展示（固定四维：Reasoning）"""
-    item = STORE.get(upload_id)
-    if not item:
-        abort(404, "upload_id 不存在或已清理")
+    item = get_item_or_404(upload_id)
 
     if "feedback_txt" not in request.files:
         abort(400, "未发现文件字段 'feedback_txt'")
@@ -312,36 +669,267 @@ def upload_feedback_txt(upload_id):
     if data is None:
         abort(400, "未能从该 .txt 中解析出合法的 JSON。请上传 evaluate.py 生成的 *_feedback.txt")
 
-    rows = json_to_rows_fixed(data)
-
-    # 更新内存：最新表格 + 轮次数（视为一轮）
-    item["latest_rows"] = rows
-    item["feedback_count"] = max(item.get("feedback_count", 0), 1)
-
-    return render_template_string(
-        PAGE,
-        upload_id=upload_id,
-        filename=item["filename"],
-        saved_path=item["saved_path"],
-        feedback_count=item["feedback_count"],
-        session_upload_count=session.get("upload_count", 0),
-        latest_rows=item["latest_rows"]
-    )
+    data = normalize_reasoning(data)
+    try:
+        essay_text = essay_text_for(item)
+    except Exception:
+        essay_text = None
+    # 人工反馈只记为本稿件的一轮，不写入模型结果缓存（否则会被当作模型输出提供给其他提交）
+    # 记为新一轮反馈（轮次数至少为 1）；记录清洗文本，后续修改稿据此做增量评估
+    STORE.add_round(upload_id, data, "upload_txt", essay_text=essay_text)
+    STORE.update(upload_id, from_cache=False)
+    return render_item(upload_id, STORE.get(upload_id))
 
 @app.route("/feedback/<upload_id>/status", methods=["GET"])
 def api_feedback_status(upload_id):
-    item = STORE.get(upload_id)
-    if not item:
-        abort(404, "upload_id 不存在或已清理")
+    item = get_item_or_404(upload_id)
     return jsonify({
         "upload_id": upload_id,
         "filename": item["filename"],
         "saved_path": item["saved_path"],
         "feedback_count": item["feedback_count"],
-        "has_latest_feedback": bool(item.get("latest_rows")),
+        "has_latest_feedback": bool(item.get("latest")),
+        "from_cache": bool(item.get("from_cache")),
+        "job_status": item.get("job_status"),
+        "content_hash": item.get("content_hash"),
+        "duplicate_uploads": max(0, STORE.count_by_hash(item["content_hash"]) - 1) if item.get("content_hash") else 0,
+        "ingest": BLOBS.stats(),
         "dimensions": ["Grammar", "Vocabulary", "Organization", "Reasoning"],
         "hint": "用 /feedback/<upload_id>/upload_txt 上传 *_feedback.txt 后，页面下方会显示表格。"
     })
 
+@app.route("/feedback/<upload_id>/job", methods=["GET"])
+def api_job_status(upload_id):
+    item = get_item_or_404(upload_id)
+    if not item.get("job_id"):
+        abort(404, "该稿件没有评估任务")
+    return jsonify({
+        "upload_id": upload_id,
+        "job_id": item["job_id"],
+        "status": item["job_status"],
+        "error": item["job_error"],
+        "has_latest_feedback": bool(item.get("latest")),
+        "queue": JOBS.stats(),
+        "scheduler": EVAL_CLIENT.stats() if isinstance(EVAL_CLIENT, ScheduledClient) else None,
+    })
+
+@app.route("/feedback/<upload_id>/stream", methods=["GET"])
+def api_feedback_stream(upload_id):
+    """
+    SSE：section（每个维度完成即推送）/ summary / done / error。
+    本进程正在执行该任务时直接订阅事件通道；否则（其他 worker 执行或早已结束）轮询存储，完成后一次性推送。
+    """
+    get_item_or_404(upload_id)
+
+    def from_store():
+        while True:
+            item = STORE.get(upload_id)
+            if item is None or item["job_status"] not in ("queued", "running"):
+                break
+            yield ": waiting\n\n"
+            time.sleep(1)
+        if item and item.get("latest"):
+            fb = item["latest"].get("feedback") or {}
+            for name, _ in DIMENSIONS:
+                yield sse("section", section_event(name, fb.get(name)))
+            yield sse("done", {"round": item["feedback_count"], "from_cache": item["from_cache"]})
+        else:
+            yield sse("error", {"error": (item or {}).get("job_error") or "没有可用的反馈"})
+
+    def from_hub():
+        for event, data in STREAMS.subscribe(upload_id):
+            yield sse(event, data) if event else ": keep-alive\n\n"
+
+    events = from_hub() if STREAMS.has(upload_id) else from_store()
+    return Response(stream_with_context(events), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/feedback/<upload_id>/stats", methods=["GET"])
+def api_text_stats(upload_id):
+    """本地文本统计（词汇多样性、句长、重复短语、段落）：不等模型评估，上传后立即可查。"""
+    item = get_item_or_404(upload_id)
+    stats = upload_text_stats(item)
+    if stats is None:
+        abort(422, "稿件无法解析")
+    return jsonify({"upload_id": upload_id, "job_status": item.get("job_status"), "text_stats": stats})
+
+@app.route("/feedback/<upload_id>/rounds", methods=["GET"])
+def api_feedback_rounds(upload_id):
+    get_item_or_404(upload_id)
+    return jsonify({"upload_id": upload_id, "rounds": STORE.rounds(upload_id)})
+
+# =================== 批量 JSON API（不渲染 PAGE） ===================
+_ZIP_READ_ERRORS = (zipfile.BadZipFile, zlib.error, EOFError)     # 读 zip 成员时：CRC 不符、实际内容超过声明大小、数据截断
+_ZIP_ERRORS = _ZIP_READ_ERRORS + (NotImplementedError, RuntimeError)  # 打开成员时另有：不支持的压缩方式、加密
+
+def iter_bulk_files():
+    """
+    multipart 中的 paper（可多个）与 archive（.zip，可多个）→ (文件名, 流 | None, 错误 | None)。
+    zip 成员按声明大小过滤（读取时 zipfile 也不会超出声明大小），目录与 __MACOSX/ 忽略。
+    """
+    limit = app.config["MAX_CONTENT_LENGTH"]
+    for f in request.files.getlist("paper"):
+        if f and f.filename:
+            if f.content_length and f.content_length > limit:   # 声明了大小的先挡掉；未声明的由 ingest 按字节上限截停
+                yield f.filename, None, "too_large"
+            else:
+                yield f.filename, f.stream, None
+    for z in request.files.getlist("archive"):
+        try:
+            zf = zipfile.ZipFile(z.stream)
+        except zipfile.BadZipFile:
+            yield z.filename, None, "bad_zip"
+            continue
+        with zf:
+            for info in zf.infolist():
+                if info.is_dir() or info.filename.startswith("__MACOSX/") or Path(info.filename).name.startswith("."):
+                    continue
+                name = Path(info.filename).name
+                if not allowed_file(name):
+                    yield name, None, "unsupported_type"
+                elif info.file_size > limit:
+                    yield name, None, "too_large"
+                else:
+                    try:
+                        stream = zf.open(info)
+                    except _ZIP_ERRORS:          # 损坏的本地文件头 / 不支持的压缩方式 / 加密成员
+                        yield name, None, "bad_zip"
+                        continue
+                    with stream:
+                        yield name, stream, None
+
+def upload_record(item: dict, with_rows: bool = False) -> dict:
+    """批量接口里单篇稿件的 JSON 视图（feedback 为最新一轮，已按四维规整）。"""
+    latest = item.get("latest")
+    rec = {
+        "upload_id": item["upload_id"],
+        "filename": item["filename"],
+        "job_status": item.get("job_status"),
+        "job_error": item.get("job_error"),
+        "feedback_count": item["feedback_count"],
+        "from_cache": bool(item.get("from_cache")),
+        "content_hash": item.get("content_hash"),
+        "created_at": item["created_at"],
+        "updated_at": item["updated_at"],
+        "feedback": normalize_reasoning(latest) if latest else None,
+    }
+    if with_rows:
+        rec["rows"] = json_to_rows_fixed(latest) if latest else None
+    return rec
+
+def _page_args():
+    try:
+        page = max(1, int(request.args.get("page", 1)))
+        per_page = min(BULK_MAX_PAGE_SIZE, max(1, int(request.args.get("per_page", BULK_PAGE_SIZE))))
+    except ValueError:
+        abort(400, "page / per_page 必须是整数")
+    return page, per_page
+
+def _requested_ids():
+    """ids 来自查询串（?ids=a,b 或重复 ?ids=a&ids=b）或 POST JSON {"ids": [...]}；都没有时返回 None（列出全部）。"""
+    ids = [x for v in request.args.getlist("ids") for x in v.split(",") if x.strip()]
+    if request.method == "POST":
+        body = request.get_json(silent=True) or {}
+        if not isinstance(body.get("ids", []), list):
+            abort(400, "ids 必须是数组")
+        ids += [str(x) for x in body.get("ids", [])]
+    return [x.strip() for x in ids] if ids else None
+
+def _fetch_page(ids, offset: int, limit: int) -> tuple:
+    """(本页记录或 {"upload_id", "error": "not_found"}, 总数)。"""
+    if ids is None:
+        return STORE.list_page(offset, limit)
+    page_ids = ids[offset:offset + limit]
+    items = STORE.get_many(page_ids)
+    return [it if it is not None else {"upload_id": u, "error": "not_found"} for u, it in zip(page_ids, items)], len(ids)
+
+@app.route("/api/uploads", methods=["POST"])
+def api_bulk_upload():
+    """
+    批量上传：multipart 字段 paper（多个文件）和/或 archive（zip）。每篇单独入库、排队评估，返回 upload_id 列表。
+    评估队列满时其余文件标记为 queue_full（未保存），客户端稍后重提这些文件即可。
+    单篇超过 MAX_CONTENT_LENGTH、zip 成员损坏或读取出错只影响该篇（too_large / bad_zip / read_error），其余照常入库。
+    """
+    request.max_content_length = BULK_MAX_BYTES
+    if not request.files:
+        abort(400, "未发现文件字段 'paper' 或 'archive'")
+    maybe_cleanup()
+    use_cache = cache_enabled()
+    results, queue_full = [], False
+    for n, (name, stream, error) in enumerate(iter_bulk_files()):
+        filename = secure_filename(name) or f"essay{Path(name).suffix}"
+        if n >= BULK_MAX_FILES:
+            error = "too_many_files"
+        elif error is None and not allowed_file(filename):
+            error = "unsupported_type"
+        elif error is None and queue_full:
+            error = "queue_full"
+        if error is None:
+            try:
+                upload_id = register_upload(stream, filename, use_cache, app.config["MAX_CONTENT_LENGTH"])
+                results.append({"filename": filename, "upload_id": upload_id})
+                continue
+            except QueueFull:
+                queue_full, error = True, "queue_full"
+            except BlobTooLarge:
+                error = "too_large"
+            except _ZIP_READ_ERRORS:
+                error = "bad_zip"
+            except OSError:
+                error = "read_error"
+        results.append({"filename": filename, "error": error})
+    accepted = [r["upload_id"] for r in results if "upload_id" in r]
+    status = 202 if accepted else (429 if queue_full else 400)
+    resp = jsonify({"accepted": len(accepted), "rejected": len(results) - len(accepted), "upload_ids": accepted,
+                    "files": results, "queue": JOBS.stats()})
+    if queue_full:
+        resp.headers["Retry-After"] = "30"
+    return resp, status
+
+@app.route("/api/uploads/status", methods=["GET", "POST"])
+def api_bulk_status():
+    """
+    批量查询状态与最新反馈：ids（查询串或 POST JSON）缺省时按创建时间倒序列出全部。
+    ?page=&per_page= 分页；?rows=1 附带 json_to_rows_fixed 表格行；?stats=1 附带本地文本统计（评估未完成也有）；
+    ?format=ndjson 时逐行流式输出（不带 page 则输出全部匹配记录，逐页读取，不会一次性载入内存）。
+    """
+    ids = _requested_ids()
+    page, per_page = _page_args()
+    with_rows = request.args.get("rows") == "1"
+    with_stats = request.args.get("stats") == "1"
+
+    def records(items):
+        recs = [it if "error" in it else upload_record(it, with_rows) for it in items]
+        if with_stats:
+            attach_text_stats(items, recs)
+        return recs
+
+    if request.args.get("format") == "ndjson":
+        single_page = "page" in request.args
+
+        def lines():
+            offset = (page - 1) * per_page
+            while True:
+                items, total = _fetch_page(ids, offset, per_page)
+                for rec in records(items):
+                    yield json.dumps(rec, ensure_ascii=False) + "\n"
+                offset += per_page
+                if single_page or not items or offset >= total:
+                    return
+
+        return Response(stream_with_context(lines()), mimetype="application/x-ndjson")
+
+    items, total = _fetch_page(ids, (page - 1) * per_page, per_page)
+    pages = (total + per_page - 1) // per_page
+    return jsonify({
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "pages": pages,
+        "next_page": page + 1 if page < pages else None,
+        "uploads": records(items),
+    })
+
 if __name__ == "__main__":
+    logging.basicConfig(format="%(message)s")  # metrics 的结构化日志（每个请求 / 评估任务一行 JSON）
     app.run(debug=True)
@@ -0,0 +1,106 @@
+# prompts.py —— prompt 组装：固定前缀（system：角色 + 要求 + JSON schema，逐字节稳定）+ 可变后缀（user：稿件及其本地统计 / 改动段落）
+# 服务端 prompt caching 只对完全相同的前缀生效：前缀里不能出现任何随稿件变化的内容；改动模板文字时必须升 id 里的版本号。
+import hashlib
+from dataclasses import dataclass
+
+DIMENSION_FOCUS = {
+    "Grammar": "sentence-level accuracy: articles, tense consistency, agreement, run-ons and fragments, punctuation",
+    "Vocabulary": "word choice: precision, range, register, collocations, repetition",
+    "Organization": "paragraphing, topic sentences, sequencing of ideas, cohesive devices, introduction and conclusion",
+    "Reasoning": "clarity of the position, quality of evidence and examples, logical links between claims and support, counter-arguments",
+}
+
+@dataclass(frozen=True, slots=True)
+class PromptTemplate:
+    id: str             # "<名称>.v<版本>"；同时作为请求的 prompt_cache_key
+    instructions: str   # 固定前缀（system 消息）
+
+    @property
+    def fingerprint(self) -> str:
+        """id + 前缀的指纹（反馈缓存命名空间用）。"""
+        return hashlib.sha256(f"{self.id}\0{self.instructions}".encode("utf-8")).hexdigest()[:16]
+
+    def messages(self, suffix: str) -> list:
+        return [{"role": "system", "content": self.instructions}, {"role": "user", "content": suffix}]
+
+_ROLE = (
+    "You are a senior professor of English composition: meticulous, fair and encouraging. "
+    "Respond in English using only JSON, following the instructions below.\n\n"
+)
+
+_SECTION_SHAPE = '{"summary": string, "issues": [string], "revision_tips": [string]}'
+
+_FEEDBACK_SCHEMA = (
+    "Return ONLY a valid JSON object with this exact shape:\n"
+    "{\n"
+    '  "summary": string,\n'
+    '  "feedback": {\n'
+    + "".join(f'    "{dim}": {_SECTION_SHAPE}{"," if i < len(DIMENSION_FOCUS) - 1 else ""}\n'
+              for i, dim in enumerate(DIMENSION_FOCUS)) +
+    "  }\n"
+    "}\n"
+    "No prose or explanation outside JSON."
+)
+
+# 固定四维并强制 Reasoning；不允许输出 JSON 之外的任何文本
+FEEDBACK = PromptTemplate("feedback.v3", (
+    _ROLE +
+    "Provide constructive, actionable feedback for the student's IELTS-style essay across exactly four aspects:\n"
+    "1) Grammar, 2) Vocabulary, 3) Organization, 4) Reasoning.\n"
+    "- For each aspect, write:\n"
+    "  • Summary (2–4 sentences)\n"
+    "  • 3–6 Specific issues (quote short snippets if helpful)\n"
+    "  • Revision tips (bullet list, concrete)\n"
+    "- Be precise, avoid generic advice. Focus on patterns, not isolated typos.\n"
+    "- Keep a professional, encouraging tone. Do NOT rewrite the whole essay.\n\n"
+    f"{_FEEDBACK_SCHEMA}\n\n"
+    "The user message may start with <stats> tags holding measurements computed locally from the same text "
+    "(word and distinct-word counts, type-token ratios, sentence and paragraph lengths, repeated phrases, most "
+    "frequent content words). They are exact: use them as evidence for Vocabulary, Grammar and Organization "
+    "instead of estimating, but do not simply restate them.\n"
+    "The student essay (cleaned text) follows in the user message between <essay> tags."
+))
+
+# fanout：单一维度的精简 prompt；输出只含该维度的对象
+DIMENSIONS = {
+    dim: PromptTemplate(f"dimension-{dim.lower()}.v2", (
+        _ROLE +
+        f"Provide constructive, actionable feedback on ONE aspect of the student's IELTS-style essay: {dim} ({focus}).\n"
+        "- Write a Summary (2–4 sentences), 3–6 Specific issues (quote short snippets if helpful) "
+        "and concrete Revision tips.\n"
+        "- Be precise, avoid generic advice. Focus on patterns, not isolated typos.\n"
+        "- Keep a professional, encouraging tone. Do NOT rewrite the whole essay.\n\n"
+        "Return ONLY a valid JSON object with this exact shape:\n"
+        f"{_SECTION_SHAPE}\n"
+        "No prose or explanation outside JSON.\n\n"
+        "The student essay (cleaned text) follows in the user message between <essay> tags."
+    ))
+    for dim, focus in DIMENSION_FOCUS.items()
+}
+
+# 修改稿：只评价改动段落，并标出上一轮哪些 issues 已解决（上一轮 issues 属于可变后缀）
+REVISION = PromptTemplate("revision.v2", (
+    _ROLE +
+    "You are reviewing a REVISED draft of a student's IELTS-style essay.\n"
+    "Only the paragraphs marked [CHANGED] were edited since the last round; [CONTEXT] paragraphs are unchanged "
+    "and shown for reference only — do not comment on them.\n"
+    "Give feedback ONLY on the changed paragraphs across the four aspects Grammar, Vocabulary, Organization, "
+    "Reasoning (0–4 specific issues each; leave a list empty if nothing new applies), and list which of the "
+    "previous round's issues are now fixed by the edits.\n\n"
+    "Return ONLY a valid JSON object with this exact shape:\n"
+    "{\n"
+    '  "summary": string,\n'
+    '  "feedback": {\n'
+    + "".join(f'    "{dim}": {_SECTION_SHAPE},\n' for dim in DIMENSION_FOCUS) +
+    "  },\n"
+    '  "resolved": {' + ", ".join(f'"{dim}": [int]' for dim in DIMENSION_FOCUS) + "}\n"
+    "}\n"
+    "No prose or explanation outside JSON.\n\n"
+    "The user message lists the previous round's issues (numbered per aspect), then the revised paragraphs "
+    "between <essay> tags."
+))
+
+def essay_block(text: str, stats: str = None) -> str:
+    """可变后缀：稿件本身，前面可带一行本地统计（textstats.prompt_line）。"""
+    block = f"<essay>\n{text}\n</essay>"
+    return f"<stats>{stats}</stats>\n\n{block}" if stats else block
@@ -0,0 +1,120 @@
+# revision.py —— 修改稿增量评估：与上一轮清洗文本按段落 diff → 只把改动段落（+相邻上下文）发给模型 → 与上一轮反馈合并
+import re
+from difflib import SequenceMatcher
+
+from evaluate import (build_prompt, call_model, ensure_json, normalize_reasoning, needs_chunking, evaluate_text,
+                      chunk_texts)
+from prompts import DIMENSION_FOCUS, FEEDBACK, REVISION, essay_block
+from chunking import estimate_tokens, dedupe_near, MERGED_MAX_ITEMS
+
+# =============== 配置区（这里改） ===============
+CONTEXT_PARAS     = 1       # 每处改动前后各附带几个未改动段落作为上下文（只读，不评价）
+FULL_REEVAL_RATIO = 0.6     # 增量 prompt 的估算 tokens 超过全文 prompt 的该比例时，直接全文重评
+# ==============================================
+
+_QUOTED = re.compile(r"[\"“‘]([^\"”’]{8,})[\"”’]")
+
+def paragraphs(clean_text: str) -> list:
+    """清洗后的文本以 "\n\n" 分段（与 chunking 的段落边界一致）。"""
+    return [p for p in clean_text.split("\n\n") if p.strip()]
+
+def diff_paragraphs(old_paras: list, new_paras: list) -> dict:
+    """
+    段落级 diff：{"changed": [新稿中改动/新增段落下标], "removed": [被删除的旧段落], "unchanged": int}。
+    段落原文完全相同才算未改动（空白已在清洗阶段规范化）。
+    """
+    changed, removed, unchanged = [], [], 0
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_paras, new_paras, autojunk=False).get_opcodes():
+        if tag == "equal":
+            unchanged += i2 - i1
+            continue
+        changed.extend(range(j1, j2))
+        if tag in ("replace", "delete"):
+            removed.extend(old_paras[i1:i2])
+    return {"changed": changed, "removed": removed, "unchanged": unchanged}
+
+def _excerpt(new_paras: list, changed: list) -> str:
+    """改动段落标 [CHANGED ¶n]，相邻 CONTEXT_PARAS 段标 [CONTEXT ¶n]；不连续处用 […] 隔开。"""
+    changed_set = set(changed)
+    keep = sorted({k for i in changed for k in range(max(0, i - CONTEXT_PARAS), min(len(new_paras), i + CONTEXT_PARAS + 1))})
+    parts, prev = [], None
+    for i in keep:
+        if prev is not None and i != prev + 1:
+            parts.append("[…]")
+        tag = "CHANGED" if i in changed_set else "CONTEXT"
+        parts.append(f"[{tag} ¶{i + 1}]\n{new_paras[i]}")
+        prev = i
+    return "\n\n".join(parts)
+
+def build_revision_prompt(excerpt: str, prior: dict) -> str:
+    """
+    可变后缀：上一轮的 issues（编号，让模型标出哪些已被本次修改解决）+ 改动段落；
+    "只评价改动段落"的要求与 schema 在 prompts.REVISION 的固定前缀里。
+    """
+    prior_issues = {
+        dim: (prior.get("feedback", {}).get(dim) or {}).get("issues") or [] for dim in DIMENSION_FOCUS
+    }
+    numbered = "\n".join(
+        f"{dim}:\n" + "\n".join(f"  {k}. {issue}" for k, issue in enumerate(issues)) for dim, issues in prior_issues.items()
+        if issues
+    ) or "(none)"
+    return f"Previous round's issues (numbered per aspect):\n{numbered}\n\nRevised paragraphs:\n{essay_block(excerpt)}"
+
+def _stale(issue: str, new_text: str) -> bool:
+    """引用了原文片段、且这些片段在新稿中都已不存在的旧意见视为过期（不花模型调用就能判断）。"""
+    quotes = _QUOTED.findall(issue)
+    return bool(quotes) and not any(q in new_text for q in quotes)
+
+def _resolved_indices(raw: dict, dim: str) -> set:
+    items = (raw.get("resolved") or {}).get(dim) if isinstance(raw.get("resolved"), dict) else None
+    return {i for i in items or [] if isinstance(i, int)}
+
+def merge_revision(prior: dict, delta: dict, resolved: dict, new_text: str) -> dict:
+    """新意见在前、未解决的旧意见在后（近似去重、每维度上限 MERGED_MAX_ITEMS）；summary 以本轮为准，缺省沿用上一轮。"""
+    prior = normalize_reasoning(prior)
+    merged = {"summary": delta.get("summary") or prior["summary"], "feedback": {}}
+    for dim, old in prior["feedback"].items():
+        new = delta.get("feedback", {}).get(dim) or {"summary": "", "issues": [], "revision_tips": []}
+        gone = resolved.get(dim, set())
+        kept = [x for k, x in enumerate(old["issues"]) if k not in gone and not _stale(x, new_text)]
+        merged["feedback"][dim] = {
+            "summary": new["summary"] or old["summary"],
+            "issues": dedupe_near(new["issues"] + kept, MERGED_MAX_ITEMS),
+            "revision_tips": dedupe_near(new["revision_tips"] + old["revision_tips"], MERGED_MAX_ITEMS),
+        }
+    return normalize_reasoning(merged)
+
+def evaluate_revision(old_text: str, new_text: str, prior: dict, client) -> tuple:
+    """
+    修改稿评估，返回 (feedback, stats)。
+    - 段落完全未变：沿用上一轮反馈（剔除引用片段已被删掉的意见），不调用模型；
+    - 有改动：只发送改动段落 + 上下文 + 上一轮 issues，结果与上一轮合并；
+    - 改动过大（增量 prompt ≥ FULL_REEVAL_RATIO × 全文 prompt）或上一轮结果不可用：全文重评。
+    stats：paragraphs / changed / removed / unchanged / mode / model_calls / prompt_tokens / full_prompt_tokens / tokens_saved。
+    """
+    new_paras = paragraphs(new_text)
+    diff = diff_paragraphs(paragraphs(old_text), new_paras)
+    full_tokens = estimate_tokens(FEEDBACK.instructions) + estimate_tokens(build_prompt(new_text))
+    stats = {"paragraphs": len(new_paras), "changed": len(diff["changed"]), "removed": len(diff["removed"]),
+             "unchanged": diff["unchanged"], "full_prompt_tokens": full_tokens}
+
+    def done(data, mode, calls, sent):
+        stats.update(mode=mode, model_calls=calls, prompt_tokens=sent, tokens_saved=max(0, full_tokens - sent))
+        return data, stats
+
+    usable = isinstance(prior, dict) and prior.get("feedback") and "raw" not in prior
+    if usable and not diff["changed"]:
+        return done(merge_revision(prior, {}, {}, new_text), "unchanged", 0, 0)
+
+    prompt = build_revision_prompt(_excerpt(new_paras, diff["changed"]), prior or {}) if usable else ""
+    sent = estimate_tokens(REVISION.instructions) + estimate_tokens(prompt)
+    if not usable or sent >= FULL_REEVAL_RATIO * full_tokens or needs_chunking(prompt):
+        data = evaluate_text(new_text, client, mode="single")
+        return done(data, "full", len(chunk_texts(new_text)) if needs_chunking(new_text) else 1, full_tokens)
+
+    raw = ensure_json(call_model(client, prompt, template=REVISION))
+    if "raw" in raw:  # 增量结果解析失败：不合并，保留上一轮反馈并原样带上 raw 以便排查
+        return done({**merge_revision(prior, {}, {}, new_text), "raw": raw["raw"]}, "incremental", 1, sent)
+    resolved = {dim: _resolved_indices(raw, dim) for dim in DIMENSION_FOCUS}
+    raw.pop("resolved", None)
+    return done(merge_revision(prior, normalize_reasoning(raw), resolved, new_text), "incremental", 1, sent)
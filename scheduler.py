@@ -0,0 +1,183 @@
+# scheduler.py —— 模型请求调度：RPM/TPM 预算 + 429 退避重试（遵守 retry-after）+ 排队/等待指标
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+from chunking import estimate_tokens
+
+# =============== 配置区（这里改，按账号 tier 的限额填写） ===============
+RPM_LIMIT    = 500          # 每分钟请求数
+TPM_LIMIT    = 500_000      # 每分钟 tokens（估算的输入 tokens + max_output_tokens）
+MAX_RETRIES  = 6            # 瞬时错误（429 限流 / 超时 / 连接 / 5xx）的最大重试次数
+BACKOFF_BASE = 1.0          # 指数退避基数（秒），带 full jitter
+BACKOFF_CAP  = 60.0         # 单次退避上限（秒）
+# ====================================================================
+
+WINDOW_S = 60.0
+
+def error_code(e: Exception):
+    """取 OpenAI 错误码（兼容 body 为 {"error": {...}} 或直接为错误对象两种形态）。"""
+    code = getattr(e, "code", None)
+    if code:
+        return code
+    body = getattr(e, "body", None)
+    if isinstance(body, dict):
+        inner = body.get("error")
+        return (inner if isinstance(inner, dict) else body).get("code")
+    return None
+
+def _openai():
+    """openai 由调用方创建 client 时导入；尚未导入说明异常不可能来自它（本模块因此不必在启动时导入 openai）。"""
+    return sys.modules.get("openai")
+
+def is_rate_limit(e: Exception) -> bool:
+    openai = _openai()
+    return openai is not None and isinstance(e, openai.RateLimitError)
+
+def is_transient(e: Exception) -> bool:
+    """可重试：普通 429、超时、连接错误、5xx；insufficient_quota 等永久性错误不重试。"""
+    openai = _openai()
+    if openai is None:
+        return False
+    if isinstance(e, openai.RateLimitError):
+        return error_code(e) != "insufficient_quota"
+    if isinstance(e, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code in (408, 409) or e.status_code >= 500
+    return False
+
+def retry_after_seconds(e: Exception):
+    """解析 retry-after-ms / retry-after（秒）响应头；没有则返回 None。"""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return max(0.0, float(value) * scale)
+            except ValueError:
+                continue
+    return None
+
+def request_tokens(kwargs: dict) -> int:
+    """按 build_prompt 等生成的输入文本估算 tokens，再加上 max_output_tokens（与服务端 TPM 计法一致）。"""
+    text = kwargs.get("input")
+    if isinstance(text, list):
+        text = "".join(str(m.get("content", "")) for m in text if isinstance(m, dict))
+    return estimate_tokens(text or "") + int(kwargs.get("max_output_tokens") or 0)
+
+class RateLimiter:
+    """60 秒滑动窗口的 RPM/TPM 预算；429 的 retry-after 会让所有请求一起暂停。"""
+    def __init__(self, rpm: int = RPM_LIMIT, tpm: int = TPM_LIMIT):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._window = deque()          # (时间戳, tokens)
+        self._tokens = 0
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+
+    def _expire(self, now: float):
+        while self._window and now - self._window[0][0] >= WINDOW_S:
+            self._tokens -= self._window.popleft()[1]
+
+    def acquire(self, tokens: int) -> float:
+        """阻塞直到预算允许；返回等待的秒数。单个请求超过 TPM 时在窗口清空后放行。"""
+        t0 = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    over_rpm = len(self._window) >= self.rpm
+                    over_tpm = self._window and self._tokens + tokens > self.tpm
+                    if not over_rpm and not over_tpm:
+                        self._window.append((now, tokens))
+                        self._tokens += tokens
+                        return now - t0
+                    wait = self._window[0][0] + WINDOW_S - now
+                self._cond.wait(max(wait, 0.001))
+
+    def pause(self, seconds: float):
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+class _ScheduledResponses:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, **kwargs):
+        return self._owner._call(kwargs)
+
+class ScheduledClient:
+    """
+    包在 OpenAI client 外面、接口不变（responses.create）：
+    - 发请求前按 RPM/TPM 预算排队；
+    - 瞬时错误按 jitter 指数退避重试，优先遵守 retry-after；insufficient_quota 等永久错误直接抛出；
+    - stats() 给出排队深度、在途数、等待时间与重试/限流计数。
+    建议底层 client 设 max_retries=0，由这里统一重试。
+    """
+    def __init__(self, client, rpm: int = RPM_LIMIT, tpm: int = TPM_LIMIT, max_retries: int = MAX_RETRIES,
+                 backoff_base: float = BACKOFF_BASE, backoff_cap: float = BACKOFF_CAP):
+        self.client = client
+        self.limiter = RateLimiter(rpm, tpm)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.responses = _ScheduledResponses(self)
+        self._lock = threading.Lock()
+        self._m = {"queued": 0, "in_flight": 0, "requests": 0, "retries": 0, "rate_limited": 0,
+                   "failed": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+    def _bump(self, **delta):
+        with self._lock:
+            for k, v in delta.items():
+                self._m[k] += v
+
+    def _record_wait(self, seconds: float):
+        with self._lock:
+            self._m["wait_seconds_total"] += seconds
+            self._m["wait_seconds_max"] = max(self._m["wait_seconds_max"], seconds)
+
+    def _call(self, kwargs: dict):
+        tokens = request_tokens(kwargs)
+        attempt = 0
+        while True:
+            self._bump(queued=1)
+            try:
+                waited = self.limiter.acquire(tokens)
+            finally:
+                self._bump(queued=-1)
+            self._record_wait(waited)
+            self._bump(in_flight=1, requests=1)
+            try:
+                return self.client.responses.create(**kwargs)
+            except Exception as e:
+                if is_rate_limit(e):
+                    self._bump(rate_limited=1)
+                if not is_transient(e) or attempt >= self.max_retries:
+                    self._bump(failed=1)
+                    raise
+                delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                hinted = retry_after_seconds(e)
+                if hinted is not None:
+                    delay = max(delay, hinted)
+                    self.limiter.pause(hinted)
+                attempt += 1
+                self._bump(retries=1)
+                self._record_wait(delay)
+                time.sleep(delay)
+            finally:
+                self._bump(in_flight=-1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            m = dict(self._m)
+        m["avg_wait_seconds"] = m["wait_seconds_total"] / m["requests"] if m["requests"] else 0.0
+        return m
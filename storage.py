@@ -0,0 +1,266 @@
+# storage.py —— 上传记录与多轮反馈的持久化存储（替代进程内 STORE 字典；多进程/多 worker 共享）
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# =============== 配置区（这里改） ===============
+POOL_SIZE      = 8            # 连接池大小
+BUSY_TIMEOUT_S = 30           # 多进程写冲突时的等待秒数
+# ==============================================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    upload_id      TEXT PRIMARY KEY,
+    filename       TEXT NOT NULL,
+    saved_path     TEXT NOT NULL,
+    feedback_count INTEGER NOT NULL DEFAULT 0,
+    from_cache     INTEGER NOT NULL DEFAULT 0,
+    job_id         TEXT,
+    job_status     TEXT,
+    job_error      TEXT,
+    content_hash   TEXT,
+    created_at     REAL NOT NULL,
+    updated_at     REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_uploads_updated ON uploads(updated_at);
+CREATE INDEX IF NOT EXISTS idx_uploads_created ON uploads(created_at);
+CREATE TABLE IF NOT EXISTS feedback_rounds (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    upload_id  TEXT NOT NULL REFERENCES uploads(upload_id) ON DELETE CASCADE,
+    round      INTEGER NOT NULL,
+    source     TEXT NOT NULL,
+    data       TEXT NOT NULL,
+    essay_text TEXT,
+    stats      TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_rounds_upload ON feedback_rounds(upload_id, round);
+"""
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_uploads_hash ON uploads(content_hash);
+CREATE INDEX IF NOT EXISTS idx_uploads_path ON uploads(saved_path);
+"""
+
+_IN_BATCH = 500               # IN (...) 每批的参数个数（低于 SQLite 变量上限）
+
+_UPLOAD_FIELDS = ("filename", "saved_path", "feedback_count", "from_cache", "job_id", "job_status", "job_error",
+                  "content_hash")
+_ADDED_COLUMNS = {                                          # 旧库缺的列在启动时补上
+    "uploads": {"content_hash": "TEXT"},
+    "feedback_rounds": {"essay_text": "TEXT", "stats": "TEXT"},
+}
+
+class UploadStore:
+    """
+    存储后端接口。get() 返回的记录：
+    { "upload_id", "filename", "saved_path", "feedback_count", "from_cache", "job_id", "job_status",
+      "job_error", "content_hash", "created_at", "updated_at", "latest": dict|None（最新一轮反馈 JSON）,
+      "latest_stats": dict|None（最新一轮的统计，如修改稿增量评估节省的 tokens） }
+    """
+    def create(self, upload_id: str, filename: str, saved_path: str, **fields): raise NotImplementedError
+    def get(self, upload_id: str): raise NotImplementedError
+    def get_many(self, upload_ids: list) -> list: raise NotImplementedError
+    def list_page(self, offset: int, limit: int) -> tuple: raise NotImplementedError
+    def update(self, upload_id: str, **fields): raise NotImplementedError
+    def increment_feedback_count(self, upload_id: str) -> int: raise NotImplementedError
+    def add_round(self, upload_id: str, data: dict, source: str, essay_text: str = None,
+                  stats: dict = None) -> int: raise NotImplementedError
+    def latest_round(self, upload_id: str): raise NotImplementedError
+    def rounds(self, upload_id: str) -> list: raise NotImplementedError
+    def delete(self, upload_id: str): raise NotImplementedError
+    def path_in_use(self, saved_path: str) -> bool: raise NotImplementedError
+    def count_by_hash(self, content_hash: str) -> int: raise NotImplementedError
+    def cleanup(self, ttl_seconds: float) -> list: raise NotImplementedError
+
+class SQLiteUploadStore(UploadStore):
+    """SQLite（WAL）实现：连接池复用连接，upload_id 主键 + 索引；每轮反馈单独成行。"""
+    def __init__(self, path, pool_size: int = POOL_SIZE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._pool_size = pool_size
+        self._lock = threading.Lock()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+            for table, columns in _ADDED_COLUMNS.items():
+                have = {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}
+                for name, decl in columns.items():
+                    if name not in have:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+            conn.executescript(_INDEXES)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT_S, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def _conn(self):
+        """借出一个连接；池未满时按需新建，满了则等待归还。"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._created < self._pool_size
+                if grow:
+                    self._created += 1
+            conn = self._connect() if grow else self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def _tx(self):
+        with self._conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def create(self, upload_id: str, filename: str, saved_path: str, **fields):
+        now = time.time()
+        cols = {k: fields[k] for k in _UPLOAD_FIELDS if k in fields}
+        names = ", ".join(["upload_id", "filename", "saved_path", "created_at", "updated_at", *cols])
+        marks = ", ".join("?" * (5 + len(cols)))
+        with self._tx() as conn:
+            conn.execute(f"INSERT INTO uploads({names}) VALUES ({marks})",
+                         (upload_id, filename, saved_path, now, now, *cols.values()))
+
+    @staticmethod
+    def _item(row, latest) -> dict:
+        item = dict(row)
+        item["from_cache"] = bool(item["from_cache"])
+        item["latest"] = json.loads(latest["data"]) if latest else None
+        item["latest_stats"] = json.loads(latest["stats"]) if latest and latest["stats"] else None
+        return item
+
+    def get(self, upload_id: str):
+        with self._conn() as conn:
+            row = conn.execute("SELECT * FROM uploads WHERE upload_id = ?", (upload_id,)).fetchone()
+            if row is None:
+                return None
+            latest = conn.execute(
+                "SELECT data, stats FROM feedback_rounds WHERE upload_id = ? ORDER BY round DESC LIMIT 1", (upload_id,)
+            ).fetchone()
+        return self._item(row, latest)
+
+    def _get_many(self, conn, upload_ids: list) -> dict:
+        """一批 upload_id → {upload_id: 记录}；每 _IN_BATCH 个 id 两条查询（上传 + 各自最新一轮）。"""
+        items = {}
+        for i in range(0, len(upload_ids), _IN_BATCH):
+            ids = upload_ids[i:i + _IN_BATCH]
+            marks = ", ".join("?" * len(ids))
+            rows = conn.execute(f"SELECT * FROM uploads WHERE upload_id IN ({marks})", ids).fetchall()
+            latest = {r["upload_id"]: r for r in conn.execute(
+                f"SELECT r.upload_id, r.data, r.stats FROM feedback_rounds r JOIN ("
+                f"  SELECT upload_id, MAX(round) AS round FROM feedback_rounds WHERE upload_id IN ({marks})"
+                f"  GROUP BY upload_id) m ON r.upload_id = m.upload_id AND r.round = m.round", ids)}
+            for row in rows:
+                items[row["upload_id"]] = self._item(row, latest.get(row["upload_id"]))
+        return items
+
+    def get_many(self, upload_ids: list) -> list:
+        """按给定顺序返回记录；不存在的 id 对应 None。"""
+        upload_ids = list(upload_ids)
+        with self._conn() as conn:
+            items = self._get_many(conn, list(dict.fromkeys(upload_ids)))
+        return [items.get(u) for u in upload_ids]
+
+    def list_page(self, offset: int, limit: int) -> tuple:
+        """按创建时间倒序分页：返回 (本页记录, 总数)。"""
+        with self._conn() as conn:
+            total = conn.execute("SELECT COUNT(*) AS n FROM uploads").fetchone()["n"]
+            ids = [r["upload_id"] for r in conn.execute(
+                "SELECT upload_id FROM uploads ORDER BY created_at DESC, upload_id LIMIT ? OFFSET ?", (limit, offset))]
+            items = self._get_many(conn, ids)
+        return [items[u] for u in ids if u in items], total
+
+    def update(self, upload_id: str, **fields):
+        cols = {k: fields[k] for k in _UPLOAD_FIELDS if k in fields}
+        if not cols:
+            return
+        assigns = ", ".join(f"{k} = ?" for k in cols)
+        with self._tx() as conn:
+            conn.execute(f"UPDATE uploads SET {assigns}, updated_at = ? WHERE upload_id = ?",
+                         (*cols.values(), time.time(), upload_id))
+
+    def increment_feedback_count(self, upload_id: str) -> int:
+        with self._tx() as conn:
+            conn.execute("UPDATE uploads SET feedback_count = feedback_count + 1, updated_at = ? WHERE upload_id = ?",
+                         (time.time(), upload_id))
+            row = conn.execute("SELECT feedback_count FROM uploads WHERE upload_id = ?", (upload_id,)).fetchone()
+        return row["feedback_count"] if row else 0
+
+    def add_round(self, upload_id: str, data: dict, source: str, essay_text: str = None, stats: dict = None) -> int:
+        """
+        追加一轮反馈（source: job / cache / upload_txt / revision …），并把 feedback_count 至少置为 1；返回轮次号。
+        essay_text：本轮评估所用的清洗文本（下一轮修改稿据此做段落 diff）；stats：本轮统计（JSON）。
+        """
+        now = time.time()
+        with self._tx() as conn:
+            row = conn.execute("SELECT COALESCE(MAX(round), 0) AS n FROM feedback_rounds WHERE upload_id = ?",
+                               (upload_id,)).fetchone()
+            round_no = row["n"] + 1
+            conn.execute(
+                "INSERT INTO feedback_rounds(upload_id, round, source, data, essay_text, stats, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (upload_id, round_no, source, json.dumps(data, ensure_ascii=False), essay_text,
+                 json.dumps(stats, ensure_ascii=False) if stats is not None else None, now))
+            conn.execute("UPDATE uploads SET feedback_count = MAX(feedback_count, 1), updated_at = ? WHERE upload_id = ?",
+                         (now, upload_id))
+        return round_no
+
+    def rounds(self, upload_id: str) -> list:
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT round, source, data, stats, created_at FROM feedback_rounds WHERE upload_id = ? ORDER BY round",
+                (upload_id,),
+            ).fetchall()
+        return [{"round": r["round"], "source": r["source"], "created_at": r["created_at"],
+                 "data": json.loads(r["data"]), "stats": json.loads(r["stats"]) if r["stats"] else None}
+                for r in rows]
+
+    def latest_round(self, upload_id: str):
+        """最新一轮（含 essay_text），没有则 None。"""
+        with self._conn() as conn:
+            r = conn.execute(
+                "SELECT round, source, data, essay_text FROM feedback_rounds WHERE upload_id = ? "
+                "ORDER BY round DESC LIMIT 1", (upload_id,),
+            ).fetchone()
+        if r is None:
+            return None
+        return {"round": r["round"], "source": r["source"], "data": json.loads(r["data"]), "essay_text": r["essay_text"]}
+
+    def delete(self, upload_id: str):
+        with self._tx() as conn:
+            conn.execute("DELETE FROM uploads WHERE upload_id = ?", (upload_id,))
+
+    def path_in_use(self, saved_path: str) -> bool:
+        with self._conn() as conn:
+            return conn.execute("SELECT 1 FROM uploads WHERE saved_path = ? LIMIT 1", (saved_path,)).fetchone() is not None
+
+    def count_by_hash(self, content_hash: str) -> int:
+        """同一内容被上传过几次（重复提交检测）。"""
+        with self._conn() as conn:
+            return conn.execute("SELECT COUNT(*) AS n FROM uploads WHERE content_hash = ?", (content_hash,)).fetchone()["n"]
+
+    def cleanup(self, ttl_seconds: float) -> list:
+        """删除 updated_at 早于 TTL 的上传及其全部反馈轮次；返回被删除的 upload_id（目录由调用方清理）。"""
+        cutoff = time.time() - ttl_seconds
+        with self._tx() as conn:
+            ids = [r["upload_id"] for r in conn.execute(
+                "SELECT upload_id FROM uploads WHERE updated_at < ?", (cutoff,)).fetchall()]
+            conn.executemany("DELETE FROM uploads WHERE upload_id = ?", [(i,) for i in ids])
+        return ids
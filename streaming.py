@@ -0,0 +1,81 @@
+# streaming.py —— 进程内事件通道：后台任务发布流式反馈事件，SSE 路由订阅（可回放，晚到的订阅者不丢事件）
+import json
+import threading
+from collections import OrderedDict
+
+# =============== 配置区（这里改） ===============
+KEEP_CLOSED = 256      # 保留的已结束通道数（供晚到的订阅者回放）
+KEEPALIVE_S = 15       # 订阅者无新事件时发送心跳的间隔
+# ==============================================
+
+def sse(event: str, data) -> str:
+    """格式化为一条 server-sent event。"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class _Channel:
+    __slots__ = ("events", "closed", "cond")
+
+    def __init__(self):
+        self.events = []
+        self.closed = False
+        self.cond = threading.Condition()
+
+class StreamHub:
+    """
+    以 key（upload_id）区分的事件通道：
+    open → publish… → close；subscribe 从第一条事件开始回放，通道关闭后结束迭代。
+    """
+    def __init__(self, keep_closed: int = KEEP_CLOSED):
+        self.keep_closed = keep_closed
+        self._channels = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, key: str):
+        with self._lock:
+            self._channels[key] = _Channel()
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            return key in self._channels
+
+    def publish(self, key: str, event: str, data):
+        with self._lock:
+            ch = self._channels.get(key)
+        if ch is None:
+            return
+        with ch.cond:
+            ch.events.append((event, data))
+            ch.cond.notify_all()
+
+    def close(self, key: str):
+        with self._lock:
+            ch = self._channels.get(key)
+            closed = [k for k, c in self._channels.items() if c.closed]
+            for k in closed[: max(0, len(closed) - self.keep_closed + 1)]:
+                del self._channels[k]
+        if ch is None:
+            return
+        with ch.cond:
+            ch.closed = True
+            ch.cond.notify_all()
+
+    def subscribe(self, key: str, keepalive: float = KEEPALIVE_S):
+        """产出 (event, data)；长时间无事件时产出 (None, None) 作为心跳。"""
+        with self._lock:
+            ch = self._channels.get(key)
+        if ch is None:
+            return
+        i = 0
+        while True:
+            with ch.cond:
+                if i >= len(ch.events) and not ch.closed:
+                    ch.cond.wait(keepalive)
+                pending = ch.events[i:]
+                closed = ch.closed
+            i += len(pending)
+            if pending:
+                yield from pending
+            elif closed:
+                return
+            else:
+                yield None, None
@@ -0,0 +1,217 @@
+# textstats.py —— 本地文本统计（确定性、不走网络、毫秒级）：词汇多样性、句长分布、重复短语、段落结构
+# 在清洗后的文本上计算；结果随反馈 JSON 一起保存（"text_stats"），并以一行紧凑文本放进 prompt 的可变后缀（prompt_line）。
+# analyze_many 一次处理一批稿件：分词后映射为整数 id、整批拼成一个数组，用 NumPy 排序 / bincount 一次算完；
+# 未安装 NumPy（或 USE_NUMPY = False）时退回纯 Python 计数，结果逐项一致。
+import math
+import re
+from collections import Counter
+
+# =============== 配置区（这里改） ===============
+USE_NUMPY      = True     # NumPy 为可选依赖，缺失时自动走纯 Python
+MATTR_WINDOW   = 50       # 移动平均 TTR 的窗口词数（不随篇幅变化的词汇多样性）
+LONG_SENTENCE  = 35       # 句长 > 该词数计为长句
+SHORT_SENTENCE = 5        # 句长 < 该词数计为短句
+LONG_WORD      = 7        # 字符数 ≥ 该值计为长词
+NGRAM          = 3        # 重复短语的长度（词）
+MIN_REPEATS    = 2        # 同一短语出现 ≥ 该次数才算重复（只在句内取，纯虚词短语忽略）
+MIN_WORD_COUNT = 3        # 高频实词的出现次数下限
+TOP_K          = 5        # 重复短语 / 高频实词各保留的条数
+# ==============================================
+
+VERSION = "textstats.v1"  # 统计口径或 prompt_line 格式变化时升级（进入反馈缓存命名空间）
+
+STOPWORDS = frozenset("""
+a an the and or but nor so yet if then than that this these those there here of in on at to for from by with
+about as into onto over under between through during before after above below up down out off again further
+is are was were be been being am do does did doing have has had having will would shall should can could may
+might must not no it its it's they them their theirs he him his she her hers we us our ours you your yours i me
+my mine who whom whose which what when where why how all any both each few more most other some such only own
+same too very just also because while until against once what's there's don't doesn't can't won't isn't
+""".split())
+
+_WORD = re.compile(r"[^\W\d_]+(?:['’-][^\W\d_]+)*")
+_SENT_END = re.compile(r"[.!?]+[\"'”’)\]]*(?:\s+|$)")
+
+def _tokenize(text: str):
+    """清洗文本 → (句子列表[每句为小写词列表], 各段词数)；段落以 "\n\n" 分隔（与 evaluate.clean_stream 一致）。"""
+    sents, para_words = [], []
+    for para in (text or "").split("\n\n"):
+        n = 0
+        for piece in _SENT_END.split(para):
+            words = _WORD.findall(piece.lower())
+            if words:
+                sents.append(words)
+                n += len(words)
+        if n:
+            para_words.append(n)
+    return sents, para_words
+
+def _rank(sorted_values, q: float) -> int:
+    """最近秩分位数（两种实现共用，保证结果一致）。"""
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+def _summary(n_words, n_types, mattr_sum, mattr_windows, chars, long_words, sent_lens, para_words,
+             ngrams, top_words) -> dict:
+    """各实现算出的原始量 → 对外的统计字典（sent_lens 已升序；ngrams / top_words 为 [(文本, 次数)]）。"""
+    n_sents = len(sent_lens)
+    mean = n_words / n_sents if n_sents else 0.0
+    var = (sum(x * x for x in sent_lens) / n_sents - mean * mean) if n_sents else 0.0
+    top = lambda pairs: sorted(pairs, key=lambda p: (-p[1], p[0]))[:TOP_K]
+    return {
+        "words": int(n_words),
+        "types": int(n_types),
+        "ttr": round(n_types / n_words, 3) if n_words else 0.0,
+        "mattr": round(mattr_sum / mattr_windows, 3) if mattr_windows else 0.0,
+        "avg_word_len": round(chars / n_words, 2) if n_words else 0.0,
+        "long_word_ratio": round(long_words / n_words, 3) if n_words else 0.0,
+        "sentences": n_sents,
+        "sentence_len": {
+            "mean": round(mean, 1),
+            "sd": round(math.sqrt(max(0.0, var)), 1),
+            "p50": int(_rank(sent_lens, 0.5)) if n_sents else 0,
+            "p90": int(_rank(sent_lens, 0.9)) if n_sents else 0,
+            "max": int(sent_lens[-1]) if n_sents else 0,
+        },
+        "long_sentences": sum(1 for x in sent_lens if x > LONG_SENTENCE),
+        "short_sentences": sum(1 for x in sent_lens if x < SHORT_SENTENCE),
+        "paragraphs": len(para_words),
+        "paragraph_words": {
+            "min": min(para_words, default=0),
+            "mean": round(sum(para_words) / len(para_words), 1) if para_words else 0.0,
+            "max": max(para_words, default=0),
+        },
+        "repeated_ngrams": [{"ngram": t, "count": int(c)} for t, c in top(ngrams)],
+        "top_words": [{"word": w, "count": int(c)} for w, c in top(top_words)],
+    }
+
+def _analyze_py(sents: list, para_words: list) -> dict:
+    words = [w for s in sents for w in s]
+    n = len(words)
+    counts = Counter(words)
+    # MATTR：位置 i 的词在窗口 [s, s+W) 内首次出现 ⇔ 上一次出现 < s；按每个词能贡献的窗口数累加
+    w = min(MATTR_WINDOW, n)
+    last, mattr_sum = {}, 0
+    for i, word in enumerate(words):
+        lo, hi = max(last.get(word, -1) + 1, i - w + 1), min(i, n - w)
+        mattr_sum += max(0, hi - lo + 1)
+        last[word] = i
+    grams = Counter(" ".join(s[i:i + NGRAM]) for s in sents for i in range(len(s) - NGRAM + 1))
+    return _summary(
+        n, len(counts), mattr_sum, (n - w + 1) * w if n else 0,
+        sum(len(x) for x in words), sum(1 for x in words if len(x) >= LONG_WORD),
+        sorted(len(s) for s in sents), para_words,
+        [(g, c) for g, c in grams.items() if c >= MIN_REPEATS and not all(x in STOPWORDS for x in g.split(" "))],
+        [(x, c) for x, c in counts.items() if c >= MIN_WORD_COUNT and x not in STOPWORDS],
+    )
+
+def _analyze_np(np, docs: list) -> list:
+    """整批向量化：词 → id，(稿件, 词) 组合键排序去重得到词型 / 词频，bincount 按稿件汇总。"""
+    vocab, tok, sent_len, sent_doc = {}, [], [], []
+    for d, (sents, _) in enumerate(docs):
+        for s in sents:
+            tok.extend(vocab.setdefault(w, len(vocab)) for w in s)
+            sent_len.append(len(s))
+            sent_doc.append(d)
+    n_docs, V = len(docs), max(1, len(vocab))
+    words = list(vocab)
+    word_len = np.fromiter((len(w) for w in words), np.int64, len(words))
+    is_stop = np.fromiter((w in STOPWORDS for w in words), bool, len(words))
+    tok = np.asarray(tok, np.int64)
+    sent_len = np.asarray(sent_len, np.int64)
+    sent_doc = np.asarray(sent_doc, np.int64)
+    doc = np.repeat(sent_doc, sent_len)                              # 每个词所属稿件
+    sent = np.repeat(np.arange(len(sent_len)), sent_len)             # 每个词所属句子
+    n_words = np.bincount(doc, minlength=n_docs)
+    start = np.concatenate(([0], np.cumsum(n_words)[:-1]))
+    pos = np.arange(len(tok)) - start[doc]                           # 稿件内位置
+
+    # 词型 / 词频：(稿件, 词) 组合键；稳定排序后同一键内按出现顺序排列，顺带得到"上一次出现"的位置（MATTR 用）
+    key = doc * V + tok
+    order = np.argsort(key, kind="stable")
+    k = key[order]
+    first = np.ones(len(k), bool)
+    first[1:] = k[1:] != k[:-1]
+    n_types = np.bincount(doc[order][first], minlength=n_docs)
+    prev = np.full(len(tok), -1, np.int64)
+    repeat_at = np.flatnonzero(~first)
+    prev[order[repeat_at]] = pos[order[repeat_at - 1]]
+    w = np.minimum(MATTR_WINDOW, n_words)
+    lo = np.maximum(prev + 1, pos - w[doc] + 1)
+    hi = np.minimum(pos, n_words[doc] - w[doc])
+    mattr_sum = np.bincount(doc, weights=np.clip(hi - lo + 1, 0, None), minlength=n_docs)
+    mattr_windows = np.where(n_words > 0, (n_words - w + 1) * w, 0)
+    chars = np.bincount(doc, weights=word_len[tok], minlength=n_docs)
+    long_words = np.bincount(doc, weights=word_len[tok] >= LONG_WORD, minlength=n_docs)
+
+    uniq_at = np.flatnonzero(first)
+    freq = np.diff(np.append(uniq_at, len(k)))
+    uk = k[uniq_at]
+    keep = (freq >= MIN_WORD_COUNT) & ~is_stop[uk % V]
+    frequent = [[] for _ in range(n_docs)]
+    for kk, c in zip(uk[keep].tolist(), freq[keep].tolist()):
+        frequent[kk // V].append((words[kk % V], c))
+
+    # 重复短语：起点 i 与 i+NGRAM-1 在同一句内才算（同句必同稿）
+    repeated = [[] for _ in range(n_docs)]
+    if len(tok) >= NGRAM:
+        starts = np.flatnonzero(sent[:len(tok) - NGRAM + 1] == sent[NGRAM - 1:])
+        if len(starts):
+            cols = [doc[starts]] + [tok[starts + j] for j in range(NGRAM)]
+            rows = np.stack(cols, axis=1)[np.lexsort(cols[::-1])]        # 按 (稿件, 词1, 词2, …) 排序
+            head = np.ones(len(rows), bool)
+            head[1:] = (rows[1:] != rows[:-1]).any(axis=1)
+            at = np.flatnonzero(head)
+            counts = np.diff(np.append(at, len(rows)))
+            grams = rows[at]
+            keep = (counts >= MIN_REPEATS) & ~is_stop[grams[:, 1:]].all(axis=1)
+            for row, c in zip(grams[keep].tolist(), counts[keep].tolist()):
+                repeated[row[0]].append((" ".join(words[t] for t in row[1:]), c))
+
+    # 句长：按 (稿件, 句长) 排序后每篇是连续的一段
+    by_len = sent_len[np.lexsort((sent_len, sent_doc))]
+    n_sents = np.bincount(sent_doc, minlength=n_docs)
+    bounds = np.concatenate(([0], np.cumsum(n_sents))).tolist()
+    cols = [a.tolist() for a in (n_words, n_types, mattr_sum, mattr_windows, chars, long_words)]
+    return [
+        _summary(*(c[d] for c in cols), by_len[bounds[d]:bounds[d + 1]].tolist(), docs[d][1], repeated[d], frequent[d])
+        for d in range(n_docs)
+    ]
+
+def _numpy():
+    """NumPy 按需导入（约 0.1s，只在第一次统计时付）；未安装或已关闭时返回 None。"""
+    if not USE_NUMPY:
+        return None
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def analyze_many(texts) -> list:
+    """一批清洗文本 → 与输入同序的统计字典列表。"""
+    docs = [_tokenize(t) for t in texts]
+    if not docs:
+        return []
+    np = _numpy()
+    if np is None:
+        return [_analyze_py(sents, para_words) for sents, para_words in docs]
+    return _analyze_np(np, docs)
+
+def analyze(text: str) -> dict:
+    return analyze_many([text])[0]
+
+def prompt_line(stats: dict) -> str:
+    """统计字典 → 放进 user 消息的一行英文摘要（只含模型用得上的量）。"""
+    sl, pw = stats["sentence_len"], stats["paragraph_words"]
+    parts = [
+        f"{stats['words']} words, {stats['types']} distinct (TTR {stats['ttr']:.2f}, "
+        f"MATTR-{MATTR_WINDOW} {stats['mattr']:.2f}), mean word length {stats['avg_word_len']:.1f}",
+        f"{stats['sentences']} sentences, length mean {sl['mean']:.1f} / sd {sl['sd']:.1f} / max {sl['max']} words, "
+        f"{stats['long_sentences']} over {LONG_SENTENCE}, {stats['short_sentences']} under {SHORT_SENTENCE}",
+        f"{stats['paragraphs']} paragraphs of {pw['min']}–{pw['max']} words",
+    ]
+    if stats["repeated_ngrams"]:
+        parts.append("repeated phrases: " + ", ".join(f'"{g["ngram"]}" ×{g["count"]}' for g in stats["repeated_ngrams"]))
+    if stats["top_words"]:
+        parts.append("most frequent content words: " + ", ".join(f"{w['word']} ×{w['count']}" for w in stats["top_words"]))
+    return "; ".join(parts) + "."
@@ -0,0 +1,192 @@
+# worker.py —— 常驻评估进程：解释器、openai/docx/PyPDF2 导入、OpenAI client（含 HTTP 连接池）与反馈缓存只初始化一次，持续接收稿件路径
+# 协议为 JSON Lines，两种接入方式：
+#   python worker.py -o out/                          # stdin 每行一个请求 → stdout 每行一个结果（首行为 ready）
+#   python worker.py -o out/ --socket /tmp/essay.sock # Unix socket，多个客户端可同时连接（各连接并行，连接内按序）
+#   python worker.py --connect /tmp/essay.sock a.docx b.pdf   # 轻量客户端：不导入 evaluate/openai，启动即发送
+# 请求：一行路径，或 {"path": "...", "id": 任意, "out_dir": "...", "mode": "single|fanout", "nocache": false,
+#        "return_feedback": false, "metrics_only": false}；另有 {"op": "ping"} / {"op": "stats"}
+#        metrics_only：只做本地文本统计（textstats），不调用模型，结果带 "text_stats"、不写文件
+# 结果：{"id", "path", "ok": true, "output": "<stem>_feedback.txt", "from_cache": bool, "ms": 总耗时, "stages_ms": {...}}
+#       或 {"id", "path", "ok": false, "error": "..."}
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+def _parse(line: str) -> dict:
+    line = line.strip()
+    if line.startswith("{"):
+        return json.loads(line)
+    return {"path": line}
+
+class Worker:
+    """持有共享的 client / cache；handle() 线程安全（ScheduledClient 与 FeedbackCache 均可多线程共用）。"""
+    def __init__(self, client, cache=None, out_dir: Path = None, mode: str = None):
+        self.client = client
+        self.cache = cache
+        self.out_dir = out_dir
+        self.mode = mode
+        self.started = time.time()
+        self.essays = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def stats(self) -> dict:
+        from scheduler import ScheduledClient
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "essays": self.essays,
+            "failed": self.failed,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "scheduler": self.client.stats() if isinstance(self.client, ScheduledClient) else None,
+        }
+
+    def handle(self, req: dict) -> dict:
+        import evaluate, metrics
+        op = req.get("op", "evaluate")
+        if op == "ping":
+            return {"ok": True, "op": "ping"}
+        if op == "stats":
+            return {"ok": True, "op": "stats", **self.stats()}
+        path = Path(str(req.get("path", ""))).expanduser()
+        out = {"id": req.get("id"), "path": str(path)}
+        t0 = time.perf_counter()
+        try:
+            if not path.is_file():
+                raise FileNotFoundError(f"文件不存在：{path}")
+            cache = None if req.get("nocache") else self.cache
+            with metrics.trace("worker", file=path.name) as tr:
+                if req.get("metrics_only"):
+                    data = evaluate.analyze_file(path)
+                else:
+                    data = evaluate.evaluate_file(path, self.client, cache, req.get("mode") or self.mode)
+                    out_dir = Path(req["out_dir"]) if req.get("out_dir") else (self.out_dir or path.parent)
+                    out_dir.mkdir(parents=True, exist_ok=True)
+                    with metrics.span("save"):
+                        saved = evaluate.save_feedback(data, path.stem, out_dir)
+            if req.get("metrics_only"):
+                out.update(ok=True, text_stats=data["text_stats"])
+            else:
+                out.update(ok="raw" not in data, output=str(saved), from_cache=tr.get("cache") == "hit")
+                if "raw" in data:
+                    out["error"] = "模型输出无法解析为 JSON（原文已保存）"
+                if req.get("return_feedback"):
+                    out["feedback"] = data
+        except Exception as e:
+            out.update(ok=False, error=evaluate.describe_error(e))
+        out["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        if out["ok"]:
+            out["stages_ms"] = {k: round(v * 1000, 2) for k, v in tr["stages"].items()}
+        with self._lock:
+            self.essays += 1
+            self.failed += not out["ok"]
+        return out
+
+    def handle_line(self, line: str) -> dict:
+        try:
+            req = _parse(line)
+        except ValueError as e:
+            return {"ok": False, "error": f"无法解析请求：{e}"}
+        return self.handle(req)
+
+def build_worker(args) -> Worker:
+    import evaluate
+    from scheduler import ScheduledClient
+    if args.fake:
+        from fake_llm import FakeClient
+        client = FakeClient()
+    else:
+        if not args.base_url and not evaluate.api_key_configured():
+            raise SystemExit("ERROR: 请先在 evaluate.py 顶部配置真实 API_KEY。")
+        from openai import OpenAI
+        client = ScheduledClient(OpenAI(api_key=evaluate.API_KEY, base_url=args.base_url, max_retries=0))
+    evaluate.preload_extractors()  # 常驻进程：启动时一次性付清，第一篇稿件不再等导入
+    cache = None if (args.no_cache or not evaluate.USE_CACHE) else evaluate.open_cache()
+    return Worker(client, cache, Path(args.out_dir) if args.out_dir else None, args.mode)
+
+def _write(stream, obj: dict):
+    stream.write(json.dumps(obj, ensure_ascii=False) + "\n")
+    stream.flush()
+
+def serve_stdio(worker: Worker, startup_ms: float):
+    _write(sys.stdout, {"event": "ready", "startup_ms": startup_ms, "pid": os.getpid()})
+    for line in sys.stdin:
+        if line.strip():
+            _write(sys.stdout, worker.handle_line(line))
+
+def serve_socket(worker: Worker, path: str, startup_ms: float):
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                line = raw.decode("utf-8")
+                if line.strip():
+                    self.wfile.write((json.dumps(worker.handle_line(line), ensure_ascii=False) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+
+    if os.path.exists(path):
+        os.unlink(path)  # 上次未正常退出留下的 socket 文件
+    old_umask = os.umask(0o077)  # socket 只允许本用户连接
+    try:
+        server = socketserver.ThreadingUnixStreamServer(path, Handler)
+    finally:
+        os.umask(old_umask)
+    server.daemon_threads = True
+    print(json.dumps({"event": "ready", "startup_ms": startup_ms, "socket": path, "pid": os.getpid()}), file=sys.stderr,
+          flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+def connect(path: str, items: list):
+    """轻量客户端：逐条发送路径（或 JSON 请求），逐行打印结果；任一失败返回 1。"""
+    failed = 0
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        f = s.makefile("rwb")
+        for item in items:
+            req = _parse(item)
+            if "path" in req:
+                req["path"] = str(Path(req["path"]).expanduser().resolve())  # 服务端的工作目录可能不同
+            f.write((json.dumps(req, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            res = json.loads(f.readline())
+            failed += not res.get("ok")
+            print(json.dumps(res, ensure_ascii=False), flush=True)
+    return 1 if failed else 0
+
+def main(argv=None):
+    t0 = time.perf_counter()
+    ap = argparse.ArgumentParser(description="常驻评估进程（JSON Lines over stdin/stdout 或 Unix socket）")
+    ap.add_argument("--socket", help="监听该 Unix socket 路径（缺省用 stdin/stdout）")
+    ap.add_argument("--connect", metavar="SOCKET", help="作为客户端连接常驻进程，发送后面的路径")
+    ap.add_argument("items", nargs="*", help="--connect 时要评估的稿件路径（或 JSON 请求）")
+    ap.add_argument("-o", "--out-dir", help="<stem>_feedback.txt 输出目录（缺省与稿件同目录）")
+    ap.add_argument("--mode", choices=["single", "fanout"], default=None, help="评估模式（默认 evaluate.EVAL_MODE）")
+    ap.add_argument("--no-cache", action="store_true", help="绕过反馈缓存")
+    ap.add_argument("--fake", action="store_true", help="使用 fake_llm.FakeClient（离线演练）")
+    ap.add_argument("--base-url", help="OpenAI 兼容服务地址（如 fake_llm.FakeResponsesServer 的 url）")
+    args = ap.parse_args(argv)
+
+    if args.connect:
+        return connect(args.connect, args.items)
+    worker = build_worker(args)
+    startup_ms = round((time.perf_counter() - t0) * 1000, 1)
+    if args.socket:
+        serve_socket(worker, args.socket, startup_ms)
+    else:
+        serve_stdio(worker, startup_ms)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())